@@ -0,0 +1,115 @@
+"""
+Pool of Gemini API keys: each key has its own quota and calls go to the key with the most headroom
+"""
+import logging
+import threading
+import time
+
+from retry_policy import classify_error, RATE_LIMIT, TIMEOUT, SERVER_ERROR
+
+logger = logging.getLogger(__name__)
+
+# Failures of the key's endpoint; unparseable answers mean the key works
+_FAILING_ERRORS = (TIMEOUT, SERVER_ERROR)
+
+def is_key_rejected(error):
+    """Check whether an exception says the API key itself is invalid, disabled or not permitted"""
+    if type(error).__name__ in ('PermissionDenied', 'Unauthenticated'):
+        return True
+    if getattr(error, 'code', None) in (401, 403):
+        return True
+    message = str(error)
+    return 'API_KEY_INVALID' in message or 'API key not valid' in message
+
+class ApiKey:
+    """One key of the pool: a backend bound to the key, its rate limiter and its bench state"""
+
+    def __init__(self, name, backend, rate_limiter):
+        self.name = name
+        self.backend = backend
+        self.rate_limiter = rate_limiter
+        self.benched_until = 0.0
+        self.consecutive_failures = 0
+        self.calls = 0
+        self.failures = 0
+        self.times_benched = 0
+
+    def is_benched(self, now):
+        return now < self.benched_until
+
+class ApiKeyPool:
+    """Schedules Gemini calls over several API keys (or projects)
+
+    select() picks the key whose rate limiter has the most headroom, skipping
+    benched keys; ties go to the key with fewer calls. A key is benched for
+    bench_seconds after a 429 (its quota is exhausted), a rejected key, or
+    failure_threshold timeouts / server errors in a row. When every key is
+    benched the one coming back first is used, and a lone key is never benched
+    since there is nothing to fall back to.
+    """
+
+    def __init__(self, bench_seconds=60.0, failure_threshold=3):
+        self.bench_seconds = bench_seconds
+        self.failure_threshold = failure_threshold
+        self.keys = []
+        self._lock = threading.Lock()
+
+    def add(self, name, backend, rate_limiter):
+        key = ApiKey(name, backend, rate_limiter)
+        with self._lock:
+            self.keys.append(key)
+        return key
+
+    def select(self):
+        """The key the next call should use"""
+        with self._lock:
+            now = time.monotonic()
+            available = [key for key in self.keys if not key.is_benched(now)]
+            if available:
+                key = max(available, key=lambda k: (k.rate_limiter.headroom(), -k.calls))
+            else:
+                key = min(self.keys, key=lambda k: k.benched_until)
+            key.calls += 1
+            return key
+
+    def record_success(self, key):
+        with self._lock:
+            key.consecutive_failures = 0
+
+    def record_failure(self, key, error):
+        category = classify_error(error)
+        with self._lock:
+            key.failures += 1
+            if category == RATE_LIMIT:
+                self._bench(key, 'quota exhausted')
+            elif is_key_rejected(error):
+                self._bench(key, 'key rejected')
+            elif category in _FAILING_ERRORS:
+                key.consecutive_failures += 1
+                if key.consecutive_failures >= self.failure_threshold:
+                    self._bench(key, f"{key.consecutive_failures} failures in a row")
+
+    def _bench(self, key, reason):
+        if len(self.keys) < 2:
+            return
+        key.benched_until = time.monotonic() + self.bench_seconds
+        key.consecutive_failures = 0
+        key.times_benched += 1
+        logger.warning(f"Benching Gemini API {key.name} for {self.bench_seconds:.0f}s: {reason}")
+
+    def get_stats(self):
+        """Per-key calls, failures, bench state and limiter state (keys are reported by name only)"""
+        with self._lock:
+            now = time.monotonic()
+            return {
+                key.name: {
+                    'calls': key.calls,
+                    'failures': key.failures,
+                    'benched': key.is_benched(now),
+                    'benched_for': round(max(0.0, key.benched_until - now), 1),
+                    'times_benched': key.times_benched,
+                    'headroom': round(key.rate_limiter.headroom(), 3),
+                    'rate_limit': key.rate_limiter.get_stats()
+                }
+                for key in self.keys
+            }
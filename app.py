@@ -1,12 +1,16 @@
 import os
 import sys
+import hashlib
 import logging
-from flask import Flask, render_template, request, jsonify, send_file
+from flask import Flask, Response, render_template, request, jsonify, send_file
 from flask_cors import CORS
 import uuid
+import itertools
 from werkzeug.utils import secure_filename
 from datetime import datetime
 import threading
+from collections import OrderedDict
+from single_flight import SingleFlight, upload_key
 
 # Configure logging first
 logging.basicConfig(level=logging.INFO)
@@ -32,6 +36,7 @@ except ImportError as e:
         DOWNLOAD_FOLDER = '/tmp/downloads'
         MAX_CONTENT_LENGTH = 16 * 1024 * 1024
         GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY')
+        STREAM_TEST_CASES = True
         
         @staticmethod
         def allowed_file(filename):
@@ -102,7 +107,7 @@ if not generator_imported:
         def __init__(self):
             self.test_cases = []
         
-        def process_frd_document(self, content, progress_callback=None):
+        def process_frd_document(self, content, progress_callback=None, use_cache=True, result_callback=None, model_mode=None, job_id=None, source_digest=None):
             if progress_callback:
                 progress_callback("Processing with fallback generator...")
             
@@ -157,6 +162,16 @@ if not generator_imported:
 
 print("✅ Test generator ready")
 
+# Load the example CSVs and their index once; with gunicorn --preload this runs in the
+# master and every worker shares it, so a job no longer pays for client setup
+if generator_imported:
+    try:
+        from gemini_client import preload_gemini_client
+        preload_gemini_client()
+        print("✅ Gemini reference data preloaded")
+    except Exception as e:
+        print(f"⚠️ Gemini preload failed: {e}")
+
 # Create Flask app
 print("🔄 Creating Flask app...")
 app = Flask(__name__)
@@ -188,18 +203,108 @@ except Exception as e:
 processing_status = {}
 print("✅ Status storage initialized")
 
-def process_document_async(session_id, file_path):
-    """Process document asynchronously"""
+# Per-call Gemini telemetry of the most recent jobs (CallTelemetry by session id), kept for export
+job_telemetry = OrderedDict()
+job_telemetry_lock = threading.Lock()
+
+# Identical uploads (same bytes and options) join the job already running for them
+inflight_uploads = SingleFlight()
+
+# Number of most recent test cases shown while a job is still running
+LATEST_TEST_CASES_SHOWN = 5
+
+def make_result_callback(session_id):
+    """Record test cases in the session status as soon as the generator delivers them"""
+    lock = threading.Lock()
+    
+    def result_callback(test_case):
+        with lock:
+            status = processing_status[session_id]
+            status['test_cases_received'] = status.get('test_cases_received', 0) + 1
+            latest = status.get('latest_test_cases', [])
+            latest.append({
+                'test_case_id': test_case.get('test_case_id', ''),
+                'test_case_name': test_case.get('test_case_name', ''),
+                'feature_name': test_case.get('feature_name', '')
+            })
+            status['latest_test_cases'] = latest[-LATEST_TEST_CASES_SHOWN:]
+    
+    return result_callback
+
+SAMPLE_FRD_CONTENT = "Sample FRD document content for test case generation. This document describes the functional requirements for the system."
+
+class DocumentReadError(Exception):
+    """A document that failed to parse after its first pages were handed on"""
+
+def read_document_pieces(file_path):
+    """Text pieces of the document as they are parsed; a parse error is raised as DocumentReadError"""
+    try:
+        for chunk in DocumentProcessor.iter_document(file_path):
+            yield chunk.text
+    except Exception as e:
+        raise DocumentReadError(f"Error reading document: {str(e)}") from e
+
+def open_document_stream(file_path):
+    """Text pieces of the document as they are parsed, or the sample FRD for an unreadable or (nearly) empty one
+    
+    Only a document failing before its first text falls back to the sample FRD. Its text
+    is already being extracted when a later page fails to parse, so that raises
+    DocumentReadError while iterating and fails the job.
+    """
+    if not hasattr(DocumentProcessor, 'iter_document'):
+        content = DocumentProcessor.get_document_content(file_path)
+        return content if content and len(content.strip()) >= 50 else SAMPLE_FRD_CONTENT
+    
+    pieces = read_document_pieces(file_path)
+    head = []
+    text_chars = 0
+    try:
+        for piece in pieces:
+            head.append(piece)
+            text_chars += len(piece.strip())
+            if text_chars >= 50:
+                return itertools.chain(head, pieces)
+    except DocumentReadError as e:
+        print(str(e))
+        return SAMPLE_FRD_CONTENT
+    
+    content = ''.join(head)
+    return content if len(content.strip()) >= 50 else SAMPLE_FRD_CONTENT
+
+def record_job(session_id, generator):
+    """Keep a job's telemetry for export and put its own figures in its status, whether or not it succeeded"""
+    job = getattr(generator, 'job', None)
+    if job is None:
+        return
+    with job_telemetry_lock:
+        job_telemetry[session_id] = job.telemetry
+        job_telemetry.move_to_end(session_id)
+        while len(job_telemetry) > max(1, getattr(Config, 'TELEMETRY_JOBS_KEPT', 100)):
+            job_telemetry.popitem(last=False)
+    # This job's own figures: retries and per-call tokens / latency by kind and model
+    processing_status[session_id]['job'] = job.get_stats()
+
+def document_digest(file_path):
+    """Digest of a document's bytes and format, known before it is parsed"""
+    digest = hashlib.sha256(os.path.splitext(file_path)[1].lower().encode('utf-8'))
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def process_document_async(session_id, file_path, use_cache=True, model_mode=None, flight_key=None):
+    """Process document asynchronously
+    
+    flight_key, if given, is released when the job ends so later identical uploads start a new job.
+    """
     try:
         print(f"🔄 Processing document for session {session_id}")
         
         processing_status[session_id]['status'] = 'reading_document'
         processing_status[session_id]['message'] = 'Reading FRD document...'
         
-        # Read document content
-        content = DocumentProcessor.get_document_content(file_path)
-        if not content or len(content.strip()) < 50:
-            content = "Sample FRD document content for test case generation. This document describes the functional requirements for the system."
+        # Read document content, handing pages on while the rest is still being parsed
+        content = open_document_stream(file_path)
         
         processing_status[session_id]['status'] = 'processing'
         processing_status[session_id]['message'] = 'Processing document with AI...'
@@ -212,7 +317,17 @@ def process_document_async(session_id, file_path):
             processing_status[session_id]['message'] = message
             print(f"📊 Progress: {message}")
         
-        success, message = generator.process_frd_document(content, progress_callback)
+        result_callback = make_result_callback(session_id) if getattr(Config, 'STREAM_TEST_CASES', False) else None
+        
+        # A long document's cached extraction is found by the file's digest before it is parsed
+        source_digest = None if isinstance(content, str) else document_digest(file_path)
+        try:
+            success, message = generator.process_frd_document(
+                content, progress_callback, use_cache=use_cache, result_callback=result_callback, model_mode=model_mode,
+                job_id=session_id, source_digest=source_digest
+            )
+        finally:
+            record_job(session_id, generator)
         
         if not success:
             processing_status[session_id]['status'] = 'error'
@@ -292,6 +407,16 @@ def process_document_async(session_id, file_path):
             processing_status[session_id]['message'] = 'Test cases generated successfully!'
             processing_status[session_id]['csv_file'] = os.path.basename(csv_path)
             processing_status[session_id]['stats'] = stats
+            if hasattr(generator, 'gemini_client'):
+                # The client is shared by every job of the process, so these are running
+                # totals over all jobs so far, not figures of this job
+                client = generator.gemini_client
+                processing_status[session_id]['process_gemini_stats'] = {
+                    'token_budget': client.budget_planner.get_stats(),
+                    'models': client.model_router.get_stats(),
+                    'hedging': client.hedge_policy.get_stats(),
+                    'api_keys': client.key_pool.get_stats()
+                }
             print(f"✅ Processing completed for session {session_id}")
         else:
             processing_status[session_id]['status'] = 'error'
@@ -303,10 +428,17 @@ def process_document_async(session_id, file_path):
         except:
             pass
             
+    except DocumentReadError as e:
+        logger.error(f"Processing error: {str(e)}")
+        processing_status[session_id]['status'] = 'error'
+        processing_status[session_id]['message'] = str(e)
     except Exception as e:
         logger.error(f"Processing error: {str(e)}")
         processing_status[session_id]['status'] = 'error'
         processing_status[session_id]['message'] = f'Error: {str(e)}'
+    finally:
+        if flight_key:
+            inflight_uploads.release(flight_key, session_id)
 
 # Routes
 @app.route('/')
@@ -332,17 +464,35 @@ def index():
 def health_check():
     """Health check endpoint - CRITICAL for Render"""
     print("🏥 Health check requested")
+    
+    # Circuit breaker state of the Gemini models and bench state of the API keys this worker has used so far
+    circuits = {}
+    api_keys = {}
+    degraded = False
+    try:
+        from gemini_client import get_existing_gemini_client
+        client = get_existing_gemini_client()
+        if client:
+            circuits = client.circuit_breakers.get_stats()
+            api_keys = client.key_pool.get_stats()
+            degraded = client.circuit_breakers.is_open(Config.GEMINI_MODEL)
+    except Exception as e:
+        logger.error(f"Health check could not read circuit state: {e}")
+    
+    status_code = 503 if degraded and getattr(Config, 'HEALTH_FAIL_ON_OPEN_CIRCUIT', False) else 200
     return jsonify({
-        'status': 'healthy',
+        'status': 'degraded' if degraded else 'healthy',
         'timestamp': datetime.now().isoformat(),
         'service': 'AI Test Case Generator',
         'version': '1.0.0',
         'port': os.environ.get('PORT', '5000'),
         'environment': os.environ.get('FLASK_ENV', 'production'),
         'render': bool(os.environ.get('RENDER')),
-        'gemini_configured': bool(os.environ.get('GEMINI_API_KEY')),
-        'generator_available': generator_imported
-    })
+        'gemini_configured': bool(os.environ.get('GEMINI_API_KEY') or os.environ.get('GEMINI_API_KEYS')),
+        'generator_available': generator_imported,
+        'gemini_circuits': circuits,
+        'gemini_api_keys': api_keys
+    }), status_code
 
 @app.route('/upload', methods=['POST'])
 def upload_file():
@@ -360,13 +510,15 @@ def upload_file():
         # Generate session ID
         session_id = str(uuid.uuid4())
         
-        # Save file
+        # Cached Gemini responses are reused unless the client opts out
+        use_cache = request.form.get('use_cache', 'true').lower() != 'false'
+        
+        # Optional per-job model tier: 'auto', 'fast' or 'quality' (default from GEMINI_MODEL_MODE)
+        model_mode = request.form.get('model_mode', '').lower() or None
+        if model_mode not in (None, 'auto', 'fast', 'quality'):
+            return jsonify({'error': f'Unknown model_mode: {model_mode}'}), 400
+        
         filename = secure_filename(file.filename)
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        unique_filename = f"{timestamp}_{filename}"
-        upload_folder = app.config.get('UPLOAD_FOLDER', '/tmp/uploads')
-        file_path = os.path.join(upload_folder, unique_filename)
-        file.save(file_path)
         
         # Initialize status
         processing_status[session_id] = {
@@ -376,8 +528,35 @@ def upload_file():
             'upload_time': datetime.now().isoformat()
         }
         
+        # A double-click or a colleague uploading the same FRD attaches to the running job
+        content = file.read()
+        key = upload_key(content, use_cache=use_cache, model_mode=model_mode)
+        owner, claimed = inflight_uploads.claim(key, session_id)
+        if not claimed:
+            del processing_status[session_id]
+            print(f"🔁 Identical upload already in progress, joining session: {owner}")
+            return jsonify({
+                'success': True,
+                'session_id': owner,
+                'message': 'Identical file is already being processed',
+                'filename': filename,
+                'coalesced': True
+            })
+        
+        # Save file
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        unique_filename = f"{timestamp}_{session_id[:8]}_{filename}"
+        upload_folder = app.config.get('UPLOAD_FOLDER', '/tmp/uploads')
+        file_path = os.path.join(upload_folder, unique_filename)
+        try:
+            with open(file_path, 'wb') as saved_file:
+                saved_file.write(content)
+        except Exception:
+            inflight_uploads.release(key, session_id)
+            raise
+        
         # Start processing
-        thread = threading.Thread(target=process_document_async, args=(session_id, file_path))
+        thread = threading.Thread(target=process_document_async, args=(session_id, file_path, use_cache, model_mode, key))
         thread.daemon = True
         thread.start()
         
@@ -401,6 +580,24 @@ def get_status(session_id):
         return jsonify({'error': 'Session not found'}), 404
     return jsonify(processing_status[session_id])
 
+@app.route('/telemetry/<session_id>')
+def get_telemetry(session_id):
+    """Per-call Gemini telemetry of a job: summary and records as JSON, or ?format=jsonl / csv for offline analysis"""
+    telemetry = job_telemetry.get(session_id)
+    if telemetry is None:
+        return jsonify({'error': 'Session not found'}), 404
+    
+    export_format = request.args.get('format', 'json')
+    if export_format == 'jsonl':
+        body, mimetype = telemetry.to_jsonl(), 'application/x-ndjson'
+    elif export_format == 'csv':
+        body, mimetype = telemetry.to_csv(), 'text/csv'
+    else:
+        return jsonify({'job_id': telemetry.job_id, 'stats': telemetry.get_stats(), 'records': telemetry.get_records()})
+    return Response(body, mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename=telemetry_{session_id}.{export_format}'
+    })
+
 @app.route('/download/<filename>')
 def download_file(filename):
     """Download generated file"""
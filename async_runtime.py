@@ -0,0 +1,73 @@
+"""
+Shared asyncio event loop for driving many Gemini calls from one worker process
+"""
+import asyncio
+import logging
+import threading
+import weakref
+from contextlib import asynccontextmanager
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+class AsyncRuntime:
+    """Background event loop thread shared by every job in the process
+
+    Sync code (job threads, Flask handlers) submits coroutines with run() or
+    submit(); all of them are multiplexed on a single loop, so concurrent LLM
+    calls cost a task each instead of an OS thread each.
+    """
+
+    def __init__(self, max_in_flight=None):
+        self.max_in_flight = max_in_flight or Config.GEMINI_MAX_IN_FLIGHT
+        self._semaphores = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self._loop = None
+        self._thread = None
+
+    @property
+    def loop(self):
+        """Start the background loop on first use and return it"""
+        with self._lock:
+            if self._loop is None or self._loop.is_closed():
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._run_loop, name='gemini-async-loop', daemon=True)
+                self._thread.start()
+                logger.info(f"Started shared Gemini event loop (max in-flight: {self.max_in_flight})")
+            return self._loop
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    def submit(self, coro):
+        """Schedule a coroutine on the shared loop and return a concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro, timeout=None):
+        """Run a coroutine on the shared loop and block the calling thread until it finishes"""
+        if self._loop is not None and threading.current_thread() is self._thread:
+            raise RuntimeError("AsyncRuntime.run() cannot be called from the shared loop itself; await the coroutine instead")
+        return self.submit(coro).result(timeout)
+
+    @asynccontextmanager
+    async def in_flight(self):
+        """Hold one of the in-flight request slots of the running loop"""
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_in_flight)
+            self._semaphores[loop] = semaphore
+        async with semaphore:
+            yield
+
+_runtime = None
+_runtime_lock = threading.Lock()
+
+def get_async_runtime():
+    """Get the process-wide AsyncRuntime"""
+    global _runtime
+    with _runtime_lock:
+        if _runtime is None:
+            _runtime = AsyncRuntime()
+        return _runtime
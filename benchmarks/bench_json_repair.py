@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Benchmark the tolerant JSON parser against the corpus of malformed Gemini responses
+
+Usage: python benchmarks/bench_json_repair.py [corpus.jsonl] [--rounds N]
+
+For every corpus entry the strict parser (fence stripping + json.loads, as
+used before json_repair) and parse_llm_json are compared on recovered
+elements and time per parse. Add new failing responses to the corpus as
+they show up in the logs.
+"""
+import json
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from json_repair import parse_llm_json
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'malformed_responses.jsonl')
+
+def strict_parse(text, array_key):
+    """The parser GeminiClient used before json_repair"""
+    text = text.strip()
+    if text.startswith('```json'):
+        text = text[7:-3]
+    elif text.startswith('```'):
+        text = text[3:-3]
+    return json.loads(text)
+
+def tolerant_parse(text, array_key):
+    return parse_llm_json(text, array_key)[0]
+
+def count_elements(parse, entry):
+    try:
+        data = parse(entry['text'], entry['array_key'])
+    except json.JSONDecodeError:
+        return 0
+    return len(data.get(entry['array_key'], [])) if isinstance(data, dict) else 0
+
+def time_parse(parse, entry, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        try:
+            parse(entry['text'], entry['array_key'])
+        except json.JSONDecodeError:
+            pass
+    return (time.perf_counter() - start) / rounds * 1e6
+
+def load_corpus(path):
+    with open(path, 'r', encoding='utf-8') as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+def main():
+    args = sys.argv[1:]
+    rounds = 200
+    if '--rounds' in args:
+        index = args.index('--rounds')
+        rounds = int(args[index + 1])
+        del args[index:index + 2]
+    corpus = load_corpus(args[0] if args else DEFAULT_CORPUS)
+
+    # Salvage warnings are expected here and would drown the table
+    logging.disable(logging.WARNING)
+
+    print(f"{'response':36} {'expected':>8} {'strict':>7} {'tolerant':>8} {'strict us':>10} {'tolerant us':>12}")
+    totals = {'expected': 0, 'strict': 0, 'tolerant': 0, 'strict_us': 0.0, 'tolerant_us': 0.0}
+    mismatches = []
+    for entry in corpus:
+        strict = count_elements(strict_parse, entry)
+        tolerant = count_elements(tolerant_parse, entry)
+        strict_us = time_parse(strict_parse, entry, rounds)
+        tolerant_us = time_parse(tolerant_parse, entry, rounds)
+        print(f"{entry['name']:36} {entry['expected_elements']:>8} {strict:>7} {tolerant:>8} {strict_us:>10.1f} {tolerant_us:>12.1f}")
+
+        totals['expected'] += entry['expected_elements']
+        totals['strict'] += strict
+        totals['tolerant'] += tolerant
+        totals['strict_us'] += strict_us
+        totals['tolerant_us'] += tolerant_us
+        if tolerant != entry['expected_elements']:
+            mismatches.append(entry['name'])
+
+    print('-' * 86)
+    print(f"{'total':36} {totals['expected']:>8} {totals['strict']:>7} {totals['tolerant']:>8} "
+          f"{totals['strict_us']:>10.1f} {totals['tolerant_us']:>12.1f}")
+    print(f"Recovered {totals['tolerant']}/{totals['expected']} elements "
+          f"(strict parser: {totals['strict']}/{totals['expected']})")
+    if mismatches:
+        print(f"Unexpected element counts: {', '.join(mismatches)}")
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
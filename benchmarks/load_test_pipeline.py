@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Offline load test of the upload -> status -> download pipeline against the fake Gemini backend
+
+Usage: python benchmarks/load_test_pipeline.py [--jobs N] [--features N] [--concurrency N]
+
+Synthetic FRDs are uploaded through the Flask test client, polled until they
+finish and their CSV is downloaded. The fake backend's latency and faults are
+set with the FAKE_GEMINI_* environment variables (see config.py), e.g.
+FAKE_GEMINI_LATENCY_MS=200 FAKE_GEMINI_429_RATE=0.05 for a throttled run.
+FAKE_GEMINI_MALFORMED_RATE only has an effect with GEMINI_STRUCTURED_OUTPUT=false,
+since structured output rules out malformed JSON.
+Generated files are written to downloads/ as in normal use.
+"""
+import io
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+os.environ['GEMINI_BACKEND'] = 'fake'
+os.environ.setdefault('RESPONSE_CACHE_ENABLED', 'false')
+# Measure the pipeline rather than the client-side quota; set these to test throttling
+os.environ.setdefault('GEMINI_REQUESTS_PER_MINUTE', '100000')
+os.environ.setdefault('GEMINI_TOKENS_PER_MINUTE', '1000000000')
+sys.path.insert(0, REPO_ROOT)
+# The app resolves the example CSVs and its upload/download folders from the working directory
+os.chdir(REPO_ROOT)
+
+from app import app
+from gemini_client import get_gemini_client
+
+def synthetic_frd(job_number, feature_count):
+    lines = [f"Functional Requirements Document {job_number}", ""]
+    for number in range(1, feature_count + 1):
+        lines.append(f"Module {number % 5}: the system shall process request type {job_number}-{number} "
+                     f"and validate its input fields before saving.")
+    return "\n".join(lines)
+
+def run_job(client, job_number, feature_count, poll_interval=0.2):
+    """Upload one FRD and wait for its CSV; returns (seconds, test cases or None on failure)"""
+    start = time.perf_counter()
+    data = {'file': (io.BytesIO(synthetic_frd(job_number, feature_count).encode('utf-8')), f'frd_{job_number}.txt'),
+            'use_cache': 'false'}
+    session_id = client.post('/upload', data=data, content_type='multipart/form-data').get_json()['session_id']
+
+    while True:
+        status = client.get(f'/status/{session_id}').get_json()
+        if status['status'] in ('completed', 'error'):
+            break
+        time.sleep(poll_interval)
+    if status['status'] != 'completed':
+        return time.perf_counter() - start, None
+
+    download = client.get(f"/download/{status['csv_file']}")
+    download.close()
+    return time.perf_counter() - start, status['stats'].get('total_test_cases', 0)
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def main():
+    args = sys.argv[1:]
+    options = {'--jobs': 8, '--features': 10, '--concurrency': 4}
+    for option in options:
+        if option in args:
+            options[option] = int(args[args.index(option) + 1])
+
+    client = app.test_client()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=options['--concurrency']) as executor:
+        results = list(executor.map(lambda number: run_job(client, number, options['--features']),
+                                    range(1, options['--jobs'] + 1)))
+    elapsed = time.perf_counter() - start
+
+    durations = [duration for duration, _ in results]
+    completed = [test_cases for _, test_cases in results if test_cases is not None]
+    print(f"Jobs: {len(completed)}/{len(results)} completed in {elapsed:.1f}s "
+          f"({len(results) / elapsed * 60:.1f} jobs/min)")
+    print(f"Job latency: p50 {percentile(durations, 0.5):.1f}s, p95 {percentile(durations, 0.95):.1f}s, "
+          f"max {max(durations):.1f}s")
+    print(f"Test cases: {sum(completed)} ({sum(completed) / elapsed:.1f}/s)")
+    print(f"Fake backend: {get_gemini_client().backend.get_stats()}")
+    return 0 if len(completed) == len(results) else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
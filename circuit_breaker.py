@@ -0,0 +1,144 @@
+"""
+Per-model circuit breakers: fail fast while a Gemini model is timing out or erroring
+"""
+import logging
+import threading
+import time
+from collections import deque
+
+from retry_policy import classify_error, TIMEOUT, SERVER_ERROR
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# Only failures of the endpoint itself count; 429s are paced by the rate limiter and
+# unparseable answers mean the model did respond
+_TRIPPING_ERRORS = (TIMEOUT, SERVER_ERROR)
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a model whose circuit is open"""
+
+class CircuitBreaker:
+    """Closed/open/half-open breaker over a window of recent call outcomes
+
+    The circuit opens when at least min_calls calls are in the window and the
+    share of failed or slow (over slow_call_seconds) calls reaches
+    failure_threshold. After open_seconds it lets a single trial call through
+    (half-open): success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, name, failure_threshold=0.5, slow_call_seconds=60.0, window=20, min_calls=10, open_seconds=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.state = CLOSED
+        self.outcomes = deque(maxlen=window)
+        self.opened_at = None
+        self.trial_started_at = None
+        self.rejected = 0
+        self.times_opened = 0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """True if a call may go ahead now; counts a rejection otherwise"""
+        with self._lock:
+            now = time.monotonic()
+            if self.state == OPEN and now - self.opened_at >= self.open_seconds:
+                self.state = HALF_OPEN
+                self.trial_started_at = None
+                logger.info(f"Circuit for {self.name} half-open, sending a trial call")
+            if self.state == CLOSED:
+                return True
+            # A trial that never reported back (e.g. a cancelled hedge) must not block the circuit forever
+            if self.state == HALF_OPEN and (self.trial_started_at is None or now - self.trial_started_at >= self.open_seconds):
+                self.trial_started_at = now
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self, latency):
+        slow = latency >= self.slow_call_seconds
+        with self._lock:
+            if self.state == HALF_OPEN:
+                if slow:
+                    self._open()
+                else:
+                    self.state = CLOSED
+                    self.outcomes.clear()
+                    logger.info(f"Circuit for {self.name} closed again")
+                return
+            self.outcomes.append(slow)
+            self._trip_if_failing()
+
+    def record_failure(self, error):
+        if classify_error(error) not in _TRIPPING_ERRORS:
+            return
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._open()
+                return
+            self.outcomes.append(True)
+            self._trip_if_failing()
+
+    def _trip_if_failing(self):
+        if self.state == CLOSED and len(self.outcomes) >= self.min_calls:
+            if sum(self.outcomes) / len(self.outcomes) >= self.failure_threshold:
+                self._open()
+
+    def _open(self):
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.times_opened += 1
+        logger.error(f"Circuit for {self.name} opened: failing fast for {self.open_seconds:.0f}s")
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'state': self.state,
+                'recent_calls': len(self.outcomes),
+                'recent_failures': sum(self.outcomes),
+                'rejected': self.rejected,
+                'times_opened': self.times_opened
+            }
+
+class CircuitBreakers:
+    """One CircuitBreaker per model name, created on first use with the same settings"""
+
+    def __init__(self, enabled=True, **settings):
+        self.enabled = enabled
+        self.settings = settings
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def get(self, model):
+        with self._lock:
+            breaker = self._breakers.get(model)
+            if breaker is None:
+                breaker = self._breakers[model] = CircuitBreaker(model, **self.settings)
+            return breaker
+
+    def allow(self, model):
+        return not self.enabled or self.get(model).allow()
+
+    def is_open(self, model):
+        with self._lock:
+            breaker = self._breakers.get(model)
+        return self.enabled and breaker is not None and breaker.get_stats()['state'] == OPEN
+
+    def record_success(self, model, latency):
+        if self.enabled:
+            self.get(model).record_success(latency)
+
+    def record_failure(self, model, error):
+        if self.enabled:
+            self.get(model).record_failure(error)
+
+    def get_stats(self):
+        with self._lock:
+            breakers = list(self._breakers.items())
+        return {model: breaker.get_stats() for model, breaker in breakers}
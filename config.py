@@ -13,8 +13,126 @@ class Config:
     
     # Gemini model configuration
     GEMINI_MODEL = 'gemini-1.5-pro'
+    
+    # Model tiering: in 'auto' mode small test case calls (by estimated input tokens and the
+    # feature's requirement count) go to the fast model and escalate to GEMINI_MODEL when its
+    # answer is invalid; 'fast' and 'quality' pin every call to one model. Jobs may override the mode.
+    GEMINI_FAST_MODEL = os.environ.get('GEMINI_FAST_MODEL', 'gemini-1.5-flash')
+    GEMINI_MODEL_MODE = os.environ.get('GEMINI_MODEL_MODE', 'quality').lower()
+    FAST_MODEL_TASKS = os.environ.get('FAST_MODEL_TASKS', 'test_cases,test_case_batch').split(',')
+    FAST_MODEL_MAX_INPUT_TOKENS = int(os.environ.get('FAST_MODEL_MAX_INPUT_TOKENS', 8000))
+    FAST_MODEL_MAX_COMPLEXITY = int(os.environ.get('FAST_MODEL_MAX_COMPLEXITY', 6))
     TEMPERATURE = 0.3
-    MAX_OUTPUT_TOKENS = 8192
+    
+    # 'google' calls the Gemini API; 'fake' answers locally with synthetic, schema-valid
+    # responses and the latency and faults below (for offline load tests)
+    GEMINI_BACKEND = os.environ.get('GEMINI_BACKEND', 'google').lower()
+    FAKE_GEMINI_LATENCY_MS = float(os.environ.get('FAKE_GEMINI_LATENCY_MS', 800))
+    FAKE_GEMINI_LATENCY_SIGMA = float(os.environ.get('FAKE_GEMINI_LATENCY_SIGMA', 0.5))
+    FAKE_GEMINI_TOKENS_PER_SECOND = float(os.environ.get('FAKE_GEMINI_TOKENS_PER_SECOND', 150))
+    FAKE_GEMINI_429_RATE = float(os.environ.get('FAKE_GEMINI_429_RATE', 0.0))
+    FAKE_GEMINI_TIMEOUT_RATE = float(os.environ.get('FAKE_GEMINI_TIMEOUT_RATE', 0.0))
+    FAKE_GEMINI_TIMEOUT_SECONDS = float(os.environ.get('FAKE_GEMINI_TIMEOUT_SECONDS', 5.0))
+    FAKE_GEMINI_MALFORMED_RATE = float(os.environ.get('FAKE_GEMINI_MALFORMED_RATE', 0.0))
+    FAKE_GEMINI_SEED = int(os.environ.get('FAKE_GEMINI_SEED', 0))
+    MAX_OUTPUT_TOKENS = int(os.environ.get('MAX_OUTPUT_TOKENS', 8192))
+    
+    # Structured output: Gemini answers with JSON constrained to the feature / test case
+    # response schemas instead of free text the JSON has to be scraped from
+    GEMINI_STRUCTURED_OUTPUT = os.environ.get('GEMINI_STRUCTURED_OUTPUT', 'true').lower() == 'true'
+    
+    # Follow-up requests for the rest of a response cut off at the output limit (MAX_TOKENS or a
+    # broken-off payload); they ask only for the missing items and are not counted as retries
+    MAX_CONTINUATIONS = int(os.environ.get('MAX_CONTINUATIONS', 4))
+    
+    # Near-duplicate removal: test cases whose name, steps and expected result are at least
+    # this similar (estimated Jaccard similarity of word bigrams) to an earlier one are dropped
+    DEDUP_TEST_CASES = os.environ.get('DEDUP_TEST_CASES', 'true').lower() == 'true'
+    DEDUP_SIMILARITY_THRESHOLD = float(os.environ.get('DEDUP_SIMILARITY_THRESHOLD', 0.8))
+    
+    # Prompt budget planning: input window (0 = the model's own limit), token budget of the
+    # static few-shot preamble and the starting estimate of output tokens per test case
+    GEMINI_MAX_INPUT_TOKENS = int(os.environ.get('GEMINI_MAX_INPUT_TOKENS', 0))
+    STATIC_PROMPT_TOKEN_BUDGET = int(os.environ.get('STATIC_PROMPT_TOKEN_BUDGET', 16000))
+    TOKENS_PER_TEST_CASE = int(os.environ.get('TOKENS_PER_TEST_CASE', 180))
+    
+    # Send each feature only the few-shot examples and key-value rows ranked most similar to it (BM25)
+    FEW_SHOT_RETRIEVAL = os.environ.get('FEW_SHOT_RETRIEVAL', 'true').lower() == 'true'
+    FEW_SHOT_EXAMPLES_PER_FEATURE = int(os.environ.get('FEW_SHOT_EXAMPLES_PER_FEATURE', 3))
+    KEY_VALUES_PER_FEATURE = int(os.environ.get('KEY_VALUES_PER_FEATURE', 5))
+    
+    # FRDs longer than MAX_FRD_CHARS are split into overlapping chunks extracted in parallel
+    MAX_FRD_CHARS = int(os.environ.get('MAX_FRD_CHARS', 50000))
+    FRD_CHUNK_SIZE = int(os.environ.get('FRD_CHUNK_SIZE', 30000))
+    FRD_CHUNK_OVERLAP = int(os.environ.get('FRD_CHUNK_OVERLAP', 2000))
+    
+    # Number of features whose test cases are generated in parallel (1 = serial)
+    MAX_CONCURRENT_FEATURES = int(os.environ.get('MAX_CONCURRENT_FEATURES', 4))
+    
+    # Pack several small features into one test case call within these token budgets
+    BATCH_TEST_CASES = os.environ.get('BATCH_TEST_CASES', 'false').lower() == 'true'
+    TEST_CASE_BATCH_INPUT_TOKENS = int(os.environ.get('TEST_CASE_BATCH_INPUT_TOKENS', 6000))
+    TEST_CASE_BATCH_OUTPUT_TOKENS_PER_FEATURE = int(os.environ.get('TEST_CASE_BATCH_OUTPUT_TOKENS_PER_FEATURE', 2000))
+    TEST_CASE_BATCH_MAX_FEATURES = int(os.environ.get('TEST_CASE_BATCH_MAX_FEATURES', 8))
+    
+    # Drive Gemini calls through the shared asyncio loop instead of one thread per call
+    USE_ASYNC_GEMINI = os.environ.get('USE_ASYNC_GEMINI', 'false').lower() == 'true'
+    GEMINI_MAX_IN_FLIGHT = int(os.environ.get('GEMINI_MAX_IN_FLIGHT', 32))
+    
+    # Gemini quota of each API key, shared by all jobs in the process (adapts down on 429 responses)
+    GEMINI_REQUESTS_PER_MINUTE = int(os.environ.get('GEMINI_REQUESTS_PER_MINUTE', 60))
+    GEMINI_TOKENS_PER_MINUTE = int(os.environ.get('GEMINI_TOKENS_PER_MINUTE', 1000000))
+    
+    # Pool of API keys (comma-separated, e.g. keys of different projects), each with its own
+    # quota above; calls go to the key with the most headroom. A key is benched for
+    # API_KEY_BENCH_SECONDS after a 429 or API_KEY_FAILURE_THRESHOLD failures in a row.
+    GEMINI_API_KEYS = [key.strip() for key in os.environ.get('GEMINI_API_KEYS', '').split(',') if key.strip()] \
+        or ([GEMINI_API_KEY] if GEMINI_API_KEY else [])
+    API_KEY_BENCH_SECONDS = float(os.environ.get('API_KEY_BENCH_SECONDS', 60))
+    API_KEY_FAILURE_THRESHOLD = int(os.environ.get('API_KEY_FAILURE_THRESHOLD', 3))
+    
+    # Per-model circuit breaker: opens when CIRCUIT_BREAKER_FAILURE_THRESHOLD of the last
+    # CIRCUIT_BREAKER_WINDOW calls timed out, failed server-side or took longer than
+    # CIRCUIT_BREAKER_SLOW_CALL_SECONDS; calls then fail fast for CIRCUIT_BREAKER_OPEN_SECONDS,
+    # or go to GEMINI_FALLBACK_MODEL for the call kinds listed in FALLBACK_TASKS
+    CIRCUIT_BREAKER_ENABLED = os.environ.get('CIRCUIT_BREAKER_ENABLED', 'true').lower() == 'true'
+    CIRCUIT_BREAKER_FAILURE_THRESHOLD = float(os.environ.get('CIRCUIT_BREAKER_FAILURE_THRESHOLD', 0.5))
+    CIRCUIT_BREAKER_SLOW_CALL_SECONDS = float(os.environ.get('CIRCUIT_BREAKER_SLOW_CALL_SECONDS', 120))
+    CIRCUIT_BREAKER_WINDOW = int(os.environ.get('CIRCUIT_BREAKER_WINDOW', 20))
+    CIRCUIT_BREAKER_MIN_CALLS = int(os.environ.get('CIRCUIT_BREAKER_MIN_CALLS', 10))
+    CIRCUIT_BREAKER_OPEN_SECONDS = float(os.environ.get('CIRCUIT_BREAKER_OPEN_SECONDS', 30))
+    GEMINI_FALLBACK_MODEL = os.environ.get('GEMINI_FALLBACK_MODEL', 'gemini-1.5-flash')
+    FALLBACK_TASKS = os.environ.get('FALLBACK_TASKS', 'test_cases').split(',')
+    # Answer /health with 503 while the circuit of GEMINI_MODEL is open
+    HEALTH_FAIL_ON_OPEN_CIRCUIT = os.environ.get('HEALTH_FAIL_ON_OPEN_CIRCUIT', 'false').lower() == 'true'
+    
+    # Hedged requests: a call running longer than the model's recent HEDGE_PERCENTILE latency
+    # (at least HEDGE_MIN_DELAY seconds) gets a duplicate and the first answer wins; at most
+    # HEDGE_MAX_RATE of all calls are hedged. Streaming calls are not hedged.
+    HEDGE_REQUESTS = os.environ.get('HEDGE_REQUESTS', 'false').lower() == 'true'
+    HEDGE_PERCENTILE = float(os.environ.get('HEDGE_PERCENTILE', 0.9))
+    HEDGE_MIN_SAMPLES = int(os.environ.get('HEDGE_MIN_SAMPLES', 20))
+    HEDGE_MIN_DELAY = float(os.environ.get('HEDGE_MIN_DELAY', 2.0))
+    HEDGE_MAX_RATE = float(os.environ.get('HEDGE_MAX_RATE', 0.1))
+    
+    # Retries (with backoff) one job may spend across all of its Gemini calls
+    GEMINI_RETRY_BUDGET = int(os.environ.get('GEMINI_RETRY_BUDGET', 30))
+    
+    # Report test cases to the status endpoint as they stream in, before a feature finishes
+    STREAM_TEST_CASES = os.environ.get('STREAM_TEST_CASES', 'true').lower() == 'true'
+    
+    # Persistent cache of Gemini responses (LRU-evicted once over the size limit)
+    RESPONSE_CACHE_ENABLED = os.environ.get('RESPONSE_CACHE_ENABLED', 'true').lower() == 'true'
+    CACHE_FOLDER = os.environ.get('CACHE_FOLDER', 'cache')
+    FEATURE_CACHE_MAX_BYTES = int(os.environ.get('FEATURE_CACHE_MAX_BYTES', 50 * 1024 * 1024))
+    TEST_CASE_CACHE_MAX_BYTES = int(os.environ.get('TEST_CASE_CACHE_MAX_BYTES', 200 * 1024 * 1024))
+    
+    # Number of most recent jobs whose per-call telemetry is kept for /telemetry/<session_id>
+    TELEMETRY_JOBS_KEPT = int(os.environ.get('TELEMETRY_JOBS_KEPT', 100))
+    
+    # Send the static prompt preamble as Gemini cached content (falls back to a system instruction)
+    GEMINI_CONTEXT_CACHING = os.environ.get('GEMINI_CONTEXT_CACHING', 'false').lower() == 'true'
+    GEMINI_CONTEXT_CACHE_TTL = int(os.environ.get('GEMINI_CONTEXT_CACHE_TTL', 3600))
     
     @staticmethod
     def allowed_file(filename):
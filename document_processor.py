@@ -1,20 +1,77 @@
 import PyPDF2
 import docx
 import os
+from collections import namedtuple
+
+# One piece of a document as the extractors yield it: text (ending with the newline
+# separating it from the next piece), 'page' or 'paragraph', its 1-based number and
+# the character offset of text in the whole document
+DocumentChunk = namedtuple('DocumentChunk', ['text', 'kind', 'number', 'offset'])
 
 class DocumentProcessor:
+    @staticmethod
+    def iter_pdf_pages(file_path):
+        """Yield the pages of a PDF file one at a time, as they are extracted"""
+        offset = 0
+        with open(file_path, 'rb') as file:
+            pdf_reader = PyPDF2.PdfReader(file)
+            for number, page in enumerate(pdf_reader.pages, 1):
+                text = (page.extract_text() or '') + "\n"
+                yield DocumentChunk(text, 'page', number, offset)
+                offset += len(text)
+    
+    @staticmethod
+    def iter_docx_paragraphs(file_path):
+        """Yield the paragraphs of a DOCX file one at a time"""
+        offset = 0
+        doc = docx.Document(file_path)
+        for number, paragraph in enumerate(doc.paragraphs, 1):
+            text = paragraph.text + "\n"
+            yield DocumentChunk(text, 'paragraph', number, offset)
+            offset += len(text)
+    
+    @staticmethod
+    def iter_text_paragraphs(file_path):
+        """Yield a text file in paragraphs (runs of lines ending at a blank line) as it is read"""
+        offset = 0
+        number = 0
+        lines = []
+        with open(file_path, 'r', encoding='utf-8') as file:
+            for line in file:
+                lines.append(line)
+                if line.strip():
+                    continue
+                number += 1
+                text = ''.join(lines)
+                yield DocumentChunk(text, 'paragraph', number, offset)
+                offset += len(text)
+                lines = []
+        if lines:
+            yield DocumentChunk(''.join(lines), 'paragraph', number + 1, offset)
+    
+    @staticmethod
+    def iter_document(file_path):
+        """Iterator over the pages or paragraphs of a document based on its file extension
+        
+        Parsing errors are raised while iterating; an unsupported format yields nothing.
+        """
+        file_extension = os.path.splitext(file_path)[1].lower()
+        
+        if file_extension == '.pdf':
+            return DocumentProcessor.iter_pdf_pages(file_path)
+        elif file_extension == '.docx':
+            return DocumentProcessor.iter_docx_paragraphs(file_path)
+        elif file_extension in ['.txt', '.md']:
+            return DocumentProcessor.iter_text_paragraphs(file_path)
+        else:
+            print(f"Unsupported file format: {file_extension}")
+            return iter(())
+    
     @staticmethod
     def read_pdf(file_path):
         """Read content from PDF file"""
         try:
-            with open(file_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                content = ""
-                
-                for page in pdf_reader.pages:
-                    content += page.extract_text() + "\n"
-                
-                return content
+            return ''.join(chunk.text for chunk in DocumentProcessor.iter_pdf_pages(file_path))
         except Exception as e:
             print(f"Error reading PDF: {str(e)}")
             return None
@@ -23,13 +80,7 @@ class DocumentProcessor:
     def read_docx(file_path):
         """Read content from DOCX file"""
         try:
-            doc = docx.Document(file_path)
-            content = ""
-            
-            for paragraph in doc.paragraphs:
-                content += paragraph.text + "\n"
-                
-            return content
+            return ''.join(chunk.text for chunk in DocumentProcessor.iter_docx_paragraphs(file_path))
         except Exception as e:
             print(f"Error reading DOCX: {str(e)}")
             return None
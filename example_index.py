@@ -0,0 +1,99 @@
+"""
+BM25 retrieval of the few-shot examples and key-value rows most relevant to a feature
+"""
+import heapq
+import logging
+import math
+import re
+from collections import Counter, defaultdict
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+
+STOPWORDS = frozenset(
+    'a an and are as at be by for from has have in is it its of on or that the this to was will with '
+    'shall should must can could would may be been being into than then there their these those which '
+    'who when where while not no yes all any each if so such'.split()
+)
+
+def tokenize(text):
+    """Lowercased word tokens without stopwords and single characters"""
+    return [token for token in TOKEN_PATTERN.findall((text or '').lower())
+            if len(token) > 1 and token not in STOPWORDS]
+
+class BM25Index:
+    """Okapi BM25 over a fixed list of documents, built once
+
+    Postings are kept per term, so a query only touches the documents that
+    share a term with it and stays fast with thousands of rows.
+    """
+
+    def __init__(self, documents, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.size = len(documents)
+        self.postings = defaultdict(list)
+        self.doc_lengths = []
+        for doc_id, text in enumerate(documents):
+            counts = Counter(tokenize(text))
+            self.doc_lengths.append(sum(counts.values()))
+            for term, frequency in counts.items():
+                self.postings[term].append((doc_id, frequency))
+
+        self.avg_length = (sum(self.doc_lengths) / self.size) if self.size else 0.0
+        self.idf = {
+            term: math.log(1 + (self.size - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self.postings.items()
+        }
+
+    def search(self, query, k):
+        """Indices of the k best matching documents, best first; [] when nothing matches"""
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            idf = self.idf.get(term)
+            if not idf:
+                continue
+            for doc_id, frequency in self.postings[term]:
+                length_norm = 1 - self.b + self.b * self.doc_lengths[doc_id] / (self.avg_length or 1)
+                scores[doc_id] += idf * frequency * (self.k1 + 1) / (frequency + self.k1 * length_norm)
+        # Ties keep the CSV order so results are deterministic
+        return heapq.nsmallest(k, scores, key=lambda doc_id: (-scores[doc_id], doc_id))
+
+class ExampleRetriever:
+    """Ranks few-shot examples and key-value rows by similarity to a feature
+
+    Both indexes are built once when the CSVs are loaded. Features that share
+    no vocabulary with the rows fall back to the first rows, as before.
+    """
+
+    def __init__(self, few_shot_examples, key_value_pairs):
+        self.few_shot_examples = few_shot_examples
+        self.key_value_pairs = key_value_pairs
+        self.example_index = BM25Index([
+            f"{example.get('Input', '')} {example.get('Output', '')}" for example in few_shot_examples
+        ])
+        self.key_value_index = BM25Index([' '.join(str(value) for value in kv.values()) for kv in key_value_pairs])
+        logger.info(f"Indexed {len(few_shot_examples)} few-shot examples and {len(key_value_pairs)} key-value pairs")
+
+    @staticmethod
+    def feature_query(feature_data):
+        """Search text of a feature: its name, module and description"""
+        return ' '.join(str(feature_data.get(field) or '') for field in (
+            'feature_name', 'name', 'module', 'description'
+        ))
+
+    def examples_for(self, query, k):
+        return self._top(self.example_index, self.few_shot_examples, query, k)
+
+    def key_values_for(self, query, k):
+        return self._top(self.key_value_index, self.key_value_pairs, query, k)
+
+    @staticmethod
+    def _top(index, rows, query, k):
+        if k <= 0:
+            return []
+        ranked = index.search(query, k)
+        if not ranked:
+            return rows[:k]
+        return [rows[doc_id] for doc_id in ranked]
@@ -0,0 +1,305 @@
+"""
+Deterministic local stand-in for the google.generativeai module
+
+FakeGeminiBackend offers the parts of the SDK GeminiClient uses (configure,
+GenerativeModel with generate_content[_async], streaming and usage metadata)
+and answers with schema-valid features and test cases derived from the prompt.
+Latency, token throughput, 429s, timeouts and malformed JSON are injected at
+configurable rates so the whole pipeline can be load tested offline.
+"""
+import asyncio
+import enum
+import hashlib
+import json
+import logging
+import random
+import re
+import threading
+import time
+
+from config import Config
+from token_budget import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+class FinishReason(enum.IntEnum):
+    """Same values as the SDK's Candidate.FinishReason"""
+    STOP = 1
+    MAX_TOKENS = 2
+
+class ResourceExhausted(Exception):
+    """Injected quota error, worded like the API's 429 response"""
+    code = 429
+
+class DeadlineExceeded(Exception):
+    """Injected timeout, named like the API's 504 error so it is classified as one"""
+    code = 504
+
+class UsageMetadata:
+    def __init__(self, prompt_token_count, candidates_token_count):
+        self.prompt_token_count = prompt_token_count
+        self.candidates_token_count = candidates_token_count
+        self.total_token_count = prompt_token_count + candidates_token_count
+
+class Candidate:
+    def __init__(self, finish_reason):
+        self.finish_reason = finish_reason
+
+class Chunk:
+    def __init__(self, text):
+        self.text = text
+
+class FakeResponse:
+    """Complete (non-streaming) response"""
+
+    def __init__(self, text, usage_metadata, finish_reason):
+        self.text = text
+        self.usage_metadata = usage_metadata
+        self.candidates = [Candidate(finish_reason)]
+
+class FakeStreamResponse:
+    """Streaming response: iterate for chunks; text and usage are complete after the last chunk"""
+
+    def __init__(self, backend, answer, ttft):
+        self.backend = backend
+        self.answer = answer
+        self.ttft = ttft
+        self.usage_metadata = None
+        self.candidates = []
+
+    def _finish(self):
+        self.usage_metadata = self.answer['usage']
+        self.candidates = [Candidate(self.answer['finish_reason'])]
+
+    @property
+    def text(self):
+        return self.answer['text']
+
+    def __iter__(self):
+        time.sleep(self.ttft)
+        for piece, delay in self.backend.stream_pieces(self.answer['text']):
+            yield Chunk(piece)
+            time.sleep(delay)
+        self._finish()
+
+    async def __aiter__(self):
+        await asyncio.sleep(self.ttft)
+        for piece, delay in self.backend.stream_pieces(self.answer['text']):
+            yield Chunk(piece)
+            await asyncio.sleep(delay)
+        self._finish()
+
+class FakeGenerativeModel:
+    """GenerativeModel look-alike bound to a FakeGeminiBackend"""
+
+    backend = None
+
+    def __init__(self, model_name, system_instruction=None):
+        self.model_name = model_name
+        self.system_instruction = system_instruction or ''
+
+    def generate_content(self, contents, generation_config=None, stream=False):
+        answer, ttft, duration = self.backend.answer(self, contents, generation_config)
+        if answer is None:
+            time.sleep(duration)
+            raise DeadlineExceeded('504 Deadline Exceeded')
+        if stream:
+            return FakeStreamResponse(self.backend, answer, ttft)
+        time.sleep(duration)
+        return FakeResponse(answer['text'], answer['usage'], answer['finish_reason'])
+
+    async def generate_content_async(self, contents, generation_config=None, stream=False):
+        answer, ttft, duration = self.backend.answer(self, contents, generation_config)
+        if answer is None:
+            await asyncio.sleep(duration)
+            raise DeadlineExceeded('504 Deadline Exceeded')
+        if stream:
+            return FakeStreamResponse(self.backend, answer, ttft)
+        await asyncio.sleep(duration)
+        return FakeResponse(answer['text'], answer['usage'], answer['finish_reason'])
+
+class FakeGeminiBackend:
+    """Module-shaped stand-in for google.generativeai with latency and fault injection
+
+    Response content depends only on the prompt, so the same prompt always gets
+    the same answer. Latency and faults are drawn from one seeded generator, so
+    a serial run is reproducible and retries of a failed call can succeed.
+    Latency is lognormal around latency_ms (time to first token) plus output
+    tokens at tokens_per_second.
+    """
+
+    def __init__(self, latency_ms=800, latency_sigma=0.5, tokens_per_second=150, rate_limit_rate=0.0,
+                 timeout_rate=0.0, malformed_rate=0.0, timeout_seconds=5.0, seed=0, time_scale=1.0):
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.tokens_per_second = tokens_per_second
+        self.rate_limit_rate = rate_limit_rate
+        self.timeout_rate = timeout_rate
+        self.malformed_rate = malformed_rate
+        self.timeout_seconds = timeout_seconds
+        # Multiplies every delay; 0 makes the fake answer instantly
+        self.time_scale = time_scale
+        self.calls = 0
+        self.faults = {'rate_limit': 0, 'timeout': 0, 'malformed': 0}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.GenerativeModel = type('GenerativeModel', (FakeGenerativeModel,), {'backend': self})
+
+    @classmethod
+    def from_config(cls):
+        return cls(
+            latency_ms=Config.FAKE_GEMINI_LATENCY_MS,
+            latency_sigma=Config.FAKE_GEMINI_LATENCY_SIGMA,
+            tokens_per_second=Config.FAKE_GEMINI_TOKENS_PER_SECOND,
+            rate_limit_rate=Config.FAKE_GEMINI_429_RATE,
+            timeout_rate=Config.FAKE_GEMINI_TIMEOUT_RATE,
+            malformed_rate=Config.FAKE_GEMINI_MALFORMED_RATE,
+            timeout_seconds=Config.FAKE_GEMINI_TIMEOUT_SECONDS,
+            seed=Config.FAKE_GEMINI_SEED
+        )
+
+    def configure(self, api_key=None, **kwargs):
+        """No-op: the fake needs no credentials"""
+
+    def get_stats(self):
+        with self._lock:
+            return {'calls': self.calls, **self.faults}
+
+    def answer(self, model, contents, generation_config):
+        """Draw latency and faults for one call; returns (answer or None on timeout, ttft, total seconds)
+
+        Structured output (response_mime_type application/json) rules out the
+        malformed-JSON defects; only the MAX_TOKENS cut-off remains.
+        """
+        generation_config = generation_config or {}
+        json_mode = generation_config.get('response_mime_type') == 'application/json'
+        with self._lock:
+            self.calls += 1
+            draw = self._random.random()
+            malformed = self._random.random() < self.malformed_rate and not json_mode
+            ttft = self.latency_ms / 1000.0 * self._random.lognormvariate(0, self.latency_sigma)
+            if draw < self.rate_limit_rate:
+                self.faults['rate_limit'] += 1
+                raise ResourceExhausted('429 Resource has been exhausted (e.g. check quota).')
+            if draw < self.rate_limit_rate + self.timeout_rate:
+                self.faults['timeout'] += 1
+                return None, 0.0, self.timeout_seconds * self.time_scale
+            if malformed:
+                self.faults['malformed'] += 1
+
+        prompt = model.system_instruction + '\n\n' + contents
+        max_output_tokens = generation_config.get('max_output_tokens') or Config.MAX_OUTPUT_TOKENS
+        text, finish_reason = self._respond(contents, max_output_tokens)
+        if malformed:
+            text = self._malform(text, prompt)
+        usage = UsageMetadata(estimate_tokens(prompt), estimate_tokens(text))
+        answer = {'text': text, 'usage': usage, 'finish_reason': finish_reason}
+        ttft *= self.time_scale
+        return answer, ttft, ttft + usage.candidates_token_count / self.tokens_per_second * self.time_scale
+
+    def stream_pieces(self, text, chars_per_piece=200):
+        """Split a response into stream chunks with the delay that follows each"""
+        for start in range(0, len(text), chars_per_piece):
+            piece = text[start:start + chars_per_piece]
+            yield piece, estimate_tokens(piece) / self.tokens_per_second * self.time_scale
+
+    def _respond(self, contents, max_output_tokens):
+        """Response JSON derived from the per-call prompt, cut at max_output_tokens like the API"""
+        rng = random.Random(hashlib.sha256(contents.encode('utf-8')).hexdigest())
+        if 'FRD Content' in contents:
+            frd_content = contents[contents.index('FRD Content'):].split('\n', 1)[-1]
+            extracted = _EXTRACTED.search(contents)
+            data = {'features': fake_features(frd_content, rng, skip=int(extracted.group(1)) if extracted else 0)}
+        else:
+            data = {'test_cases': fake_test_cases(contents, rng)}
+        text = json.dumps(data, indent=2)
+
+        if estimate_tokens(text) <= max_output_tokens:
+            return text, FinishReason.STOP
+        # Approximate the cut-off point by the character share of the allowed tokens
+        return text[:int(len(text) * max_output_tokens / estimate_tokens(text))], FinishReason.MAX_TOKENS
+
+    def _malform(self, text, prompt):
+        """One of the defects seen in real responses: fences with prose, trailing commas or a cut-off"""
+        with self._lock:
+            defect = self._random.randrange(3)
+        if defect == 0:
+            return f"Here is the JSON you asked for:\n```json\n{text}\n```\nLet me know if you need more."
+        if defect == 1:
+            return re.sub(r'\}(\s*)\]', r'},\1]', text, count=1)
+        return text[:len(text) * 2 // 3]
+
+_FEATURE_LINE = re.compile(r'\b(shall|must|should|will|can|allow|support)\b', re.IGNORECASE)
+_FEATURE_ID = re.compile(r'- Feature ID: (.*)')
+_FEATURE_NAME = re.compile(r'- Feature Name: (.*)')
+_MODULE = re.compile(r'- Module: (.*)')
+_FRD_LINE = re.compile(r'- FRD Line: (.*)')
+_COUNT = re.compile(r'Generate (\d+)(?:-(\d+))? test cases')
+_REMAINDER = re.compile(r'The following (\d+) test cases were already generated')
+_EXTRACTED = re.compile(r'The following (\d+) features were already extracted')
+_TEST_TYPES = ['Positive', 'Negative', 'Boundary', 'Edge', 'Conflict', 'Fallback', 'Integration', 'Compatibility']
+_PRIORITIES = ['High', 'Medium', 'Low']
+
+def fake_features(frd_content, rng, max_features=40, skip=0):
+    """One feature per requirement-like sentence of the FRD, after the first skip (already extracted) ones"""
+    sentences = [sentence.strip() for sentence in re.split(r'(?<=[.!?])\s+|\n+', frd_content) if sentence.strip()]
+    requirements = [sentence for sentence in sentences if _FEATURE_LINE.search(sentence) and len(sentence.split()) >= 4]
+    features = []
+    for number, sentence in enumerate(requirements[skip:max_features], skip + 1):
+        words = re.findall(r'[A-Za-z]+', sentence)
+        name = ' '.join(words[:4]).title() or f'Feature {number}'
+        features.append({
+            'feature_id': f'F{number:03d}',
+            'feature_name': name,
+            'description': sentence,
+            'requirements': [sentence],
+            'acceptance_criteria': [f'{name} works as described'],
+            'priority': rng.choice(_PRIORITIES),
+            'module': words[0].title() if words else 'Core',
+            'frd_line': sentence
+        })
+    return features
+
+def fake_test_cases(contents, rng):
+    """Test cases for every feature in a test case (or batch or remainder) request"""
+    count_match = _COUNT.search(contents)
+    if count_match:
+        low = int(count_match.group(1))
+        high = int(count_match.group(2) or low)
+    else:
+        low, high = 15, 25
+    remainder = _REMAINDER.search(contents)
+    received = int(remainder.group(1)) if remainder else 0
+
+    feature_ids = _FEATURE_ID.findall(contents)
+    names = _FEATURE_NAME.findall(contents)
+    modules = _MODULE.findall(contents)
+    frd_lines = _FRD_LINE.findall(contents)
+    test_cases = []
+    for index, feature_id in enumerate(feature_ids):
+        name = names[index] if index < len(names) else feature_id
+        # A requested count is what is still missing; the default 15-25 is the feature's total
+        count = rng.randint(low, high) if count_match else max(0, rng.randint(low, high) - received)
+        for number in range(received + 1, received + count + 1):
+            test_type = _TEST_TYPES[(number - 1) % len(_TEST_TYPES)]
+            steps = '\n'.join(f'{step}. {test_type} step {step} of {name} scenario {number}' for step in range(1, rng.randint(3, 6)))
+            test_cases.append({
+                'test_case_id': f'TC{number:03d}',
+                'test_case_name': f'{test_type} check {number} of {name}',
+                'feature_id': feature_id,
+                'feature_name': name,
+                'module': modules[index] if index < len(modules) else 'Core',
+                'test_type': test_type,
+                'priority': rng.choice(_PRIORITIES),
+                'preconditions': f'{name} is available',
+                'test_steps_formatted': (
+                    f'The following test scenario for the {name} feature is derived from the corresponding line '
+                    f'in the FRD document:\n\n{steps}\n\nExp: {name} behaves as specified'
+                ),
+                'test_data': f'Data set {number}',
+                'expected_result': f'{name} behaves as specified',
+                'category': 'Functional',
+                'frd_reference': frd_lines[index] if index < len(frd_lines) else '',
+                'gap_coverage': f'{test_type} coverage'
+            })
+    return test_cases
@@ -0,0 +1,170 @@
+"""
+Bounded concurrent fan-out for per-feature test case generation
+"""
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from async_runtime import get_async_runtime
+
+logger = logging.getLogger(__name__)
+
+def get_feature_display_name(feature, idx):
+    """Get the display name of a feature, falling back to its 1-based position"""
+    return feature.get('feature_name', feature.get('name', f'Feature_{idx}'))
+
+class FeatureResultSink:
+    """Delivers one feature's test cases to the job's result callback, each exactly once
+
+    Streamed test cases go out through on_test_case() as they are parsed; flush()
+    then delivers whatever the stream did not (cached or non-streamed results).
+    """
+
+    def __init__(self, result_callback, tag_test_case):
+        self.result_callback = result_callback
+        self.tag_test_case = tag_test_case
+        self.delivered = 0
+
+    def on_test_case(self, test_case):
+        self.delivered += 1
+        self.result_callback(self.tag_test_case(dict(test_case)))
+
+    def flush(self, test_cases):
+        for test_case in (test_cases or [])[self.delivered:]:
+            self.result_callback(test_case)
+        self.delivered = max(self.delivered, len(test_cases or []))
+
+def run_features(features, worker, max_workers=1, progress_callback=None):
+    """Run worker(idx, feature) for every feature and return the results in feature order
+
+    idx is 1-based. A feature whose worker raises gets None as its result so one
+    failure never affects the others. With max_workers <= 1 features run serially.
+    """
+    total = len(features)
+    results = [None] * total
+    callback_lock = threading.Lock()
+
+    def run_one(position):
+        idx = position + 1
+        feature = features[position]
+        feature_name = get_feature_display_name(feature, idx)
+
+        logger.info(f"Generating test cases for Feature {idx}/{total}: {feature_name}")
+        if progress_callback:
+            with callback_lock:
+                progress_callback(f"Generating test cases for feature {idx}/{total}: {feature_name}")
+
+        try:
+            results[position] = worker(idx, feature)
+        except Exception as e:
+            logger.error(f"Error generating test cases for feature {feature_name}: {e}")
+            results[position] = None
+
+    if max_workers <= 1 or total <= 1:
+        for position in range(total):
+            run_one(position)
+        return results
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, total), thread_name_prefix='feature') as executor:
+        # run_one never raises, so draining the iterator only waits for completion
+        list(executor.map(run_one, range(total)))
+
+    return results
+
+def pack_feature_batches(costs, max_input_tokens, max_output_tokens, max_batch_size):
+    """Group consecutive items into batches within the input/output token budgets
+
+    costs holds one (input_tokens, output_tokens) pair per feature. An item that
+    exceeds a budget on its own gets a batch of its own; items costing nothing
+    (e.g. cached features) ride along without counting towards max_batch_size.
+    Returns lists of 0-based positions in feature order.
+    """
+    batches = []
+    current = []
+    input_tokens = output_tokens = size = 0
+    for position, (item_input, item_output) in enumerate(costs):
+        counts = 1 if (item_input or item_output) else 0
+        if current and (
+            input_tokens + item_input > max_input_tokens
+            or output_tokens + item_output > max_output_tokens
+            or size + counts > max_batch_size
+        ):
+            batches.append(current)
+            current = []
+            input_tokens = output_tokens = size = 0
+        current.append(position)
+        input_tokens += item_input
+        output_tokens += item_output
+        size += counts
+    if current:
+        batches.append(current)
+    return batches
+
+def run_feature_batches(features, batches, worker, max_workers=1, progress_callback=None):
+    """Run worker(batch) for every batch and return per-feature results in feature order
+
+    batch is a list of (idx, feature) pairs with 1-based idx, and worker returns
+    one result per pair. A batch whose worker raises yields None for each of its
+    features.
+    """
+    total = len(features)
+    results = [None] * total
+    callback_lock = threading.Lock()
+
+    def run_one(batch_number):
+        positions = batches[batch_number]
+        batch = [(position + 1, features[position]) for position in positions]
+        first, last = batch[0][0], batch[-1][0]
+        span = f"feature {first}" if first == last else f"features {first}-{last}"
+
+        logger.info(f"Generating test cases for {span}/{total} (batch {batch_number + 1}/{len(batches)})")
+        if progress_callback:
+            with callback_lock:
+                progress_callback(f"Generating test cases for {span}/{total}")
+
+        try:
+            batch_results = worker(batch)
+        except Exception as e:
+            logger.error(f"Error generating test cases for {span}: {e}")
+            return
+        for position, result in zip(positions, batch_results):
+            results[position] = result
+
+    if max_workers <= 1 or len(batches) <= 1:
+        for batch_number in range(len(batches)):
+            run_one(batch_number)
+        return results
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(batches)), thread_name_prefix='feature') as executor:
+        list(executor.map(run_one, range(len(batches))))
+
+    return results
+
+def run_features_async(features, worker, progress_callback=None):
+    """Run the coroutine worker(idx, feature) for every feature on the shared event loop
+
+    The calling thread blocks until all features finish; concurrency is bounded
+    by the runtime's in-flight limit rather than by a thread pool. Results keep
+    feature order and a failing feature yields None.
+    """
+    total = len(features)
+
+    async def run_one(position):
+        idx = position + 1
+        feature = features[position]
+        feature_name = get_feature_display_name(feature, idx)
+
+        logger.info(f"Generating test cases for Feature {idx}/{total}: {feature_name}")
+        if progress_callback:
+            progress_callback(f"Generating test cases for feature {idx}/{total}: {feature_name}")
+
+        try:
+            return await worker(idx, feature)
+        except Exception as e:
+            logger.error(f"Error generating test cases for feature {feature_name}: {e}")
+            return None
+
+    async def run_all():
+        return await asyncio.gather(*(run_one(position) for position in range(total)))
+
+    return list(get_async_runtime().run(run_all()))
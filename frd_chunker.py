@@ -0,0 +1,152 @@
+"""
+Section-aware chunking of large FRDs and merging of per-chunk feature extractions
+"""
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+# Lines that start a new section: numbered headings ("3.2 Partial Result"), markdown
+# headings, "Feature:" / "Section 4" style labels and short ALL-CAPS titles
+SECTION_HEADING = re.compile(
+    r'^\s*(?:'
+    r'\d+(?:\.\d+)*[.)]?\s+\S'
+    r'|#{1,6}\s+\S'
+    r'|(?:feature|section|chapter|module|requirement)s?\b[\s:#-]*\S'
+    r'|[A-Z][A-Z0-9 &/\-]{3,60}$'
+    r')',
+    re.IGNORECASE
+)
+
+def _iter_lines(pieces):
+    """Lines (with their line ends) of text arriving in pieces that may break lines anywhere"""
+    pending = ''
+    for piece in pieces:
+        lines = (pending + piece).splitlines(keepends=True)
+        pending = lines.pop() if lines and lines[-1].splitlines()[0] == lines[-1] else ''
+        yield from lines
+    if pending:
+        yield pending
+
+def iter_sections(pieces):
+    """Yield the sections of text arriving in pieces (e.g. document pages), each once its next heading is read"""
+    current = []
+    for line in _iter_lines(pieces):
+        if current and SECTION_HEADING.match(line) and line.strip():
+            yield ''.join(current)
+            current = []
+        current.append(line)
+    if current:
+        yield ''.join(current)
+
+def split_into_sections(text):
+    """Split text into sections, each starting at a heading line"""
+    return list(iter_sections([text]))
+
+def _split_oversized(section, chunk_size):
+    """Split a section longer than chunk_size at paragraph, then line, then hard boundaries"""
+    pieces = []
+    while len(section) > chunk_size:
+        cut = section.rfind('\n\n', 0, chunk_size)
+        if cut < chunk_size // 2:
+            cut = section.rfind('\n', 0, chunk_size)
+        if cut < chunk_size // 2:
+            cut = chunk_size
+        pieces.append(section[:cut])
+        section = section[cut:]
+    if section:
+        pieces.append(section)
+    return pieces
+
+def _overlap_tail(text, overlap):
+    """The last `overlap` characters of text, starting at a line boundary when possible"""
+    if overlap <= 0 or len(text) <= overlap:
+        return text if overlap > 0 else ''
+    tail = text[-overlap:]
+    newline = tail.find('\n')
+    if 0 <= newline < len(tail) // 2:
+        tail = tail[newline + 1:]
+    return tail
+
+def split_frd_into_chunks(text, chunk_size, overlap):
+    """Pack sections into chunks of at most chunk_size characters plus overlap
+
+    Each chunk after the first starts with the tail of the previous chunk, so a
+    feature described across a section boundary is fully visible in at least
+    one chunk.
+    """
+    if len(text) <= chunk_size:
+        return [text]
+    return list(iter_frd_chunks([text], chunk_size, overlap))
+
+def iter_frd_chunks(pieces, chunk_size, overlap):
+    """split_frd_into_chunks over text arriving in pieces, yielding each chunk as soon as it is full
+
+    Only the section being read and the chunk being packed are held, so chunks
+    can be processed while the rest of the document is still being parsed.
+    """
+    previous = None
+    current = []
+    current_len = 0
+    for section in iter_sections(pieces):
+        for unit in _split_oversized(section, chunk_size):
+            if current and current_len + len(unit) > chunk_size:
+                chunk = ''.join(current)
+                yield chunk if previous is None else _overlap_tail(previous, overlap) + chunk
+                previous = chunk
+                current = []
+                current_len = 0
+            current.append(unit)
+            current_len += len(unit)
+    if current:
+        chunk = ''.join(current)
+        yield chunk if previous is None else _overlap_tail(previous, overlap) + chunk
+
+def _feature_key(feature):
+    name = feature.get('feature_name', feature.get('name', '')) or ''
+    return re.sub(r'[^a-z0-9]+', ' ', name.lower()).strip()
+
+def _merge_lists(first, second):
+    merged = list(first or [])
+    seen = {str(item).strip().lower() for item in merged}
+    for item in second or []:
+        marker = str(item).strip().lower()
+        if marker not in seen:
+            seen.add(marker)
+            merged.append(item)
+    return merged
+
+def merge_chunk_features(chunk_results):
+    """Merge per-chunk extraction results into one feature list
+
+    Features found in several (overlapping) chunks are matched by normalized
+    name; their requirement and acceptance criteria lists are unioned and the
+    longer description kept. Feature IDs are renumbered in document order.
+    """
+    merged = []
+    by_key = {}
+    for result in chunk_results:
+        if not result:
+            continue
+        for feature in result.get('features', []):
+            key = _feature_key(feature)
+            existing = by_key.get(key) if key else None
+            if existing is None:
+                feature = dict(feature)
+                merged.append(feature)
+                if key:
+                    by_key[key] = feature
+                continue
+
+            existing['requirements'] = _merge_lists(existing.get('requirements'), feature.get('requirements'))
+            existing['acceptance_criteria'] = _merge_lists(existing.get('acceptance_criteria'), feature.get('acceptance_criteria'))
+            if len(feature.get('description') or '') > len(existing.get('description') or ''):
+                existing['description'] = feature['description']
+            for field in ('module', 'priority', 'frd_line'):
+                if not existing.get(field) and feature.get(field):
+                    existing[field] = feature[field]
+
+    for idx, feature in enumerate(merged, 1):
+        feature['feature_id'] = f'F{idx:03d}'
+
+    return {'features': merged}
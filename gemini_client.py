@@ -1,245 +1,1234 @@
 import google.generativeai as genai
+from google.ai import generativelanguage as glm
 from config import Config
-import json
-import time
+import asyncio
 import logging
 import csv
+import gc
+import itertools
 import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, TimeoutError as FutureTimeoutError, wait
+from feature_runner import pack_feature_batches
+from async_runtime import get_async_runtime
+from rate_limiter import get_rate_limiter, is_rate_limit_error
+from api_key_pool import ApiKeyPool
+from response_cache import ResponseCache, make_cache_key, normalize_text
+from prompt_engine import PromptEngine, StaticContextModels
+from example_index import ExampleRetriever
+from fake_gemini import FakeGeminiBackend
+from model_router import ModelRouter
+from hedging import HedgePolicy
+from circuit_breaker import CircuitBreakers, CircuitOpenError
+from frd_chunker import split_frd_into_chunks, iter_frd_chunks, merge_chunk_features
+from stream_parser import IncrementalArrayParser
+from json_repair import parse_llm_json
+from response_schema import FEATURE_SCHEMA, TEST_CASE_SCHEMA, SchemaError, validate_response, validate_item
+from token_budget import PromptBudgetPlanner, input_token_limit
+from retry_policy import RetryState, IncompleteResponseError, classify_error
+from job_context import JobContext
+from telemetry import OK, TRUNCATED
 
 # Using pandas-free implementation for Render compatibility
 PANDAS_AVAILABLE = False
 
+# Bump when a prompt template changes so responses cached for the old prompt are not reused
+FEATURE_EXTRACTION_PROMPT_VERSION = '4'
+TEST_CASE_PROMPT_VERSION = '4'
+
+# JSON schema Gemini's answer is constrained to, by call kind
+RESPONSE_SCHEMAS = {'extraction': FEATURE_SCHEMA, 'test_cases': TEST_CASE_SCHEMA}
+
+# Feature fields that shape the test case prompt; a change in any of them regenerates the feature
+FEATURE_FINGERPRINT_FIELDS = (
+    'feature_id', 'feature_name', 'description', 'requirements',
+    'acceptance_criteria', 'frd_line', 'module'
+)
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-class GeminiClient:
-    def __init__(self):
-        if not Config.GEMINI_API_KEY:
-            raise ValueError("GEMINI_API_KEY is required")
+class TestCaseCollector:
+    """Accumulates one feature's test cases across the first response and remainder re-asks
+    
+    Test cases repeated by a later response are dropped, so on_test_case sees each
+    test case once.
+    """
+    
+    def __init__(self, on_test_case=None):
+        self.on_test_case = on_test_case
+        self.test_cases = []
+        self.continuations = 0
+        # Models that answered, so the result is cached only when one model gave all of it
+        self.models = set()
+        self._seen = set()
+    
+    @staticmethod
+    def _key(test_case):
+        return (
+            normalize_text(str(test_case.get('test_case_name', ''))).lower(),
+            normalize_text(str(test_case.get('test_steps_formatted', ''))).lower()
+        )
+    
+    def add(self, test_case):
+        """Add a test case unless it was seen before; returns whether it was new"""
+        key = self._key(test_case)
+        if key in self._seen:
+            return False
+        self._seen.add(key)
+        self.test_cases.append(test_case)
+        if self.on_test_case is not None:
+            self.on_test_case(test_case)
+        return True
+    
+    def add_all(self, test_cases):
+        """Add several test cases; returns how many were new"""
+        return sum(1 for test_case in test_cases if self.add(test_case))
+
+def _read_csv_rows(csv_path):
+    """Rows of a reference CSV as dicts; the BOM some editors write is dropped from the first header"""
+    try:
+        if os.path.exists(csv_path):
+            with open(csv_path, 'r', encoding='utf-8-sig') as file:
+                return list(csv.DictReader(file))
+        logger.warning(f"{csv_path} not found, prompts will not include its rows")
+        return []
+    except Exception as e:
+        logger.error(f"Error loading {csv_path}: {e}")
+        return []
+
+class ReferenceData:
+    """Few-shot examples and key-value pairs with their retrieval index, read-only once loaded
+
+    Loaded once per process and shared by every client and thread. Rows are
+    kept in tuples so no caller can change the shared data in place.
+    """
+
+    def __init__(self, few_shot_examples, key_value_pairs):
+        self.few_shot_examples = tuple(few_shot_examples)
+        self.key_value_pairs = tuple(key_value_pairs)
+        # Ranks the examples and key-value rows per feature so prompts only carry the relevant ones
+        self.retriever = None
+        if Config.FEW_SHOT_RETRIEVAL:
+            self.retriever = ExampleRetriever(self.few_shot_examples, self.key_value_pairs)
+        self.digest = make_cache_key('references', self.few_shot_examples, self.key_value_pairs)
+
+_reference_data = None
+_client = None
+_client_pid = None
+_registry_lock = threading.Lock()
+
+def load_reference_data():
+    """Get the process-wide ReferenceData, reading Few_Shot_Prompting_Rib.csv and Key_Value_Pair_.csv once"""
+    global _reference_data
+    with _registry_lock:
+        if _reference_data is None:
+            _reference_data = ReferenceData(
+                _read_csv_rows('Few_Shot_Prompting_Rib.csv'), _read_csv_rows('Key_Value_Pair_.csv')
+            )
+        return _reference_data
+
+def get_gemini_client():
+    """Get the process-wide GeminiClient, shared by all jobs and threads
+
+    A forked worker gets its own client on first use: gRPC channels and the
+    limiter state must not be inherited from the parent, while the reference
+    data loaded before the fork is reused.
+    """
+    global _client, _client_pid
+    reference_data = load_reference_data()
+    with _registry_lock:
+        if _client is None or _client_pid != os.getpid():
+            _client = GeminiClient(reference_data)
+            _client_pid = os.getpid()
+        return _client
+
+def get_existing_gemini_client():
+    """The process-wide GeminiClient if this process already created one, else None (never creates it)"""
+    with _registry_lock:
+        return _client if _client_pid == os.getpid() else None
+
+def preload_gemini_client():
+    """Load the fork-safe part of the client (reference data and index) ahead of the workers
+
+    Called at import time of the app, so with gunicorn --preload the master
+    loads it once and the workers share its memory copy-on-write. Frozen
+    objects are not scanned by the garbage collector, which would otherwise
+    touch (and so copy) their pages in every worker.
+    """
+    load_reference_data()
+    gc.freeze()
+
+class KeyBoundGenai:
+    """google.generativeai look-alike whose models call the API with one key of the pool
+    
+    genai.configure() sets a single process-wide key, so the models of a bound
+    backend get their own service clients instead. The async client is created
+    on first use, inside the event loop that uses it. Context caching is not
+    offered (CachedContent goes through the process-wide key), so static
+    instructions are sent as system instructions.
+    """
+    
+    def __init__(self, genai_module, api_key):
+        self.api_key = api_key
+        self._client = None
+        self._async_client = None
+        self._lock = threading.Lock()
+        bound = self
+        
+        class GenerativeModel(genai_module.GenerativeModel):
+            def generate_content(self, *args, **kwargs):
+                self._client = bound.client()
+                return super().generate_content(*args, **kwargs)
             
-        genai.configure(api_key=Config.GEMINI_API_KEY)
-        self.model = genai.GenerativeModel(Config.GEMINI_MODEL)
+            async def generate_content_async(self, *args, **kwargs):
+                self._async_client = bound.async_client()
+                return await super().generate_content_async(*args, **kwargs)
+        
+        self.GenerativeModel = GenerativeModel
+    
+    def configure(self, **kwargs):
+        """Bound to its own key; the process-wide configuration does not apply"""
+    
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                self._client = glm.GenerativeServiceClient(client_options={'api_key': self.api_key})
+            return self._client
+    
+    def async_client(self):
+        with self._lock:
+            if self._async_client is None:
+                self._async_client = glm.GenerativeServiceAsyncClient(client_options={'api_key': self.api_key})
+            return self._async_client
+
+def create_backend(api_key=None):
+    """The module-shaped Gemini backend selected by GEMINI_BACKEND: the SDK, or the local fake
+    
+    With api_key the backend is bound to that key of the pool instead of the
+    process-wide configured key.
+    """
+    if Config.GEMINI_BACKEND == 'fake':
+        if api_key is None:
+            logger.warning("Using the local fake Gemini backend, responses are synthetic")
+        return FakeGeminiBackend.from_config()
+    if not (Config.GEMINI_API_KEYS or Config.GEMINI_API_KEY):
+        raise ValueError("GEMINI_API_KEY or GEMINI_API_KEYS is required")
+    return KeyBoundGenai(genai, api_key) if api_key else genai
+
+class GeminiClient:
+    def __init__(self, reference_data=None, backend=None, key_pool=None):
+        # Anything shaped like google.generativeai: configure(), GenerativeModel and optionally caching
+        self.backend = backend or create_backend()
+        api_keys = Config.GEMINI_API_KEYS or [Config.GEMINI_API_KEY]
+        self.backend.configure(api_key=api_keys[0])
+        
+        # One backend and rate limiter per API key, shared by every job in the process;
+        # each call goes to the key with the most quota headroom
+        self.key_pool = key_pool or self._create_key_pool(api_keys, shared_backend=backend is not None)
+        self.models = {key.name: key.backend.GenerativeModel(Config.GEMINI_MODEL) for key in self.key_pool.keys}
+        
+        # Few-shot examples, key-value pairs and their index are read once per process and shared
+        reference_data = reference_data or load_reference_data()
+        self.few_shot_examples = reference_data.few_shot_examples
+        self.key_value_pairs = reference_data.key_value_pairs
+        self.example_retriever = reference_data.retriever
+        self.reference_digest = reference_data.digest
+        
+        # Decides per call what fits the model window and how many test cases fit MAX_OUTPUT_TOKENS
+        self.budget_planner = PromptBudgetPlanner(
+            Config.GEMINI_MAX_INPUT_TOKENS or input_token_limit(Config.GEMINI_MODEL),
+            Config.MAX_OUTPUT_TOKENS,
+            tokens_per_test_case=Config.TOKENS_PER_TEST_CASE
+        )
+        
+        # Picks the model per call (fast model for small tasks) and tracks per-model latency and tokens
+        self.model_router = ModelRouter(
+            Config.GEMINI_MODEL, Config.GEMINI_FAST_MODEL, Config.GEMINI_MODEL_MODE,
+            fast_tasks=Config.FAST_MODEL_TASKS,
+            fast_max_input_tokens=Config.FAST_MODEL_MAX_INPUT_TOKENS,
+            fast_max_complexity=Config.FAST_MODEL_MAX_COMPLEXITY
+        )
+        
+        # Fail fast (or fall back to another model) while a model is timing out or erroring
+        self.circuit_breakers = CircuitBreakers(
+            Config.CIRCUIT_BREAKER_ENABLED,
+            failure_threshold=Config.CIRCUIT_BREAKER_FAILURE_THRESHOLD,
+            slow_call_seconds=Config.CIRCUIT_BREAKER_SLOW_CALL_SECONDS,
+            window=Config.CIRCUIT_BREAKER_WINDOW,
+            min_calls=Config.CIRCUIT_BREAKER_MIN_CALLS,
+            open_seconds=Config.CIRCUIT_BREAKER_OPEN_SECONDS
+        )
+        
+        # Duplicate calls that run past the model's usual latency, capped at a share of all calls
+        self.hedge_policy = HedgePolicy(
+            self.model_router, Config.HEDGE_REQUESTS, Config.HEDGE_PERCENTILE,
+            Config.HEDGE_MIN_SAMPLES, Config.HEDGE_MIN_DELAY, Config.HEDGE_MAX_RATE
+        )
+        self._hedge_executor = ThreadPoolExecutor(max_workers=Config.GEMINI_MAX_IN_FLIGHT, thread_name_prefix='gemini-hedge')
+        
+        # Static prompt sections are compiled once and sent as a system instruction or cached content
+        self.prompt_engine = PromptEngine(
+            self.few_shot_examples, self.key_value_pairs, Config.MAX_FRD_CHARS,
+            planner=self.budget_planner, static_token_budget=Config.STATIC_PROMPT_TOKEN_BUDGET,
+            retriever=self.example_retriever,
+            examples_per_feature=Config.FEW_SHOT_EXAMPLES_PER_FEATURE,
+            key_values_per_feature=Config.KEY_VALUES_PER_FEATURE
+        )
+        self.static_models = {
+            key.name: StaticContextModels(key.backend, Config.GEMINI_CONTEXT_CACHING, Config.GEMINI_CONTEXT_CACHE_TTL)
+            for key in self.key_pool.keys
+        }
+        
+        # Persistent cache of feature extractions keyed by FRD content
+        self.feature_cache = None
+        if Config.RESPONSE_CACHE_ENABLED:
+            self.feature_cache = ResponseCache(
+                os.path.join(Config.CACHE_FOLDER, 'features'), Config.FEATURE_CACHE_MAX_BYTES
+            )
+        
+        # Per-feature cache so revised FRDs only regenerate new or changed features
+        self.test_case_cache = None
+        if Config.RESPONSE_CACHE_ENABLED:
+            self.test_case_cache = ResponseCache(
+                os.path.join(Config.CACHE_FOLDER, 'test_cases'), Config.TEST_CASE_CACHE_MAX_BYTES
+            )
+    
+    def _create_key_pool(self, api_keys, shared_backend=False):
+        """A pool over GEMINI_API_KEYS; a single key (or an injected backend) keeps the process-wide limiter"""
+        pool = ApiKeyPool(Config.API_KEY_BENCH_SECONDS, Config.API_KEY_FAILURE_THRESHOLD)
+        if shared_backend or len(api_keys) < 2:
+            pool.add('default', self.backend, get_rate_limiter())
+            return pool
+        # Keys are named by position so they never show up in logs or status payloads
+        for index, api_key in enumerate(api_keys, 1):
+            pool.add(f"key{index}", create_backend(api_key), get_rate_limiter(f"key{index}"))
+        logger.info(f"Spreading Gemini calls over {len(api_keys)} API keys")
+        return pool
+    
+    def feature_cache_key(self, frd_content, model):
+        """Cache key for an extraction: FRD text, prompt version, compiled instruction and the model that answered"""
+        return make_cache_key(
+            'features',
+            FEATURE_EXTRACTION_PROMPT_VERSION,
+            model,
+            self.prompt_engine.extraction_instruction,
+            normalize_text(frd_content)
+        )
+    
+    def _cache_models(self, model):
+        """Models whose cached answers may serve a call routed to model
+        
+        Entries are keyed by the model that answered. The default model's answers
+        are good enough for any call, those of the fast or fallback model only for
+        calls routed to that model.
+        """
+        if model == self.model_router.default_model:
+            return [model]
+        return [model, self.model_router.default_model]
+    
+    @staticmethod
+    def _answering_model(models):
+        """The model that answered a request, None when several (or none) contributed to it"""
+        return next(iter(models)) if len(models) == 1 else None
+    
+    @staticmethod
+    def _answered(answered_by, plan):
+        if answered_by is not None:
+            answered_by.add(plan.model)
+    
+    @staticmethod
+    def _lookup(cache, keys):
+        """Cached value of the first of keys with an entry, counting one miss when none has"""
+        key = next((key for key in keys if cache.contains(key)), keys[0])
+        return cache.get(key)
+    
+    def _extraction_model(self, frd_content, job=None):
+        """Model an extraction of frd_content is routed to; that of its chunks when it is split"""
+        if len(frd_content) > Config.MAX_FRD_CHARS:
+            frd_content = frd_content[:Config.FRD_CHUNK_SIZE]
+        return self.plan_extraction_call(frd_content, job=job).model
+    
+    def _get_cached_features(self, frd_content, use_cache, model):
+        """Look up a previous extraction of the same FRD for a call routed to model"""
+        # Opted out: skip the lookup but still refresh the entry with the new result
+        if not self.feature_cache or not use_cache:
+            return None
         
-        # Load few-shot examples and key-value pairs
-        self.few_shot_examples = self.load_few_shot_examples()
-        self.key_value_pairs = self.load_key_value_pairs()
+        cached = self._lookup(self.feature_cache, [self.feature_cache_key(frd_content, candidate) for candidate in self._cache_models(model)])
+        if cached is not None:
+            logger.info(f"Using cached feature extraction ({len(cached.get('features', []))} features)")
+        return cached
     
-    def load_few_shot_examples(self):
-        """Load few-shot examples from CSV"""
+    def _store_features(self, frd_content, features_data, answered_by):
+        """Cache an extraction under the model that answered it; not when several models contributed"""
+        model = self._answering_model(answered_by)
+        # Salvaged responses are incomplete, so they are retried on the next run
+        if self.feature_cache and model and features_data and 'features' in features_data and not features_data.get('partial'):
+            self.feature_cache.set(self.feature_cache_key(frd_content, model), features_data)
+    
+    def extract_features_from_frd(self, frd_content, use_cache=True, job=None):
+        """Extract features from FRD document and return as JSON using few-shot prompting"""
+        cached = self._get_cached_features(frd_content, use_cache, self._extraction_model(frd_content, job))
+        if cached is not None:
+            return cached
+        
+        answered_by = set()
+        if len(frd_content) > Config.MAX_FRD_CHARS:
+            features_data = self._extract_features_chunked(frd_content, job, answered_by)
+        else:
+            features_data = self._extract_features_once(frd_content, job=job, answered_by=answered_by)
+        
+        self._store_features(frd_content, features_data, answered_by)
+        return features_data
+    
+    def extract_features_from_stream(self, pieces, use_cache=True, job=None, source_digest=None):
+        """extract_features_from_frd over an FRD arriving in pieces (e.g. DocumentProcessor pages)
+        
+        A document that fits one call is collected and extracted as before. A longer
+        one is chunked while it is read and each chunk's extraction starts as soon as
+        the chunk is full, so parsing and extraction overlap and the whole text is
+        never held at once. Such a document is cached under source_digest, a digest
+        of its source known before it is parsed (e.g. of the uploaded file), which is
+        looked up before any chunk is sent; without one it is not cached.
+        """
+        pieces = iter(pieces)
+        head = []
+        head_chars = 0
+        for piece in pieces:
+            head.append(piece)
+            head_chars += len(piece)
+            if head_chars > Config.MAX_FRD_CHARS:
+                break
+        else:
+            return self.extract_features_from_frd(''.join(head), use_cache, job)
+        
+        # The text is not kept, so the entry is keyed by the digest of its source
+        cache_text = f"source:{source_digest}" if source_digest else None
+        if cache_text:
+            cached = self._get_cached_features(cache_text, use_cache, self._extraction_model(''.join(head), job))
+            if cached is not None:
+                return cached
+        
+        answered_by = set()
+        results = []
+        pending = deque()
+        workers = max(1, Config.MAX_CONCURRENT_FEATURES)
+        executor = ThreadPoolExecutor(max_workers=workers)
         try:
-            csv_path = 'Few_Shot_Prompting_Rib.csv'
-            if os.path.exists(csv_path):
-                # Use native Python CSV reader
-                with open(csv_path, 'r', encoding='utf-8') as file:
-                    reader = csv.DictReader(file)
-                    return list(reader)
+            chunks = iter_frd_chunks(itertools.chain(head, pieces), Config.FRD_CHUNK_SIZE, Config.FRD_CHUNK_OVERLAP)
+            for part, chunk in enumerate(chunks, 1):
+                # Reading waits for the oldest chunk once enough are queued, so a document
+                # parsed faster than it is extracted is not held in memory after all
+                if len(pending) >= 2 * workers:
+                    results.append(pending.popleft().result())
+                pending.append(executor.submit(self._extract_features_once, chunk, part, None, job, answered_by))
+            results.extend(future.result() for future in pending)
+            logger.info(f"Streamed FRD split into {len(results)} chunks while reading")
+            features_data = self._merge_chunk_results(results)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+        
+        if cache_text:
+            self._store_features(cache_text, features_data, answered_by)
+        return features_data
+    
+    async def extract_features_from_frd_async(self, frd_content, use_cache=True, job=None):
+        """Async sibling of extract_features_from_frd built on the SDK's async generation path"""
+        cached = self._get_cached_features(frd_content, use_cache, self._extraction_model(frd_content, job))
+        if cached is not None:
+            return cached
+        
+        answered_by = set()
+        if len(frd_content) > Config.MAX_FRD_CHARS:
+            features_data = await self._extract_features_chunked_async(frd_content, job, answered_by)
+        else:
+            features_data = await self._extract_features_once_async(frd_content, job=job, answered_by=answered_by)
+        
+        self._store_features(frd_content, features_data, answered_by)
+        return features_data
+    
+    def _extract_features_once(self, frd_content, part=None, total_parts=None, job=None, answered_by=None):
+        """Extraction over a whole document or one chunk of it, retried per error class
+        
+        A response cut off at the output limit is continued: the next call asks only
+        for the features not received yet and the pieces are stitched together. The
+        models that answered are added to answered_by.
+        """
+        plan = self.plan_extraction_call(frd_content, part, total_parts, job)
+        prompt = self.prompt_engine.build_extraction_request(frd_content, part, total_parts, plan.frd_chars)
+        retry = self._retry_state(job, self._extraction_description(part, total_parts))
+        self._tag_plan(plan, job, retry)
+        received = None
+        
+        while True:
+            try:
+                response = self._generate_content(prompt, self.prompt_engine.extraction_instruction, plan)
+                self._answered(answered_by, plan)
+                received, complete = self._stitch_features(received, self._parse_response(response, 'features'))
+            except Exception as e:
+                delay = retry.next_delay(e)
+                if delay is None:
+                    return self._partial_features(received)
+                plan.model = self.model_router.escalate(plan.model, e)
+                time.sleep(delay)
+                continue
+            
+            if complete:
+                return received
+            prompt = self.prompt_engine.build_extraction_remainder_request(
+                frd_content, received['features'], part, total_parts, plan.frd_chars
+            )
+    
+    async def _extract_features_once_async(self, frd_content, part=None, total_parts=None, job=None, answered_by=None):
+        """Async variant of _extract_features_once"""
+        plan = self.plan_extraction_call(frd_content, part, total_parts, job)
+        prompt = self.prompt_engine.build_extraction_request(frd_content, part, total_parts, plan.frd_chars)
+        retry = self._retry_state(job, self._extraction_description(part, total_parts))
+        self._tag_plan(plan, job, retry)
+        received = None
+        
+        while True:
+            try:
+                response = await self._generate_content_async(prompt, self.prompt_engine.extraction_instruction, plan)
+                self._answered(answered_by, plan)
+                received, complete = self._stitch_features(received, self._parse_response(response, 'features'))
+            except Exception as e:
+                delay = retry.next_delay(e)
+                if delay is None:
+                    return self._partial_features(received)
+                plan.model = self.model_router.escalate(plan.model, e)
+                await asyncio.sleep(delay)
+                continue
+            
+            if complete:
+                return received
+            prompt = self.prompt_engine.build_extraction_remainder_request(
+                frd_content, received['features'], part, total_parts, plan.frd_chars
+            )
+    
+    @staticmethod
+    def _stitch_features(received, features_data):
+        """Join a response's features to those of earlier pieces; returns (features_data, complete)
+        
+        Extraction is complete once a response was not cut off; after MAX_CONTINUATIONS
+        cut-off pieces it ends with the result marked partial. A cut-off response that
+        added no new feature raises IncompleteResponseError for the retry policy.
+        """
+        if received is None:
+            stitched = features_data
+            continuations = 0
+        else:
+            stitched = GeminiClient._append_features(received, features_data['features'])
+            continuations = received['continuations'] + 1
+        
+        if not features_data.get('partial'):
+            stitched.pop('partial', None)
+            stitched.pop('continuations', None)
+            return stitched, True
+        
+        previous = len(received['features']) if received else 0
+        if len(stitched['features']) == previous:
+            raise IncompleteResponseError(f"feature extraction broke off with {previous} features received")
+        if continuations >= Config.MAX_CONTINUATIONS:
+            return GeminiClient._partial_features(stitched), True
+        
+        logger.info(f"Feature extraction cut off after {len(stitched['features'])} features, asking for the rest")
+        stitched['partial'] = True
+        stitched['continuations'] = continuations
+        return stitched, False
+    
+    @staticmethod
+    def _append_features(received, features):
+        """received plus the features not repeated from it, renumbered in order"""
+        def key(feature):
+            return normalize_text(feature['feature_name']).lower(), normalize_text(feature['frd_line']).lower()
+        
+        seen = {key(feature) for feature in received['features']}
+        stitched = list(received['features']) + [feature for feature in features if key(feature) not in seen]
+        for number, feature in enumerate(stitched, 1):
+            feature['feature_id'] = f'F{number:03d}'
+        return {'features': stitched}
+    
+    @staticmethod
+    def _partial_features(received):
+        """What is left of an extraction that could not be finished: the features received so far, or None"""
+        if not received or not received['features']:
+            return None
+        received.pop('continuations', None)
+        received['partial'] = True
+        return received
+    
+    def plan_extraction_call(self, frd_content, part=None, total_parts=None, job=None):
+        """Budget and model of an extraction call: how many FRD characters fit next to the instruction"""
+        overhead = self.prompt_engine.build_extraction_request('', part, total_parts)
+        plan = self.budget_planner.plan_extraction(self.prompt_engine.extraction_instruction, overhead, frd_content)
+        plan.model = self.model_router.route('extraction', plan.input_tokens, mode=self._model_mode(job))
+        return plan
+    
+    def plan_test_case_call(self, feature_data, feature_count=1, job=None):
+        """Budget and model of a test case call: input estimate and how many test cases fit the output limit"""
+        plan = self.budget_planner.plan_test_cases(
+            self.prompt_engine.test_case_instruction,
+            self.prompt_engine.build_test_case_request(feature_data),
+            feature_count
+        )
+        plan.model = self.model_router.route('test_cases', plan.input_tokens, feature_data, self._model_mode(job))
+        return plan
+    
+    @staticmethod
+    def _model_mode(job):
+        return job.model_mode if job else None
+    
+    def _test_case_range(self, plan, received=0):
+        """(low, high) test cases to ask for, or None when the default 15-25 fits the output budget"""
+        if received == 0 and plan.test_case_count >= self.budget_planner.max_test_cases:
+            return None
+        low, high = self.budget_planner.test_case_range(plan.test_case_count)
+        return max(1, low - received), max(1, high - received)
+    
+    @staticmethod
+    def _extraction_description(part, total_parts):
+        if part and total_parts and total_parts > 1:
+            return f"feature extraction (part {part} of {total_parts})"
+        return "feature extraction"
+    
+    @staticmethod
+    def _retry_state(job, description):
+        return RetryState((job or JobContext()).retry_budget, description)
+    
+    @staticmethod
+    def _tag_plan(plan, job, retry, feature_id=None):
+        """Attach what the telemetry records of the plan's calls need"""
+        plan.job = job
+        plan.retry = retry
+        plan.feature_id = feature_id
+        return plan
+    
+    def _split_frd(self, frd_content):
+        chunks = split_frd_into_chunks(frd_content, Config.FRD_CHUNK_SIZE, Config.FRD_CHUNK_OVERLAP)
+        logger.info(f"FRD has {len(frd_content)} characters, extracting features from {len(chunks)} chunks")
+        return chunks
+    
+    def _merge_chunk_results(self, results):
+        failed = sum(1 for result in results if not result or 'features' not in result)
+        if failed == len(results):
+            return None
+        if failed:
+            logger.warning(f"Feature extraction failed for {failed} of {len(results)} chunks")
+        merged = merge_chunk_features(results)
+        if failed or any(result.get('partial') for result in results if result):
+            merged['partial'] = True
+        return merged
+    
+    def _extract_features_chunked(self, frd_content, job=None, answered_by=None):
+        """Map-reduce extraction: chunks are extracted in parallel, then merged and deduplicated"""
+        chunks = self._split_frd(frd_content)
+        total = len(chunks)
+        
+        with ThreadPoolExecutor(max_workers=max(1, min(total, Config.MAX_CONCURRENT_FEATURES))) as executor:
+            results = list(executor.map(
+                lambda item: self._extract_features_once(item[1], item[0], total, job, answered_by),
+                enumerate(chunks, 1)
+            ))
+        
+        return self._merge_chunk_results(results)
+    
+    async def _extract_features_chunked_async(self, frd_content, job=None, answered_by=None):
+        """Async variant of _extract_features_chunked"""
+        chunks = self._split_frd(frd_content)
+        total = len(chunks)
+        
+        results = await asyncio.gather(*(
+            self._extract_features_once_async(chunk, part, total, job, answered_by)
+            for part, chunk in enumerate(chunks, 1)
+        ))
+        
+        return self._merge_chunk_results(results)
+    
+    def test_case_cache_key(self, feature_data, model):
+        """Cache key for a feature's test cases: its prompt-relevant fields, prompt version, examples and the model that answered"""
+        fingerprint = {
+            'feature_id': feature_data.get('feature_id', feature_data.get('id')),
+            'feature_name': feature_data.get('feature_name', feature_data.get('name'))
+        }
+        for field in FEATURE_FINGERPRINT_FIELDS[2:]:
+            fingerprint[field] = feature_data.get(field)
+        
+        return make_cache_key(
+            'test_cases',
+            TEST_CASE_PROMPT_VERSION,
+            model,
+            self.prompt_engine.test_case_instruction,
+            self.reference_digest,
+            fingerprint
+        )
+    
+    def _test_case_cache_keys(self, feature_data, job=None):
+        """Keys whose entries may serve the feature's test cases for a call routed as in job"""
+        model = self.plan_test_case_call(feature_data, job=job).model
+        return [self.test_case_cache_key(feature_data, candidate) for candidate in self._cache_models(model)]
+    
+    def has_cached_test_cases(self, feature_data, job=None):
+        """Check whether test cases for this exact feature were generated before"""
+        if not self.test_case_cache:
+            return False
+        return any(self.test_case_cache.contains(key) for key in self._test_case_cache_keys(feature_data, job))
+    
+    def _get_cached_test_cases(self, feature_data, use_cache, job=None):
+        """Look up previous test cases of an unchanged feature"""
+        if not self.test_case_cache or not use_cache:
+            return None
+        
+        cached = self._lookup(self.test_case_cache, self._test_case_cache_keys(feature_data, job))
+        if cached is not None:
+            logger.info(f"Using cached test cases for unchanged feature {feature_data.get('feature_name')}")
+        return cached
+    
+    def _store_test_cases(self, feature_data, test_cases_data, answered_by):
+        """Cache a feature's test cases under the model that answered them; not when several models contributed"""
+        model = self._answering_model(answered_by)
+        if self.test_case_cache and model and test_cases_data and test_cases_data.get('test_cases') and not test_cases_data.get('partial'):
+            self.test_case_cache.set(self.test_case_cache_key(feature_data, model), test_cases_data)
+    
+    def generate_test_cases_for_feature(self, feature_data, use_cache=True, on_test_case=None, job=None, received_test_cases=None, received_from=None):
+        """Generate test cases for a specific feature using few-shot prompting and key-value pairs
+        
+        Failed calls are retried per error class within the job's retry budget; after
+        an incomplete response only the missing remainder is asked for. When
+        on_test_case is given the response is streamed and each test case is passed
+        to it as soon as it has been parsed. received_test_cases (e.g. from a batched
+        response that broke off, answered by model received_from) are kept and only
+        the rest is generated.
+        """
+        cached = self._get_cached_test_cases(feature_data, use_cache, job)
+        if cached is not None:
+            return cached
+        
+        collector = TestCaseCollector(on_test_case)
+        if received_test_cases:
+            collector.add_all(received_test_cases)
+            collector.models.add(received_from)
+        retry = self._retry_state(job, f"test cases for feature {feature_data.get('feature_name')}")
+        model = self.plan_test_case_call(feature_data, job=job).model
+        complete = False
+        
+        while not complete:
+            try:
+                received = len(collector.test_cases)
+                test_cases_data = self._request_test_cases(feature_data, collector, model, job, retry)
+                complete = self._collect_test_cases(collector, test_cases_data, received)
+            except Exception as e:
+                delay = retry.next_delay(e)
+                if delay is None:
+                    break
+                model = self.model_router.escalate(model, e)
+                time.sleep(delay)
+        
+        return self._finish_test_cases(feature_data, collector, complete)
+    
+    async def generate_test_cases_for_feature_async(self, feature_data, use_cache=True, on_test_case=None, job=None):
+        """Async sibling of generate_test_cases_for_feature built on the SDK's async generation path"""
+        cached = self._get_cached_test_cases(feature_data, use_cache, job)
+        if cached is not None:
+            return cached
+        
+        collector = TestCaseCollector(on_test_case)
+        retry = self._retry_state(job, f"test cases for feature {feature_data.get('feature_name')}")
+        model = self.plan_test_case_call(feature_data, job=job).model
+        complete = False
+        
+        while not complete:
+            try:
+                received = len(collector.test_cases)
+                test_cases_data = await self._request_test_cases_async(feature_data, collector, model, job, retry)
+                complete = self._collect_test_cases(collector, test_cases_data, received)
+            except Exception as e:
+                delay = retry.next_delay(e)
+                if delay is None:
+                    break
+                model = self.model_router.escalate(model, e)
+                await asyncio.sleep(delay)
+        
+        return self._finish_test_cases(feature_data, collector, complete)
+    
+    def plan_test_case_batches(self, features, use_cache=True, job=None):
+        """Group consecutive features into batches that fit the configured batch token budgets
+        
+        Features whose test cases are cached cost nothing and ride along in any batch.
+        Each other feature reserves at least the output tokens of min_test_cases, so
+        batching never asks for fewer test cases per feature than a single call.
+        Returns lists of 0-based feature positions.
+        """
+        output_tokens = max(Config.TEST_CASE_BATCH_OUTPUT_TOKENS_PER_FEATURE, self.budget_planner.min_output_tokens_per_feature())
+        costs = []
+        for feature in features:
+            if use_cache and self.has_cached_test_cases(feature, job):
+                costs.append((0, 0))
             else:
-                logger.warning("Few_Shot_Prompting_Rib.csv not found, using default examples")
-                return []
-        except Exception as e:
-            logger.error(f"Error loading few-shot examples: {e}")
-            return []
+                prompt_tokens = self.budget_planner.estimate(self.prompt_engine.build_test_case_request(feature))
+                costs.append((prompt_tokens, output_tokens))
+        
+        return pack_feature_batches(
+            costs,
+            Config.TEST_CASE_BATCH_INPUT_TOKENS,
+            Config.MAX_OUTPUT_TOKENS,
+            Config.TEST_CASE_BATCH_MAX_FEATURES
+        )
     
-    def load_key_value_pairs(self):
-        """Load key-value pairs from CSV"""
-        try:
-            csv_path = 'Key_Value_Pair_.csv'
-            if os.path.exists(csv_path):
-                # Use native Python CSV reader
-                with open(csv_path, 'r', encoding='utf-8') as file:
-                    reader = csv.DictReader(file)
-                    return list(reader)
+    def generate_test_cases_for_batch(self, features, use_cache=True, job=None):
+        """Generate test cases for several features with one Gemini call
+        
+        Returns one result per feature, like generate_test_cases_for_feature. Features
+        missing from the batched response (or cut off at its end) are generated on
+        their own.
+        """
+        results = [None] * len(features)
+        pending = []
+        for position, feature in enumerate(features):
+            cached = self._get_cached_test_cases(feature, use_cache, job)
+            if cached is not None:
+                results[position] = cached
             else:
-                logger.warning("Key_Value_Pair_.csv not found")
-                return []
-        except Exception as e:
-            logger.error(f"Error loading key-value pairs: {e}")
-            return []
+                pending.append((position, feature))
         
-    def extract_features_from_frd(self, frd_content):
-        """Extract features from FRD document and return as JSON using few-shot prompting"""
+        feature_ids = [self._feature_id(feature) for _, feature in pending]
+        cut_off = {}
+        if len(pending) > 1 and all(feature_ids) and len(set(feature_ids)) == len(feature_ids):
+            cut_off = self._request_test_case_batch(pending, feature_ids, results, job)
+        
+        for position, feature in pending:
+            if results[position] is None:
+                # The lookup already missed, so go straight to generation, continuing a cut-off feature
+                received_test_cases, received_from = cut_off.get(position, (None, None))
+                results[position] = self.generate_test_cases_for_feature(
+                    feature, use_cache=False, job=job, received_test_cases=received_test_cases, received_from=received_from
+                )
+        
+        return results
+    
+    @staticmethod
+    def _feature_id(feature):
+        return str(feature.get('feature_id') or feature.get('id') or '').strip()
+    
+    def _request_test_case_batch(self, pending, feature_ids, results, job):
+        """One call for all pending features; fills results for every feature answered completely
         
-        # Build few-shot examples
-        few_shot_context = ""
-        if self.few_shot_examples:
-            few_shot_context = "\n\nFew-shot Examples:\n"
-            for i, example in enumerate(self.few_shot_examples[:3], 1):  # Use first 3 examples
-                few_shot_context += f"\nExample {i}:\nInput: {example.get('Input', '')}\nOutput: {example.get('Output', '')}\n"
-        
-        prompt = f"""
-        You are an expert test case generator. Analyze the following Functional Requirements Document (FRD) and extract all features/functionalities in the exact format shown in the examples.
-        
-        {few_shot_context}
-        
-        Based on the above examples, analyze the FRD content and extract features in JSON format:
-        
-        {{
-            "features": [
-                {{
-                    "feature_id": "F001",
-                    "feature_name": "Feature Name",
-                    "description": "Detailed description from FRD",
-                    "requirements": ["requirement 1", "requirement 2"],
-                    "acceptance_criteria": ["criteria 1", "criteria 2"],
-                    "priority": "High/Medium/Low",
-                    "module": "Module name",
-                    "frd_line": "Original FRD line that describes this feature"
-                }}
-            ]
-        }}
-        
-        FRD Content:
-        {frd_content[:50000]}  # Limit content to avoid token limits
-        
-        Important: 
-        1. Return only valid JSON format
-        2. Extract all distinct features mentioned in the document
-        3. Follow the pattern from the few-shot examples
-        4. Include the original FRD line for each feature
+        Returns {position: (test cases, model)} for the feature the response broke off in, so
+        its generation can continue from them. A batch whose output budget no longer
+        fits min_test_cases per feature (the test case size estimate grew since it was
+        packed) is not sent and every feature is generated on its own.
         """
+        features = [feature for _, feature in pending]
+        plan = self.budget_planner.plan_test_cases(
+            self.prompt_engine.test_case_instruction,
+            self.prompt_engine.build_test_case_batch_request(features),
+            len(features)
+        )
+        if plan.test_case_count < self.budget_planner.min_test_cases:
+            logger.warning(f"Only {plan.test_case_count} test cases per feature fit a batch of {len(features)} features, generating them individually")
+            return {}
+        plan.model = self.model_router.route('test_case_batch', plan.input_tokens, mode=self._model_mode(job))
+        prompt = self.prompt_engine.build_test_case_batch_request(features, self._test_case_range(plan))
+        retry = self._retry_state(job, f"test cases for a batch of {len(pending)} features")
+        self._tag_plan(plan, job, retry, ','.join(feature_ids))
         
-        try:
-            response = self.model.generate_content(prompt)
-            # Clean response text and parse JSON
-            response_text = response.text.strip()
-            if response_text.startswith('```json'):
-                response_text = response_text[7:-3]
-            elif response_text.startswith('```'):
-                response_text = response_text[3:-3]
-                
-            return json.loads(response_text)
-        except json.JSONDecodeError as e:
-            logger.error(f"JSON decode error: {str(e)}")
-            logger.error(f"Response text: {response.text}")
+        while True:
+            try:
+                response = self._generate_content(prompt, self.prompt_engine.test_case_instruction, plan)
+                test_cases_data = self._parse_response(response, 'test_cases')
+                test_cases = list(test_cases_data['test_cases'])
+                self.budget_planner.record_test_cases(plan, len(test_cases))
+                break
+            except Exception as e:
+                delay = retry.next_delay(e)
+                if delay is None:
+                    return {}
+                plan.model = self.model_router.escalate(plan.model, e)
+                time.sleep(delay)
+        
+        by_feature = {}
+        for test_case in test_cases:
+            by_feature.setdefault(test_case['feature_id'].strip(), []).append(test_case)
+        
+        # The last feature of a response that broke off may be missing test cases
+        cut_off = None
+        if test_cases_data.get('partial') and test_cases:
+            cut_off = test_cases[-1]['feature_id'].strip()
+        
+        answered = 0
+        received = {}
+        for (position, feature), feature_id in zip(pending, feature_ids):
+            feature_test_cases = by_feature.get(feature_id)
+            if not feature_test_cases:
+                continue
+            if feature_id == cut_off:
+                received[position] = (feature_test_cases, plan.model)
+                continue
+            result = {'test_cases': feature_test_cases}
+            self._store_test_cases(feature, result, {plan.model})
+            results[position] = result
+            answered += 1
+        
+        if answered < len(pending):
+            logger.warning(f"Batched response covered {answered} of {len(pending)} features, generating the rest individually")
+        return received
+    
+    def _test_case_prompt(self, feature_data, collector, model=None, job=None, retry=None):
+        """Full request for a new feature, or only the remainder after an incomplete response; returns (prompt, plan)"""
+        plan = self._tag_plan(self.plan_test_case_call(feature_data, job=job), job, retry, self._feature_id(feature_data))
+        plan.model = model or plan.model
+        test_case_range = self._test_case_range(plan, len(collector.test_cases))
+        if collector.test_cases:
+            prompt = self.prompt_engine.build_test_case_remainder_request(feature_data, collector.test_cases, test_case_range)
+        else:
+            prompt = self.prompt_engine.build_test_case_request(feature_data, test_case_range)
+        return prompt, plan
+    
+    def _request_test_cases(self, feature_data, collector, model=None, job=None, retry=None):
+        """One Gemini call (to model, else the routed one) for the feature's test cases; raises on failure"""
+        prompt, plan = self._test_case_prompt(feature_data, collector, model, job, retry)
+        if collector.on_test_case is not None:
+            test_cases_data = self._stream_test_cases(prompt, collector.add, plan)
+        else:
+            response = self._generate_content(prompt, self.prompt_engine.test_case_instruction, plan)
+            test_cases_data = self._parse_response(response, 'test_cases')
+        collector.models.add(plan.model)
+        self.budget_planner.record_test_cases(plan, len(test_cases_data['test_cases']))
+        return test_cases_data
+    
+    async def _request_test_cases_async(self, feature_data, collector, model=None, job=None, retry=None):
+        """Async variant of _request_test_cases"""
+        prompt, plan = self._test_case_prompt(feature_data, collector, model, job, retry)
+        if collector.on_test_case is not None:
+            test_cases_data = await self._stream_test_cases_async(prompt, collector.add, plan)
+        else:
+            response = await self._generate_content_async(prompt, self.prompt_engine.test_case_instruction, plan)
+            test_cases_data = self._parse_response(response, 'test_cases')
+        collector.models.add(plan.model)
+        self.budget_planner.record_test_cases(plan, len(test_cases_data['test_cases']))
+        return test_cases_data
+    
+    @staticmethod
+    def _collect_test_cases(collector, test_cases_data, received):
+        """Add a response's test cases; returns whether the feature is complete
+        
+        After a response that broke off, False asks the caller to continue with a
+        request for the remainder only; such continuations do not count as retries.
+        A cut-off response that added nothing new to the received test cases the
+        collector held before the request (streamed ones are added while it runs),
+        or one past MAX_CONTINUATIONS, raises IncompleteResponseError and is left
+        to the retry policy.
+        """
+        collector.add_all(test_cases_data['test_cases'])
+        if not test_cases_data.get('partial'):
+            return True
+        if len(collector.test_cases) > received and collector.continuations < Config.MAX_CONTINUATIONS:
+            collector.continuations += 1
+            logger.info(f"Response cut off after {len(collector.test_cases)} test cases, asking for the remainder")
+            return False
+        raise IncompleteResponseError(f"response broke off with {len(collector.test_cases)} test cases received")
+    
+    def _finish_test_cases(self, feature_data, collector, complete):
+        if not collector.test_cases:
             return None
+        
+        test_cases_data = {'test_cases': collector.test_cases}
+        if complete:
+            self._store_test_cases(feature_data, test_cases_data, collector.models)
+        else:
+            test_cases_data['partial'] = True
+        return test_cases_data
+    
+    def _stream_test_cases(self, prompt, on_test_case, plan=None):
+        """Stream a test case response, handing each parsed test case to on_test_case"""
+        parser = IncrementalArrayParser('test_cases')
+        received = []
+        try:
+            for text in self._generate_content_stream(prompt, self.prompt_engine.test_case_instruction, plan):
+                for test_case in self._valid_test_cases(parser.feed(text)):
+                    received.append(test_case)
+                    on_test_case(test_case)
+            return self.parse_json_response(parser.text, 'test_cases')
         except Exception as e:
-            logger.error(f"Error extracting features: {str(e)}")
-            return None
+            return self._partial_stream_result(received, e)
+    
+    async def _stream_test_cases_async(self, prompt, on_test_case, plan=None):
+        """Async variant of _stream_test_cases"""
+        parser = IncrementalArrayParser('test_cases')
+        received = []
+        try:
+            async for text in self._generate_content_stream_async(prompt, self.prompt_engine.test_case_instruction, plan):
+                for test_case in self._valid_test_cases(parser.feed(text)):
+                    received.append(test_case)
+                    on_test_case(test_case)
+            return self.parse_json_response(parser.text, 'test_cases')
+        except Exception as e:
+            return self._partial_stream_result(received, e)
+    
+    @staticmethod
+    def _valid_test_cases(test_cases):
+        """Streamed test cases checked against the schema one by one; malformed ones are skipped"""
+        for test_case in test_cases:
+            try:
+                yield validate_item(test_case, 'test_cases')
+            except SchemaError as e:
+                logger.warning(f"Skipping streamed test case: {e}")
+    
+    @staticmethod
+    def _partial_stream_result(received, error):
+        """Keep the test cases already streamed when the rest of the response is lost"""
+        if not received:
+            raise error
+        
+        logger.warning(f"Streamed response failed after {len(received)} test cases, keeping them: {error}")
+        return {'test_cases': received, 'partial': True}
     
-    def generate_test_cases_for_feature(self, feature_data):
-        """Generate test cases for a specific feature using few-shot prompting and key-value pairs"""
-        
-        # Build few-shot examples context
-        few_shot_context = ""
-        if self.few_shot_examples:
-            few_shot_context = "\n\nFew-shot Examples for Test Case Generation:\n"
-            for i, example in enumerate(self.few_shot_examples[:5], 1):  # Use first 5 examples
-                few_shot_context += f"\nExample {i}:\nFRD Input: {example.get('Input', '')}\nExpected Test Case Output: {example.get('Output', '')}\n"
-        
-        # Build key-value pairs context
-        key_value_context = ""
-        if self.key_value_pairs:
-            key_value_context = "\n\nKey-Value Pairs for Reference:\n"
-            for kv in self.key_value_pairs[:10]:  # Use first 10 key-value pairs
-                key_value_context += f"\nFeature: {kv.get('Feature Name', '')}"
-                key_value_context += f"\nScenario: {kv.get('Scenario_Name', '')}"
-                key_value_context += f"\nDescription: {kv.get('Scenario_Description', '')}"
-                key_value_context += f"\nSteps: {kv.get('Testing_Steps', '')}\n"
-        
-        prompt = f"""
-        You are an expert test case generator. Based on the feature information provided and the few-shot examples, generate comprehensive test cases in the EXACT format shown in the examples.
-        
-        {few_shot_context}
-        
-        {key_value_context}
-        
-        Feature Information to Generate Test Cases For:
-        - Feature ID: {feature_data.get('feature_id')}
-        - Feature Name: {feature_data.get('feature_name')}
-        - Description: {feature_data.get('description')}
-        - FRD Line: {feature_data.get('frd_line', '')}
-        - Requirements: {feature_data.get('requirements')}
-        - Acceptance Criteria: {feature_data.get('acceptance_criteria')}
-        - Module: {feature_data.get('module')}
-        
-        Generate comprehensive test cases covering ALL of the following categories:
-        
-        1. POSITIVE TEST CASES:
-        - Happy path scenarios
-        - Valid input scenarios
-        - Expected functionality validation
-        
-        2. NEGATIVE TEST CASES:
-        - Invalid input scenarios
-        - Error condition handling
-        - Boundary violations
-        
-        3. EDGE CASES:
-        - Boundary value testing
-        - Extreme scenarios
-        - Unusual input combinations
-        
-        4. ADVANCED COVERAGE (Include these critical gaps):
-        - Conflict resolution scenarios and detailed messaging validation
-        - Error recovery and retry mechanisms after failures
-        - Fallback behavior when primary options fail
-        - Multi-object creation scenarios (multiple curves = multiple objects)
-        - Backward compatibility with existing features
-        - Integration testing with other features
-        - Performance under extreme conditions
-        - Data validation and format checking
-        - User workflow interruption and resumption
-        - System state consistency after operations
-        
-        5. SPECIFIC GAP COVERAGE:
-        - Conflict Solver Detailed Messaging: Validate 3-line format (creation conflict, switch to partial, list options to remove)
-        - Editing after Conflict: Test user can remove options and retry Complete Result after failure
-        - Fallback Rule Testing: Validate "To Closest → By Delta" fallback sequence
-        - Multi-curve Validation: Test that 4 curves = 4 objects, or 1 sketch = 1 object
-        - Backward Compatibility: Ensure old features remain unaffected by new changes
-        
-        Use this exact format for each test case:
-        "The following test scenario for the [Feature Name] feature is derived from the corresponding line in the FRD document:
-        
-        1. [Step 1]
-        2. [Step 2]
-        3. [Step 3]
-        ...
-        
-        Exp: [Expected Result]"
-        
-        Return response in JSON format:
-        {{
-            "test_cases": [
-                {{
-                    "test_case_id": "TC001",
-                    "test_case_name": "Test case name",
-                    "feature_id": "{feature_data.get('feature_id')}",
-                    "feature_name": "{feature_data.get('feature_name')}",
-                    "module": "{feature_data.get('module')}",
-                    "test_type": "Positive/Negative/Boundary/Edge/Conflict/Fallback/Integration/Compatibility",
-                    "priority": "High/Medium/Low",
-                    "preconditions": "Prerequisites for test execution",
-                    "test_steps_formatted": "The following test scenario for the [Feature] feature is derived from the corresponding line in the FRD document:\n\n1. Step 1\n2. Step 2\n...\n\nExp: Expected result",
-                    "test_data": "Required test data",
-                    "expected_result": "Expected outcome",
-                    "category": "Functional/Non-functional/Integration/Compatibility/Performance",
-                    "frd_reference": "{feature_data.get('frd_line', '')}",
-                    "gap_coverage": "Specific gap or advanced scenario this test covers"
-                }}
-            ]
-        }}
-        
-        Generate 15-25 comprehensive test cases covering ALL categories above, ensuring complete coverage of gaps and edge cases.
-        IMPORTANT: Follow the exact format from the few-shot examples in the test_steps_formatted field.
+    @staticmethod
+    def _model_name(plan):
+        return plan.model if plan and plan.model else Config.GEMINI_MODEL
+    
+    def _admit(self, plan):
+        """Check the circuit of the planned model, switching plan to the fallback model while it is open
+        
+        Raises CircuitOpenError when neither may be called, which the retry policy
+        treats as fatal so the call fails fast.
         """
+        model = self._model_name(plan)
+        if self.circuit_breakers.allow(model):
+            return
+        fallback = Config.GEMINI_FALLBACK_MODEL
+        if (plan is not None and fallback and fallback != model and plan.kind in Config.FALLBACK_TASKS
+                and self.circuit_breakers.allow(fallback)):
+            logger.warning(f"Circuit for {model} is open, sending this {plan.kind} call to {fallback}")
+            plan.model = fallback
+            return
+        raise CircuitOpenError(f"Circuit for {model} is open, not calling Gemini")
+    
+    def _resolve_model(self, prompt, instruction, plan, key):
+        """Pick key's handle of the planned model carrying the static instruction; returns (model, contents, estimated_tokens)"""
+        if instruction is None:
+            return self.models[key.name], prompt, self.budget_planner.estimate(prompt)
+        
+        model, inline_prefix, mode = self.static_models[key.name].get(self._model_name(plan), instruction)
+        contents = inline_prefix + prompt if inline_prefix else prompt
+        # Cached content is not resent, but a system instruction still counts as input
+        estimated_tokens = self.budget_planner.estimate(prompt)
+        if mode != 'cached_content':
+            estimated_tokens += self.budget_planner.estimate(instruction)
+        return model, contents, estimated_tokens
+    
+    def _generate_content(self, prompt, instruction=None, plan=None):
+        """Send a prompt to Gemini, hedged with a duplicate call if it is slower than usual"""
+        delay = self.hedge_policy.hedge_delay(self._model_name(plan))
+        if delay is None:
+            return self._generate_content_once(prompt, instruction, plan)
+        
+        started = threading.Event()
         
+        def run_primary():
+            started.set()
+            return self._generate_content_once(prompt, instruction, plan)
+        
+        primary = self._hedge_executor.submit(run_primary)
+        # Time queued for a free worker is not the call being slow, so the delay starts when it runs
+        started.wait()
         try:
-            response = self.model.generate_content(prompt)
-            response_text = response.text.strip()
-            if response_text.startswith('```json'):
-                response_text = response_text[7:-3]
-            elif response_text.startswith('```'):
-                response_text = response_text[3:-3]
-                
-            return json.loads(response_text)
-        except json.JSONDecodeError as e:
-            logger.error(f"JSON decode error for feature {feature_data.get('feature_name')}: {str(e)}")
-            return None
+            return primary.result(timeout=delay)
+        except FutureTimeoutError:
+            pass
+        if not self.hedge_policy.try_hedge():
+            return primary.result()
+        
+        logger.info(f"Hedging a {self._model_name(plan)} call still running after {delay:.1f}s")
+        hedge = self._hedge_executor.submit(self._generate_content_once, prompt, instruction, plan)
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    # A call already running cannot be interrupted; its late answer is dropped
+                    for other in pending:
+                        other.cancel()
+                    self.hedge_policy.record_winner(future is hedge)
+                    return future.result()
+                error = error or future.exception()
+        raise error
+    
+    async def _generate_content_async(self, prompt, instruction=None, plan=None):
+        """Async variant of _generate_content; the losing call of a hedged pair is cancelled"""
+        delay = self.hedge_policy.hedge_delay(self._model_name(plan))
+        if delay is None:
+            return await self._generate_content_once_async(prompt, instruction, plan)
+        
+        primary = asyncio.ensure_future(self._generate_content_once_async(prompt, instruction, plan))
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done or not self.hedge_policy.try_hedge():
+            return await primary
+        
+        logger.info(f"Hedging a {self._model_name(plan)} call still running after {delay:.1f}s")
+        hedge = asyncio.ensure_future(self._generate_content_once_async(prompt, instruction, plan))
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    for other in pending:
+                        other.cancel()
+                    self.hedge_policy.record_winner(task is hedge)
+                    return task.result()
+                error = error or task.exception()
+        raise error
+    
+    def _generate_content_once(self, prompt, instruction=None, plan=None):
+        """Send a prompt to Gemini once the rate limiter of the chosen API key allows it"""
+        self._admit(plan)
+        key = self.key_pool.select()
+        model, contents, estimated_tokens = self._resolve_model(prompt, instruction, plan, key)
+        key.rate_limiter.acquire(estimated_tokens)
+        started = time.monotonic()
+        try:
+            response = model.generate_content(contents, generation_config=self._generation_config(plan))
         except Exception as e:
-            logger.error(f"Error generating test cases for feature {feature_data.get('feature_name')}: {str(e)}")
-            return None
+            self._record_failure(e, plan, key, time.monotonic() - started)
+            raise
+        self._record_success(response, estimated_tokens, plan, time.monotonic() - started, key)
+        return response
+    
+    async def _generate_content_once_async(self, prompt, instruction=None, plan=None):
+        """Async variant of _generate_content_once holding an in-flight slot of the shared loop"""
+        self._admit(plan)
+        key = self.key_pool.select()
+        model, contents, estimated_tokens = self._resolve_model(prompt, instruction, plan, key)
+        await key.rate_limiter.acquire_async(estimated_tokens)
+        started = time.monotonic()
+        try:
+            async with get_async_runtime().in_flight():
+                response = await model.generate_content_async(contents, generation_config=self._generation_config(plan))
+        except Exception as e:
+            self._record_failure(e, plan, key, time.monotonic() - started)
+            raise
+        self._record_success(response, estimated_tokens, plan, time.monotonic() - started, key)
+        return response
+    
+    @staticmethod
+    def _generation_config(plan):
+        generation_config = {'max_output_tokens': plan.max_output_tokens if plan else Config.MAX_OUTPUT_TOKENS}
+        if plan and Config.GEMINI_STRUCTURED_OUTPUT:
+            generation_config['response_mime_type'] = 'application/json'
+            generation_config['response_schema'] = RESPONSE_SCHEMAS[plan.kind]
+        return generation_config
+    
+    def _record_success(self, response, estimated_tokens, plan, latency, key, ttft=None):
+        usage = getattr(response, 'usage_metadata', None)
+        key.rate_limiter.record_usage(estimated_tokens, getattr(usage, 'prompt_token_count', None))
+        key.rate_limiter.record_success()
+        self.key_pool.record_success(key)
+        self.budget_planner.record_actual(plan, usage)
+        self.model_router.record(self._model_name(plan), latency, usage)
+        self.circuit_breakers.record_success(self._model_name(plan), latency)
+        self._record_call(plan, key, latency, TRUNCATED if self._hit_output_limit(response) else OK, usage, ttft)
+    
+    def _record_failure(self, error, plan, key, latency=None, ttft=None):
+        if is_rate_limit_error(error):
+            key.rate_limiter.record_throttle()
+        self.key_pool.record_failure(key, error)
+        self.model_router.record_error(self._model_name(plan))
+        self.circuit_breakers.record_failure(self._model_name(plan), error)
+        self._record_call(plan, key, latency, classify_error(error), ttft=ttft)
+    
+    def _record_call(self, plan, key, latency, outcome, usage=None, ttft=None):
+        """Telemetry record of one call, kept by the job it was made for"""
+        if plan is None or plan.job is None:
+            return
+        plan.job.telemetry.record(
+            kind=plan.kind,
+            feature_id=plan.feature_id,
+            model=self._model_name(plan),
+            api_key=key.name,
+            prompt_tokens=getattr(usage, 'prompt_token_count', None),
+            output_tokens=getattr(usage, 'candidates_token_count', None),
+            latency=latency,
+            ttft=ttft,
+            retries=plan.retry.retries if plan.retry else 0,
+            outcome=outcome
+        )
+    
+    def _generate_content_stream(self, prompt, instruction=None, plan=None):
+        """Streaming variant of _generate_content yielding response text as it arrives"""
+        self._admit(plan)
+        key = self.key_pool.select()
+        model, contents, estimated_tokens = self._resolve_model(prompt, instruction, plan, key)
+        key.rate_limiter.acquire(estimated_tokens)
+        started = time.monotonic()
+        ttft = None
+        try:
+            response = model.generate_content(contents, generation_config=self._generation_config(plan), stream=True)
+            for chunk in response:
+                if ttft is None:
+                    ttft = time.monotonic() - started
+                yield self._chunk_text(chunk)
+        except Exception as e:
+            self._record_failure(e, plan, key, time.monotonic() - started, ttft)
+            raise
+        self._record_success(response, estimated_tokens, plan, time.monotonic() - started, key, ttft)
+    
+    async def _generate_content_stream_async(self, prompt, instruction=None, plan=None):
+        """Async streaming variant holding an in-flight slot until the stream ends"""
+        self._admit(plan)
+        key = self.key_pool.select()
+        model, contents, estimated_tokens = self._resolve_model(prompt, instruction, plan, key)
+        await key.rate_limiter.acquire_async(estimated_tokens)
+        started = time.monotonic()
+        ttft = None
+        try:
+            async with get_async_runtime().in_flight():
+                response = await model.generate_content_async(contents, generation_config=self._generation_config(plan), stream=True)
+                async for chunk in response:
+                    if ttft is None:
+                        ttft = time.monotonic() - started
+                    yield self._chunk_text(chunk)
+        except Exception as e:
+            self._record_failure(e, plan, key, time.monotonic() - started, ttft)
+            raise
+        self._record_success(response, estimated_tokens, plan, time.monotonic() - started, key, ttft)
+    
+    @staticmethod
+    def _chunk_text(chunk):
+        # Chunks without text parts (e.g. the final finish-reason chunk) raise on .text
+        try:
+            return chunk.text
+        except ValueError:
+            return ''
+    
+    def _parse_response(self, response, array_key):
+        """parse_json_response of a response, marked partial when the model stopped at its output limit"""
+        data = self.parse_json_response(response.text, array_key)
+        if self._hit_output_limit(response):
+            data['partial'] = True
+        return data
+    
+    @staticmethod
+    def _hit_output_limit(response):
+        candidates = getattr(response, 'candidates', None) or []
+        finish_reason = getattr(candidates[0], 'finish_reason', None) if candidates else None
+        return getattr(finish_reason, 'name', None) == 'MAX_TOKENS'
+    
+    @staticmethod
+    def parse_json_response(response_text, array_key=None):
+        """Parse the JSON payload of a model response, repairing common defects
+        
+        If the response is still unparseable, the complete elements of array_key
+        are salvaged and the result is marked partial. With array_key the result
+        is validated against its response schema, so every record has all fields.
+        """
+        data, _ = parse_llm_json(response_text, array_key)
+        return validate_response(data, array_key) if array_key else data
     
-    def rate_limit_delay(self):
-        """Add delay to respect API rate limits"""
-        time.sleep(1)
+    def run_async(self, coro, timeout=None):
+        """Run one of the *_async methods on the shared event loop from synchronous code"""
+        return get_async_runtime().run(coro, timeout)
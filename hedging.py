@@ -0,0 +1,64 @@
+"""
+Request hedging: a duplicate Gemini call when the first one is slower than usual
+"""
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+class HedgePolicy:
+    """When to send a duplicate request and how many duplicates may be sent
+
+    A call is hedged once it has taken longer than the given latency
+    percentile of its model (never sooner than min_delay, and only after
+    min_samples calls of that model were measured). Hedges are capped at
+    max_hedge_rate of all calls so a slow endpoint cannot double the quota use.
+    """
+
+    def __init__(self, model_router, enabled=False, percentile=0.9, min_samples=20, min_delay=2.0, max_hedge_rate=0.1):
+        self.model_router = model_router
+        self.enabled = enabled
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.max_hedge_rate = max_hedge_rate
+        self.calls = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.denied = 0
+        self._lock = threading.Lock()
+
+    def hedge_delay(self, model):
+        """Seconds after which a call to model is hedged, or None to never hedge it"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            self.calls += 1
+        latency = self.model_router.latency_percentile(model, self.percentile, self.min_samples)
+        if latency is None:
+            return None
+        return max(self.min_delay, latency)
+
+    def try_hedge(self):
+        """Take one hedge from the rate cap; False once hedges would exceed max_hedge_rate of all calls"""
+        with self._lock:
+            if self.hedges + 1 > self.max_hedge_rate * self.calls:
+                self.denied += 1
+                return False
+            self.hedges += 1
+            return True
+
+    def record_winner(self, hedge_won):
+        if hedge_won:
+            with self._lock:
+                self.hedge_wins += 1
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'calls': self.calls,
+                'hedges': self.hedges,
+                'hedge_wins': self.hedge_wins,
+                'denied': self.denied
+            }
@@ -0,0 +1,28 @@
+"""
+Per-job state shared by all Gemini calls made while processing one FRD
+"""
+import uuid
+
+from config import Config
+from retry_policy import RetryBudget
+from telemetry import CallTelemetry
+
+class JobContext:
+    """Created once per processed document and passed to every GeminiClient call of that job"""
+
+    def __init__(self, retry_budget=None, model_mode=None, job_id=None):
+        self.retry_budget = retry_budget or RetryBudget(Config.GEMINI_RETRY_BUDGET)
+        # 'auto', 'fast' or 'quality' (see model_router); None uses GEMINI_MODEL_MODE
+        self.model_mode = model_mode
+        # Upload session id when run by the app
+        self.job_id = job_id or uuid.uuid4().hex
+        self.telemetry = CallTelemetry(self.job_id)
+
+    def get_stats(self):
+        """Per-job counters for the status payload"""
+        return {
+            'job_id': self.job_id,
+            'retries': self.retry_budget.get_stats(),
+            'model_mode': self.model_mode or Config.GEMINI_MODEL_MODE,
+            'calls': self.telemetry.get_stats()
+        }
@@ -0,0 +1,100 @@
+"""
+Tolerant parsing of JSON payloads embedded in model responses
+"""
+import json
+import logging
+import re
+
+from stream_parser import IncrementalArrayParser
+
+logger = logging.getLogger(__name__)
+
+# A complete JSON string literal; raw control characters inside it are matched too
+STRING_LITERAL = re.compile(r'"(?:[^"\\]|\\.)*"', re.DOTALL)
+TRAILING_COMMA = re.compile(r',(\s*[}\]])')
+PYTHON_LITERAL = re.compile(r'\b(True|False|None)\b')
+CONTROL_CHARACTER = re.compile(r'[\x00-\x1f]')
+
+_LITERALS = {'True': 'true', 'False': 'false', 'None': 'null'}
+_CONTROL_ESCAPES = {'\n': '\\n', '\r': '\\r', '\t': '\\t'}
+
+def extract_payload(text):
+    """Return the part of a response that holds the JSON document
+
+    Prefers the first fenced code block (closed or not) and otherwise starts at
+    the first '{' or '[', so prose before the payload is dropped.
+    """
+    text = (text or '').strip()
+    fence = text.find('```')
+    if fence != -1:
+        body_start = fence + 3
+        # Skip a language tag such as ```json
+        while body_start < len(text) and text[body_start].isalpha():
+            body_start += 1
+        body_end = text.find('```', body_start)
+        body = text[body_start:body_end if body_end != -1 else len(text)].strip()
+        if body:
+            text = body
+    starts = [index for index in (text.find('{'), text.find('[')) if index != -1]
+    return text[min(starts):] if starts else text
+
+def _escape_control(match):
+    char = match.group(0)
+    return _CONTROL_ESCAPES.get(char, f'\\u{ord(char):04x}')
+
+def _repair_outside_strings(segment):
+    segment = TRAILING_COMMA.sub(r'\1', segment)
+    return PYTHON_LITERAL.sub(lambda match: _LITERALS[match.group(1)], segment)
+
+def repair_json(text):
+    """Fix common defects of model-written JSON
+
+    Raw control characters inside strings are escaped, trailing commas before
+    '}' / ']' removed and Python literals (True/False/None) outside strings
+    replaced by their JSON spelling.
+    """
+    repaired = []
+    position = 0
+    for match in STRING_LITERAL.finditer(text):
+        repaired.append(_repair_outside_strings(text[position:match.start()]))
+        repaired.append(CONTROL_CHARACTER.sub(_escape_control, match.group(0)))
+        position = match.end()
+    repaired.append(_repair_outside_strings(text[position:]))
+    return ''.join(repaired)
+
+def _decode_first(text):
+    """Decode the first JSON value in text, ignoring anything after it"""
+    value, _ = json.JSONDecoder().raw_decode(text)
+    return value
+
+def parse_llm_json(text, array_key=None):
+    """Parse a model response as JSON as tolerantly as possible
+
+    Returns (data, salvaged). When the document cannot be parsed even after
+    repair but array_key is given, every complete element of that array is
+    recovered and data is {array_key: elements, 'partial': True}; salvaged is
+    the number of recovered elements (0 when the whole document parsed).
+    Raises json.JSONDecodeError when nothing can be recovered.
+    """
+    payload = extract_payload(text)
+    try:
+        return _decode_first(payload), 0
+    except json.JSONDecodeError as e:
+        error = e
+
+    repaired = repair_json(payload)
+    try:
+        data = _decode_first(repaired)
+        logger.info("Parsed model response after repairing malformed JSON")
+        return data, 0
+    except json.JSONDecodeError:
+        pass
+
+    if array_key:
+        parser = IncrementalArrayParser(array_key)
+        elements = parser.feed(repaired)
+        if elements:
+            logger.warning(f"Salvaged {len(elements)} {array_key} from a malformed response ({error})")
+            return {array_key: elements, 'partial': True}, len(elements)
+
+    raise error
@@ -0,0 +1,137 @@
+"""
+Per-call model routing: small tasks go to a fast model, everything else to the configured one
+"""
+import logging
+import threading
+from collections import deque
+
+from retry_policy import classify_error, INVALID_RESPONSE, INCOMPLETE_RESPONSE
+
+logger = logging.getLogger(__name__)
+
+# Job-level modes: pick per call by the rules, or pin every call to one tier
+AUTO = 'auto'
+FAST = 'fast'
+QUALITY = 'quality'
+MODEL_MODES = (AUTO, FAST, QUALITY)
+
+# Failures that mean the answer itself was bad, so a larger model may do better
+_ESCALATING_ERRORS = (INVALID_RESPONSE, INCOMPLETE_RESPONSE)
+
+def feature_complexity(feature_data):
+    """Number of requirements and acceptance criteria of a feature"""
+    complexity = 0
+    for field in ('requirements', 'acceptance_criteria'):
+        value = feature_data.get(field)
+        if isinstance(value, (list, tuple)):
+            complexity += len(value)
+        elif value:
+            complexity += 1
+    return complexity
+
+class ModelStats:
+    """Latency and token usage of one model; latencies of the most recent calls are kept for percentiles"""
+
+    def __init__(self, window=200):
+        self.calls = 0
+        self.errors = 0
+        self.escalations = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.latencies = deque(maxlen=window)
+
+    def percentile(self, fraction):
+        """Latency below which the given fraction of recent calls finished, None before the first call"""
+        if not self.latencies:
+            return None
+        latencies = sorted(self.latencies)
+        return latencies[min(len(latencies) - 1, int(len(latencies) * fraction))]
+
+    def as_dict(self):
+        latencies = self.latencies
+        p95 = self.percentile(0.95)
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'escalations': self.escalations,
+            'input_tokens': self.input_tokens,
+            'output_tokens': self.output_tokens,
+            'avg_latency': round(sum(latencies) / len(latencies), 3) if latencies else None,
+            'p95_latency': round(p95, 3) if p95 is not None else None
+        }
+
+class ModelRouter:
+    """Picks the model of each Gemini call and records per-model latency and token usage
+
+    In auto mode a call goes to fast_model when its task type is one of
+    fast_tasks, its estimated input fits fast_max_input_tokens and the feature
+    has at most fast_max_complexity requirements and acceptance criteria.
+    Answers of the fast model that fail validation are retried on the default
+    model (see escalate). Without a fast model every call uses default_model.
+    """
+
+    def __init__(self, default_model, fast_model=None, mode=QUALITY, fast_tasks=('test_cases',),
+                 fast_max_input_tokens=4000, fast_max_complexity=4):
+        self.default_model = default_model
+        self.fast_model = fast_model if fast_model and fast_model != default_model else None
+        self.mode = mode if mode in MODEL_MODES else QUALITY
+        self.fast_tasks = tuple(fast_tasks)
+        self.fast_max_input_tokens = fast_max_input_tokens
+        self.fast_max_complexity = fast_max_complexity
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def route(self, task, input_tokens, feature_data=None, mode=None):
+        """Model for one call of the given task type ('extraction', 'test_cases', 'test_case_batch')"""
+        mode = mode if mode in MODEL_MODES else self.mode
+        if not self.fast_model or mode == QUALITY:
+            return self.default_model
+        if mode == FAST:
+            return self.fast_model
+        if task not in self.fast_tasks or input_tokens > self.fast_max_input_tokens:
+            return self.default_model
+        if feature_data is not None and feature_complexity(feature_data) > self.fast_max_complexity:
+            return self.default_model
+        return self.fast_model
+
+    def escalate(self, model, error):
+        """The model to retry with after error: the default model if the fast one gave a bad answer"""
+        if model != self.fast_model or classify_error(error) not in _ESCALATING_ERRORS:
+            return model
+        with self._lock:
+            self._model_stats(model).escalations += 1
+        logger.info(f"Escalating from {model} to {self.default_model} after an invalid answer: {error}")
+        return self.default_model
+
+    def _model_stats(self, model):
+        stats = self._stats.get(model)
+        if stats is None:
+            stats = self._stats[model] = ModelStats()
+        return stats
+
+    def record(self, model, latency, usage_metadata=None):
+        """Record a successful call of model taking latency seconds"""
+        with self._lock:
+            stats = self._model_stats(model)
+            stats.calls += 1
+            stats.latencies.append(latency)
+            if usage_metadata is not None:
+                stats.input_tokens += getattr(usage_metadata, 'prompt_token_count', 0) or 0
+                stats.output_tokens += getattr(usage_metadata, 'candidates_token_count', 0) or 0
+
+    def record_error(self, model):
+        with self._lock:
+            self._model_stats(model).errors += 1
+
+    def latency_percentile(self, model, fraction, min_samples=1):
+        """Recent latency percentile of model, None until min_samples calls have been recorded"""
+        with self._lock:
+            stats = self._stats.get(model)
+            if stats is None or len(stats.latencies) < min_samples:
+                return None
+            return stats.percentile(fraction)
+
+    def get_stats(self):
+        """Per-model calls, errors, escalations, tokens and latency for the status payload"""
+        with self._lock:
+            return {model: stats.as_dict() for model, stats in self._stats.items()}
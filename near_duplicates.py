@@ -0,0 +1,165 @@
+"""
+Near-duplicate test case removal: MinHash signatures of word shingles bucketed with LSH, vectorized with NumPy
+"""
+import logging
+import re
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# The text that makes two test cases the same test
+DEDUP_FIELDS = ('test_case_name', 'test_steps_formatted', 'expected_result')
+
+_WORD = re.compile(r'[a-z0-9]+')
+# Byte table blanking everything but word bytes (non-ASCII letters included) and the text start marker
+_WORD_BYTES = set(b'abcdefghijklmnopqrstuvwxyz0123456789\x00') | set(range(128, 256))
+_TOKEN_TABLE = bytes(byte if byte in _WORD_BYTES else 32 for byte in range(256))
+# Preamble the test case prompt asks for at the start of every test_steps_formatted
+_STEPS_PREAMBLE = re.compile(r'^\s*the following test scenario\b.*?:\s*', re.IGNORECASE | re.DOTALL)
+
+def comparison_text(test_case):
+    """Name, steps and expected result of a test case as one string, without the shared steps preamble"""
+    parts = [str(test_case.get(field) or '') for field in DEDUP_FIELDS]
+    parts[1] = _STEPS_PREAMBLE.sub('', parts[1], count=1)
+    return '\n'.join(parts)
+
+class MinHashDeduplicator:
+    """Finds texts whose shingle sets have a Jaccard similarity of at least threshold
+
+    Shingles are the word bigrams of a text plus (start, first word). Every text
+    gets num_perm MinHash values; texts agreeing on all rows_per_band
+    values of any band share an LSH bucket and are compared with their bucket's
+    first (earliest) text by signature agreement, which estimates the Jaccard
+    similarity. Shingles found in more than common_share of the texts (the
+    boilerplate every test case repeats) are ignored, as an IDF weighting would.
+    Words are numbered in order of appearance and the hash functions are
+    seeded, so results do not depend on the process.
+    """
+
+    def __init__(self, threshold=0.8, num_perm=32, rows_per_band=4, common_share=0.5, min_texts_for_common=20, seed=7):
+        if num_perm % rows_per_band:
+            raise ValueError("num_perm must be a multiple of rows_per_band")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.rows_per_band = rows_per_band
+        self.common_share = common_share
+        self.min_texts_for_common = min_texts_for_common
+        rng = np.random.default_rng(seed)
+        # Multiply-shift hashing: odd multipliers, the high 32 bits of the 64-bit product
+        self._multipliers = rng.integers(1, 2 ** 63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self._offsets = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64)
+
+    def duplicates(self, texts):
+        """Indices of texts that nearly duplicate an earlier text, ascending"""
+        shingle_ids, starts, text_index = self._encode(texts)
+        if len(starts) < 2:
+            return []
+        signatures = self._signatures(shingle_ids, starts)
+        firsts, members = self._candidate_pairs(signatures)
+        similarity = (signatures[firsts] == signatures[members]).mean(axis=1)
+        duplicate_rows = np.unique(members[similarity >= self.threshold])
+        return text_index[duplicate_rows].tolist()
+
+    def _encode(self, texts):
+        """Distinct shingle ids of all non-empty texts (grouped by text), the start of each text and its index in texts"""
+        # One tokenizer pass over all texts (a regex per text is the slowest step at this size);
+        # the marker starting every text gets word id 0 and pairs with the text's first word
+        corpus = ' \x00 ' + ' \x00 '.join(text.replace('\x00', ' ') for text in texts)
+        tokens = corpus.lower().encode('utf-8').translate(_TOKEN_TABLE).split()
+        vocabulary = {token: word_id for word_id, token in enumerate(dict.fromkeys(tokens))}
+        word_ids = np.fromiter(map(vocabulary.__getitem__, tokens), dtype=np.int64, count=len(tokens))
+        vocabulary_size = len(vocabulary)
+        token_text = np.cumsum(word_ids == 0) - 1
+
+        within_text = word_ids[1:] != 0
+        bigram_space = vocabulary_size ** 2
+        bigrams = word_ids[:-1][within_text] * vocabulary_size + word_ids[1:][within_text]
+        keys = np.sort(token_text[1:][within_text] * bigram_space + bigrams)
+        distinct = np.ones(len(keys), dtype=bool)
+        distinct[1:] = keys[1:] != keys[:-1]
+        keys = keys[distinct]
+        text_of_shingle, shingle_ids = keys // bigram_space, keys % bigram_space
+
+        if len(texts) >= self.min_texts_for_common:
+            specific = ~np.isin(shingle_ids, _common_values(shingle_ids, len(texts) * self.common_share))
+            text_of_shingle, shingle_ids = text_of_shingle[specific], shingle_ids[specific]
+
+        starts = np.flatnonzero(np.r_[True, text_of_shingle[1:] != text_of_shingle[:-1]]) if len(shingle_ids) else np.array([], dtype=np.int64)
+        return shingle_ids.astype(np.uint64), starts, text_of_shingle[starts]
+
+    def _signatures(self, shingle_ids, starts):
+        signatures = np.empty((len(starts), self.num_perm), dtype=np.uint32)
+        # One buffer reused for every hash function; fresh temporaries per column cost more than the arithmetic
+        hashed = np.empty_like(shingle_ids)
+        for column in range(self.num_perm):
+            np.multiply(shingle_ids, self._multipliers[column], out=hashed)
+            hashed += self._offsets[column]
+            hashed >>= np.uint64(32)
+            signatures[:, column] = np.minimum.reduceat(hashed, starts)
+        return signatures
+
+    def _candidate_pairs(self, signatures):
+        """(first, member) row pairs sharing an LSH bucket, first being the earliest row of the bucket"""
+        firsts, members = [], []
+        for band_start in range(0, self.num_perm, self.rows_per_band):
+            band = signatures[:, band_start:band_start + self.rows_per_band].astype(np.uint64)
+            keys = band[:, 0]
+            for column in range(1, self.rows_per_band):
+                keys = keys * np.uint64(0x100000001B3) ^ band[:, column]
+            # A stable sort keeps rows of one bucket in their original order
+            order = np.argsort(keys, kind='stable')
+            sorted_keys = keys[order]
+            run_start = np.zeros(len(order), dtype=np.int64)
+            boundaries = np.flatnonzero(sorted_keys[1:] != sorted_keys[:-1]) + 1
+            run_start[boundaries] = boundaries
+            run_start = np.maximum.accumulate(run_start)
+            first = order[run_start]
+            in_bucket = first != order
+            firsts.append(first[in_bucket])
+            members.append(order[in_bucket])
+        firsts = np.concatenate(firsts)
+        members = np.concatenate(members)
+        unique_pairs = np.unique(firsts * len(signatures) + members)
+        return unique_pairs // len(signatures), unique_pairs % len(signatures)
+
+def _common_values(values, limit):
+    """Values occurring more than limit times"""
+    ordered = np.sort(values)
+    run_starts = np.flatnonzero(np.r_[True, ordered[1:] != ordered[:-1]])
+    counts = np.diff(np.r_[run_starts, len(ordered)])
+    return ordered[run_starts[counts > limit]]
+
+def _exact_duplicates(texts):
+    seen = set()
+    duplicates = []
+    for index, text in enumerate(texts):
+        key = ' '.join(_WORD.findall(text.lower()))
+        if key in seen:
+            duplicates.append(index)
+        seen.add(key)
+    return duplicates
+
+def remove_near_duplicates(test_cases, threshold=0.8):
+    """Drop test cases that nearly repeat an earlier one (of the same or another feature)
+
+    Returns (kept test cases in their original order, number removed). Without
+    NumPy only test cases identical after normalization are removed.
+    """
+    texts = [comparison_text(test_case) for test_case in test_cases]
+    if NUMPY_AVAILABLE:
+        duplicates = MinHashDeduplicator(threshold).duplicates(texts)
+    else:
+        logger.warning("NumPy is not installed, removing exact duplicate test cases only")
+        duplicates = _exact_duplicates(texts)
+    if not duplicates:
+        return list(test_cases), 0
+
+    dropped = set(duplicates)
+    kept = [test_case for index, test_case in enumerate(test_cases) if index not in dropped]
+    logger.info(f"Removed {len(dropped)} near-duplicate test cases of {len(test_cases)}")
+    return kept, len(dropped)
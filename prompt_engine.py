@@ -0,0 +1,369 @@
+"""
+Precompiled Gemini prompts: static preambles built once, small per-call sections
+"""
+import hashlib
+import inspect
+import logging
+import threading
+import time
+from datetime import timedelta
+
+logger = logging.getLogger(__name__)
+
+FEATURE_JSON_SHAPE = """{
+    "features": [
+        {
+            "feature_id": "F001",
+            "feature_name": "Feature Name",
+            "description": "Detailed description from FRD",
+            "requirements": ["requirement 1", "requirement 2"],
+            "acceptance_criteria": ["criteria 1", "criteria 2"],
+            "priority": "High/Medium/Low",
+            "module": "Module name",
+            "frd_line": "Original FRD line that describes this feature"
+        }
+    ]
+}"""
+
+TEST_CASE_JSON_SHAPE = """{
+    "test_cases": [
+        {
+            "test_case_id": "TC001",
+            "test_case_name": "Test case name",
+            "feature_id": "<Feature ID>",
+            "feature_name": "<Feature Name>",
+            "module": "<Module>",
+            "test_type": "Positive/Negative/Boundary/Edge/Conflict/Fallback/Integration/Compatibility",
+            "priority": "High/Medium/Low",
+            "preconditions": "Prerequisites for test execution",
+            "test_steps_formatted": "The following test scenario for the [Feature] feature is derived from the corresponding line in the FRD document:\\n\\n1. Step 1\\n2. Step 2\\n...\\n\\nExp: Expected result",
+            "test_data": "Required test data",
+            "expected_result": "Expected outcome",
+            "category": "Functional/Non-functional/Integration/Compatibility/Performance",
+            "frd_reference": "<FRD Line>",
+            "gap_coverage": "Specific gap or advanced scenario this test covers"
+        }
+    ]
+}"""
+
+TEST_CASE_COVERAGE_RULES = """Generate comprehensive test cases covering ALL of the following categories:
+
+1. POSITIVE TEST CASES:
+- Happy path scenarios
+- Valid input scenarios
+- Expected functionality validation
+
+2. NEGATIVE TEST CASES:
+- Invalid input scenarios
+- Error condition handling
+- Boundary violations
+
+3. EDGE CASES:
+- Boundary value testing
+- Extreme scenarios
+- Unusual input combinations
+
+4. ADVANCED COVERAGE (Include these critical gaps):
+- Conflict resolution scenarios and detailed messaging validation
+- Error recovery and retry mechanisms after failures
+- Fallback behavior when primary options fail
+- Multi-object creation scenarios (multiple curves = multiple objects)
+- Backward compatibility with existing features
+- Integration testing with other features
+- Performance under extreme conditions
+- Data validation and format checking
+- User workflow interruption and resumption
+- System state consistency after operations
+
+5. SPECIFIC GAP COVERAGE:
+- Conflict Solver Detailed Messaging: Validate 3-line format (creation conflict, switch to partial, list options to remove)
+- Editing after Conflict: Test user can remove options and retry Complete Result after failure
+- Fallback Rule Testing: Validate "To Closest → By Delta" fallback sequence
+- Multi-curve Validation: Test that 4 curves = 4 objects, or 1 sketch = 1 object
+- Backward Compatibility: Ensure old features remain unaffected by new changes
+
+Use this exact format for each test case:
+"The following test scenario for the [Feature Name] feature is derived from the corresponding line in the FRD document:
+
+1. [Step 1]
+2. [Step 2]
+3. [Step 3]
+...
+
+Exp: [Expected Result]\""""
+
+class PromptEngine:
+    """Compiles the static instruction, example and key-value sections once per client
+
+    The *_instruction attributes never change for the lifetime of the client and
+    can be sent once as a system instruction or cached content; the build_*
+    methods only assemble the small per-call section.
+    """
+
+    def __init__(self, few_shot_examples, key_value_pairs, max_frd_chars=50000, planner=None, static_token_budget=None,
+                 retriever=None, examples_per_feature=3, key_values_per_feature=5):
+        self.max_frd_chars = max_frd_chars
+        self.retriever = retriever
+        self.examples_per_feature = examples_per_feature
+        self.key_values_per_feature = key_values_per_feature
+        extraction_examples = few_shot_examples[:3]
+        test_case_examples = few_shot_examples[:5]
+        key_value_pairs = key_value_pairs[:10]
+        
+        # With a retriever the test case examples are ranked per feature and sent with the feature instead
+        if retriever:
+            test_case_examples = []
+            key_value_pairs = []
+        
+        # Drop trailing examples and key-value rows that would push a preamble over its budget
+        if planner and static_token_budget:
+            extraction_examples = extraction_examples[:planner.fit_sections(
+                [self._format_extraction_example(i, example) for i, example in enumerate(extraction_examples, 1)],
+                static_token_budget
+            )]
+            test_case_examples = test_case_examples[:planner.fit_sections(
+                [self._format_test_case_example(i, example) for i, example in enumerate(test_case_examples, 1)],
+                static_token_budget // 2
+            )]
+            key_value_pairs = key_value_pairs[:planner.fit_sections(
+                [self._format_key_value_pair(kv) for kv in key_value_pairs],
+                static_token_budget // 2
+            )]
+        
+        self.extraction_instruction = self._compile_extraction_instruction(extraction_examples)
+        self.test_case_instruction = self._compile_test_case_instruction(test_case_examples, key_value_pairs)
+    
+    @staticmethod
+    def _format_extraction_example(number, example):
+        return f"Example {number}:\nInput: {example.get('Input', '')}\nOutput: {example.get('Output', '')}\n"
+    
+    @staticmethod
+    def _format_test_case_example(number, example):
+        return f"Example {number}:\nFRD Input: {example.get('Input', '')}\nExpected Test Case Output: {example.get('Output', '')}\n"
+    
+    @staticmethod
+    def _format_key_value_pair(kv):
+        return (
+            f"Feature: {kv.get('Feature Name', '')}\n"
+            f"Scenario: {kv.get('Scenario_Name', '')}\n"
+            f"Description: {kv.get('Scenario_Description', '')}\n"
+            f"Steps: {kv.get('Testing_Steps', '')}\n"
+        )
+    
+    @classmethod
+    def _compile_extraction_instruction(cls, examples):
+        sections = [
+            "You are an expert test case generator. Analyze the Functional Requirements Document (FRD) "
+            "provided by the user and extract all features/functionalities in the exact format shown in the examples."
+        ]
+        if examples:
+            sections.append("Few-shot Examples:\n" + "\n".join(
+                cls._format_extraction_example(i, example) for i, example in enumerate(examples, 1)
+            ))
+        sections.append("Based on the above examples, analyze the FRD content and extract features in JSON format:\n\n" + FEATURE_JSON_SHAPE)
+        sections.append(
+            "Important:\n"
+            "1. Return only valid JSON format\n"
+            "2. Extract all distinct features mentioned in the document\n"
+            "3. Follow the pattern from the few-shot examples\n"
+            "4. Include the original FRD line for each feature"
+        )
+        return "\n\n".join(sections)
+    
+    @classmethod
+    def _compile_test_case_instruction(cls, examples, key_value_pairs):
+        sections = [
+            "You are an expert test case generator. Based on the feature information provided and the few-shot "
+            "examples, generate comprehensive test cases in the EXACT format shown in the examples."
+        ]
+        if examples:
+            sections.append("Few-shot Examples for Test Case Generation:\n" + "\n".join(
+                cls._format_test_case_example(i, example) for i, example in enumerate(examples, 1)
+            ))
+        if key_value_pairs:
+            sections.append("Key-Value Pairs for Reference:\n" + "\n".join(
+                cls._format_key_value_pair(kv) for kv in key_value_pairs
+            ))
+        if not examples and not key_value_pairs:
+            sections.append("The few-shot examples and key-value pairs most relevant to each feature are "
+                            "provided together with the feature information.")
+        sections.append(TEST_CASE_COVERAGE_RULES)
+        sections.append(
+            "Return response in JSON format, filling <Feature ID>, <Feature Name>, <Module> and <FRD Line> "
+            "from the feature information:\n\n" + TEST_CASE_JSON_SHAPE
+        )
+        sections.append(
+            "Generate 15-25 comprehensive test cases (or the number requested with the feature information) "
+            "covering ALL categories above, ensuring complete coverage of gaps and edge cases.\n"
+            "IMPORTANT: Follow the exact format from the few-shot examples in the test_steps_formatted field."
+        )
+        return "\n\n".join(sections)
+    
+    def build_extraction_request(self, frd_content, part=None, total_parts=None, frd_chars=None):
+        """Per-document (or per-chunk) section of the feature extraction prompt"""
+        limit = self.max_frd_chars if frd_chars is None else min(frd_chars, self.max_frd_chars)
+        if part and total_parts and total_parts > 1:
+            return (
+                f"FRD Content (part {part} of {total_parts}; it may start or end mid-section, "
+                f"extract only features described in this part):\n{frd_content[:limit]}"
+            )
+        if part and total_parts is None:
+            # Streamed documents are extracted before their number of parts is known
+            return (
+                f"FRD Content (part {part} of a longer FRD; it may start or end mid-section, "
+                f"extract only features described in this part):\n{frd_content[:limit]}"
+            )
+        return f"FRD Content:\n{frd_content[:limit]}"
+
+    def build_extraction_remainder_request(self, frd_content, received_features, part=None, total_parts=None, frd_chars=None):
+        """Extraction section asking only for the features missing after a response was cut off"""
+        already_extracted = "\n".join(
+            f"- {feature.get('feature_id', '')}: {feature.get('feature_name', '')}" for feature in received_features
+        )
+        return (
+            f"The following {len(received_features)} features were already extracted from this FRD:\n"
+            f"{already_extracted}\n\n"
+            "Extract ONLY the remaining features; do not repeat any of the above. "
+            f"Number them from F{len(received_features) + 1:03d}. If no features remain, return an empty features list.\n\n"
+            + self.build_extraction_request(frd_content, part, total_parts, frd_chars)
+        )
+
+    def build_test_case_request(self, feature_data, test_case_range=None):
+        """Per-feature section of the test case generation prompt
+        
+        test_case_range, a (low, high) pair, overrides the default number of test
+        cases when the output budget cannot hold 25 of them.
+        """
+        request = self._format_feature(feature_data) + self._reference_section([feature_data])
+        if test_case_range:
+            request += f"\n\n{self._test_case_count_text(test_case_range)} for this feature."
+        return request
+    
+    @staticmethod
+    def _format_feature(feature_data):
+        return (
+            "Feature Information to Generate Test Cases For:\n"
+            f"- Feature ID: {feature_data.get('feature_id')}\n"
+            f"- Feature Name: {feature_data.get('feature_name')}\n"
+            f"- Description: {feature_data.get('description')}\n"
+            f"- FRD Line: {feature_data.get('frd_line', '')}\n"
+            f"- Requirements: {feature_data.get('requirements')}\n"
+            f"- Acceptance Criteria: {feature_data.get('acceptance_criteria')}\n"
+            f"- Module: {feature_data.get('module')}"
+        )
+    
+    def select_references(self, features):
+        """Few-shot examples and key-value rows ranked for the given features, without duplicates"""
+        if not self.retriever:
+            return [], []
+        examples, key_values = [], []
+        for feature_data in features:
+            query = self.retriever.feature_query(feature_data)
+            for example in self.retriever.examples_for(query, self.examples_per_feature):
+                if not any(example is chosen for chosen in examples):
+                    examples.append(example)
+            for kv in self.retriever.key_values_for(query, self.key_values_per_feature):
+                if not any(kv is chosen for chosen in key_values):
+                    key_values.append(kv)
+        return examples, key_values
+    
+    def _reference_section(self, features):
+        examples, key_values = self.select_references(features)
+        section = ""
+        if examples:
+            section += "\n\nFew-shot Examples for Test Case Generation:\n" + "\n".join(
+                self._format_test_case_example(i, example) for i, example in enumerate(examples, 1)
+            )
+        if key_values:
+            section += "\n\nKey-Value Pairs for Reference:\n" + "\n".join(
+                self._format_key_value_pair(kv) for kv in key_values
+            )
+        return section.rstrip("\n")
+    
+    @staticmethod
+    def _test_case_count_text(test_case_range):
+        low, high = test_case_range
+        return f"Generate {high} test cases" if low >= high else f"Generate {low}-{high} test cases"
+
+    def build_test_case_batch_request(self, features, test_case_range=None):
+        """Per-call section asking for the test cases of several features in one response"""
+        # Examples relevant to several features of the batch are sent once
+        sections = "\n\n".join(self._format_feature(feature) for feature in features) + self._reference_section(features)
+        if test_case_range:
+            sections += f"\n\n{self._test_case_count_text(test_case_range)} per feature."
+        return (
+            f"Generate test cases for EACH of the following {len(features)} features, applying the instructions "
+            "above to every feature separately. Return a single JSON object whose test_cases list holds the test "
+            "cases of all features, grouped by feature in the order listed. Set feature_id of every test case to "
+            "the Feature ID it was written for and number test cases per feature starting at TC001.\n\n" + sections
+        )
+    
+    def build_test_case_remainder_request(self, feature_data, received_test_cases, test_case_range=None):
+        """Per-feature section asking only for the test cases missing after an incomplete response"""
+        already_generated = "\n".join(
+            f"- {test_case.get('test_case_id', '')}: {test_case.get('test_case_name', '')}"
+            for test_case in received_test_cases
+        )
+        return (
+            self.build_test_case_request(feature_data, test_case_range) + "\n\n"
+            f"The following {len(received_test_cases)} test cases were already generated for this feature:\n"
+            f"{already_generated}\n\n"
+            "Generate ONLY the remaining test cases needed to complete the coverage; do not repeat any of the above. "
+            f"Number them from TC{len(received_test_cases) + 1:03d}. If the coverage is already complete, return an empty test_cases list."
+        )
+
+class StaticContextModels:
+    """GenerativeModel handles that carry a static instruction server-side
+
+    For each (model, instruction) pair the best mechanism the SDK offers is used:
+    Gemini context caching (CachedContent) when enabled, else a model-level
+    system_instruction, else the instruction is returned as an inline prefix for
+    the caller to prepend. genai_module is injectable so the cache API can be
+    exercised against a local stand-in.
+    """
+
+    def __init__(self, genai_module, use_context_cache=False, ttl_seconds=3600):
+        self.genai = genai_module
+        self.use_context_cache = use_context_cache
+        self.ttl_seconds = ttl_seconds
+        self._models = {}
+        self._lock = threading.Lock()
+        try:
+            parameters = inspect.signature(genai_module.GenerativeModel.__init__).parameters
+            self.supports_system_instruction = 'system_instruction' in parameters
+        except (TypeError, ValueError):
+            self.supports_system_instruction = False
+
+    def get(self, model_name, instruction):
+        """Return (model, inline_prefix, mode) for sending prompts that share this instruction"""
+        key = (model_name, hashlib.sha256(instruction.encode('utf-8')).hexdigest())
+        with self._lock:
+            entry = self._models.get(key)
+            if entry is None or (entry['expires_at'] and time.monotonic() >= entry['expires_at']):
+                entry = self._create(model_name, instruction)
+                self._models[key] = entry
+            return entry['model'], entry['inline_prefix'], entry['mode']
+
+    def _create(self, model_name, instruction):
+        if self.use_context_cache and hasattr(self.genai, 'caching'):
+            try:
+                cached_content = self.genai.caching.CachedContent.create(
+                    model=model_name,
+                    system_instruction=instruction,
+                    ttl=timedelta(seconds=self.ttl_seconds)
+                )
+                model = self.genai.GenerativeModel.from_cached_content(cached_content=cached_content)
+                logger.info(f"Using Gemini context cache {getattr(cached_content, 'name', '')} for {model_name}")
+                # Refresh shortly before the server drops the cached content
+                return {'model': model, 'inline_prefix': '', 'mode': 'cached_content',
+                        'expires_at': time.monotonic() + self.ttl_seconds * 0.9}
+            except Exception as e:
+                # Context caching has a minimum token count and needs a versioned model name
+                logger.warning(f"Context caching unavailable for {model_name}, using system instruction: {e}")
+
+        if self.supports_system_instruction:
+            model = self.genai.GenerativeModel(model_name, system_instruction=instruction)
+            return {'model': model, 'inline_prefix': '', 'mode': 'system_instruction', 'expires_at': None}
+
+        model = self.genai.GenerativeModel(model_name)
+        return {'model': model, 'inline_prefix': instruction + "\n\n", 'mode': 'inline', 'expires_at': None}
@@ -0,0 +1,192 @@
+"""
+Process-wide adaptive rate limiter for Gemini API calls
+"""
+import asyncio
+import logging
+import re
+import threading
+import time
+from config import Config
+
+try:
+    from google.api_core.exceptions import ResourceExhausted, TooManyRequests
+    _RATE_LIMIT_EXCEPTIONS = (ResourceExhausted, TooManyRequests)
+except ImportError:
+    _RATE_LIMIT_EXCEPTIONS = ()
+
+logger = logging.getLogger(__name__)
+
+# Wording of 429 responses that reach us without an exception type or status code
+_RATE_LIMIT_MESSAGE = re.compile(r'\b429\b|RESOURCE_EXHAUSTED|exceeded your current quota|quota exceeded', re.IGNORECASE)
+
+class TokenBucket:
+    """Token bucket refilled continuously at rate_per_minute
+
+    reserve() takes the amount immediately, letting the balance go negative,
+    and returns how long the caller must wait for its reservation to be
+    covered. Callers are therefore served in arrival order without polling.
+    """
+
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate_per_minute = float(rate_per_minute)
+        self.capacity = float(capacity if capacity is not None else rate_per_minute)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    @property
+    def rate_per_second(self):
+        return self.rate_per_minute / 60.0
+
+    def refill(self, now):
+        elapsed = now - self.updated_at
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate_per_second)
+            self.updated_at = now
+
+    def reserve(self, amount, now):
+        """Take amount from the bucket and return the seconds to wait before using it"""
+        self.refill(now)
+        self.tokens -= amount
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.rate_per_second
+
+    def give_back(self, amount, now):
+        """Return over-reserved tokens, or take more when amount is negative"""
+        self.refill(now)
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+    def set_rate(self, rate_per_minute, now):
+        """Change the refill rate, scaling the capacity with it so a lower rate also means a smaller burst"""
+        self.refill(now)
+        self.capacity *= rate_per_minute / self.rate_per_minute
+        self.rate_per_minute = float(rate_per_minute)
+        self.tokens = min(self.capacity, self.tokens)
+
+    def drain(self, now):
+        """Empty the bucket so new callers wait for a fresh refill"""
+        self.refill(now)
+        self.tokens = min(self.tokens, 0.0)
+
+class AdaptiveRateLimiter:
+    """Requests-per-minute and tokens-per-minute limiter shared by every job and thread
+
+    The effective rate is the configured quota times a scale factor. A 429 /
+    ResourceExhausted error halves the scale (at most once per cooldown
+    window); every successful call after the cooldown adds recovery_step back
+    until the configured quota is reached again.
+    """
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None,
+                 min_scale=0.1, recovery_step=0.02, cooldown_seconds=10.0):
+        self.requests_per_minute = requests_per_minute or Config.GEMINI_REQUESTS_PER_MINUTE
+        self.tokens_per_minute = tokens_per_minute or Config.GEMINI_TOKENS_PER_MINUTE
+        self.min_scale = min_scale
+        self.recovery_step = recovery_step
+        self.cooldown_seconds = cooldown_seconds
+
+        self.scale = 1.0
+        self.last_throttle_at = None
+        self.throttle_count = 0
+        self._lock = threading.Lock()
+        self._requests = TokenBucket(self.requests_per_minute)
+        self._tokens = TokenBucket(self.tokens_per_minute)
+
+    def reserve(self, tokens=0):
+        """Reserve one request and the given number of tokens; return the seconds to wait"""
+        with self._lock:
+            now = time.monotonic()
+            request_wait = self._requests.reserve(1, now)
+            token_wait = self._tokens.reserve(tokens, now)
+            return max(request_wait, token_wait)
+
+    def acquire(self, tokens=0):
+        """Block the calling thread until a request with this many tokens may be sent"""
+        wait = self.reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self, tokens=0):
+        """Wait on the running event loop until a request with this many tokens may be sent"""
+        wait = self.reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    def record_usage(self, reserved_tokens, actual_tokens):
+        """Correct the token bucket once the real token count of a call is known"""
+        if actual_tokens is None:
+            return
+        with self._lock:
+            self._tokens.give_back(reserved_tokens - actual_tokens, time.monotonic())
+
+    def record_success(self):
+        """Slowly raise the rate back towards the configured quota"""
+        with self._lock:
+            if self.scale >= 1.0:
+                return
+            if self.last_throttle_at and time.monotonic() - self.last_throttle_at < self.cooldown_seconds:
+                return
+            self._set_scale(min(1.0, self.scale + self.recovery_step))
+
+    def record_throttle(self):
+        """Shrink the rate after the API reported that we are over quota"""
+        with self._lock:
+            now = time.monotonic()
+            self.throttle_count += 1
+            self._requests.drain(now)
+            self._tokens.drain(now)
+            if self.last_throttle_at and now - self.last_throttle_at < self.cooldown_seconds:
+                return
+            self.last_throttle_at = now
+            self._set_scale(max(self.min_scale, self.scale * 0.5))
+            logger.warning(f"Gemini quota exceeded, reducing rate to {self.scale:.0%} of configured quota")
+
+    def _set_scale(self, scale):
+        now = time.monotonic()
+        self.scale = scale
+        self._requests.set_rate(self.requests_per_minute * scale, now)
+        self._tokens.set_rate(self.tokens_per_minute * scale, now)
+
+    def headroom(self):
+        """Share of the request and token buckets still available right now (the lower of the two, <= 0 when waiting)"""
+        with self._lock:
+            now = time.monotonic()
+            self._requests.refill(now)
+            self._tokens.refill(now)
+            return min(self._requests.tokens / self._requests.capacity, self._tokens.tokens / self._tokens.capacity)
+
+    def get_stats(self):
+        """Current limiter state for status and health reporting"""
+        with self._lock:
+            return {
+                'scale': round(self.scale, 3),
+                'requests_per_minute': round(self._requests.rate_per_minute, 1),
+                'tokens_per_minute': round(self._tokens.rate_per_minute),
+                'throttle_count': self.throttle_count
+            }
+
+def is_rate_limit_error(error):
+    """Check whether an exception is a 429 / ResourceExhausted response
+
+    The exception type and HTTP status code decide; the message is only matched
+    for errors that carry neither.
+    """
+    if isinstance(error, _RATE_LIMIT_EXCEPTIONS) or type(error).__name__ in ('ResourceExhausted', 'TooManyRequests'):
+        return True
+    code = getattr(error, 'code', None)
+    if isinstance(code, int):
+        return code == 429
+    return bool(_RATE_LIMIT_MESSAGE.search(str(error)))
+
+_limiters = {}
+_limiter_lock = threading.Lock()
+
+def get_rate_limiter(name='default'):
+    """Get the process-wide AdaptiveRateLimiter of one API key (by pool name)"""
+    with _limiter_lock:
+        limiter = _limiters.get(name)
+        if limiter is None:
+            limiter = _limiters[name] = AdaptiveRateLimiter()
+        return limiter
@@ -0,0 +1,134 @@
+"""
+Content-addressed, size-bounded disk cache for Gemini responses
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import unicodedata
+
+logger = logging.getLogger(__name__)
+
+def normalize_text(text):
+    """Normalize document text so cosmetic differences map to the same cache key"""
+    text = unicodedata.normalize('NFC', text or '')
+    return re.sub(r'\s+', ' ', text).strip()
+
+def make_cache_key(*parts):
+    """Hash the given parts (strings or JSON-serializable values) into a stable cache key"""
+    digest = hashlib.sha256()
+    for part in parts:
+        if not isinstance(part, str):
+            part = json.dumps(part, sort_keys=True, ensure_ascii=False)
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\x00')
+    return digest.hexdigest()
+
+class ResponseCache:
+    """JSON values stored one file per key, evicted least-recently-used first
+
+    Recency is the file modification time, refreshed on every hit, so the
+    cache stays consistent when several gunicorn workers share the folder.
+    """
+
+    def __init__(self, folder, max_bytes):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._approx_bytes = None
+        os.makedirs(folder, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.folder, f'{key}.json')
+
+    def contains(self, key):
+        """Check for an entry without reading it or refreshing its recency"""
+        return os.path.exists(self._path(key))
+
+    def get(self, key):
+        """Return the cached value for key, or None on a miss"""
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as file:
+                value = json.load(file)
+            os.utime(path, None)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Discarding unreadable cache entry {key}: {e}")
+            self._remove(path)
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        """Store value under key and evict old entries if the cache is over its size limit"""
+        path = self._path(key)
+        try:
+            data = json.dumps(value, ensure_ascii=False).encode('utf-8')
+            fd, tmp_path = tempfile.mkstemp(dir=self.folder, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as file:
+                file.write(data)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning(f"Could not write cache entry {key}: {e}")
+            return
+
+        with self._lock:
+            if self._approx_bytes is None:
+                self._approx_bytes = self._scan_size()
+            else:
+                self._approx_bytes += len(data)
+            if self._approx_bytes > self.max_bytes:
+                self._evict()
+
+    def _scan_entries(self):
+        entries = []
+        with os.scandir(self.folder) as it:
+            for entry in it:
+                if entry.name.endswith('.json'):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def _scan_size(self):
+        return sum(size for _, size, _ in self._scan_entries())
+
+    def _evict(self):
+        """Remove least recently used entries until the cache is at 90% of its limit"""
+        entries = sorted(self._scan_entries())
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        removed = 0
+        for _, size, path in entries:
+            if total <= target:
+                break
+            if self._remove(path):
+                total -= size
+                removed += 1
+        self._approx_bytes = total
+        if removed:
+            logger.info(f"Evicted {removed} cache entries from {self.folder}")
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
+
+    def get_stats(self):
+        """Hit/miss counters for status reporting"""
+        return {'hits': self.hits, 'misses': self.misses}
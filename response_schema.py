@@ -0,0 +1,151 @@
+"""
+Response schemas for Gemini structured output and the validators compiled from them
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+TEST_TYPES = ['Positive', 'Negative', 'Boundary', 'Edge', 'Conflict', 'Fallback', 'Integration', 'Compatibility']
+PRIORITIES = ['High', 'Medium', 'Low']
+CATEGORIES = ['Functional', 'Non-functional', 'Integration', 'Compatibility', 'Performance']
+
+def _string(enum=None):
+    schema = {'type': 'string'}
+    if enum:
+        schema['enum'] = list(enum)
+    return schema
+
+def _string_list():
+    return {'type': 'array', 'items': _string()}
+
+def _object(properties):
+    # Every field is required so the model fills all of them; the validator still defaults missing ones
+    return {'type': 'object', 'properties': properties, 'required': list(properties)}
+
+FEATURE_SCHEMA = _object({
+    'features': {'type': 'array', 'items': _object({
+        'feature_id': _string(),
+        'feature_name': _string(),
+        'description': _string(),
+        'requirements': _string_list(),
+        'acceptance_criteria': _string_list(),
+        'priority': _string(PRIORITIES),
+        'module': _string(),
+        'frd_line': _string()
+    })}
+})
+
+TEST_CASE_SCHEMA = _object({
+    'test_cases': {'type': 'array', 'items': _object({
+        'test_case_id': _string(),
+        'test_case_name': _string(),
+        'feature_id': _string(),
+        'feature_name': _string(),
+        'module': _string(),
+        'test_type': _string(TEST_TYPES),
+        'priority': _string(PRIORITIES),
+        'preconditions': _string(),
+        'test_steps_formatted': _string(),
+        'test_data': _string(),
+        'expected_result': _string(),
+        'category': _string(CATEGORIES),
+        'frd_reference': _string(),
+        'gap_coverage': _string()
+    })}
+})
+
+# Response schema by the top-level array a call asks for
+SCHEMAS = {'features': FEATURE_SCHEMA, 'test_cases': TEST_CASE_SCHEMA}
+
+class SchemaError(ValueError):
+    """A response does not have the shape of its schema (retried like any unparseable response)"""
+
+def _compile_string(schema, path):
+    canonical = {value.lower(): value for value in schema.get('enum', ())}
+
+    def validate(value):
+        if isinstance(value, list) and all(isinstance(item, str) for item in value):
+            value = '\n'.join(value)
+        elif isinstance(value, (int, float, bool)):
+            value = str(value)
+        elif not isinstance(value, str):
+            raise SchemaError(f"{path} is {type(value).__name__}, expected a string")
+        # Enum spellings are normalized; other values are kept as written
+        return canonical.get(value.strip().lower(), value) if canonical else value
+
+    return validate, ''
+
+def _compile_array(schema, path):
+    validate_item, _ = compile_validator(schema['items'], f"{path}[]")
+    wraps_strings = schema['items']['type'] == 'string'
+
+    def validate(value):
+        if wraps_strings and isinstance(value, str):
+            value = [value]
+        if not isinstance(value, list):
+            raise SchemaError(f"{path} is {type(value).__name__}, expected an array")
+        items = []
+        errors = []
+        for item in value:
+            try:
+                items.append(validate_item(item))
+            except SchemaError as e:
+                errors.append(str(e))
+        if errors:
+            logger.warning(f"Dropped {len(errors)} of {len(value)} items of {path}: {errors[0]}")
+        return items
+
+    return validate, list
+
+def _compile_object(schema, path):
+    fields = []
+    for name, field_schema in schema['properties'].items():
+        validate_field, default = compile_validator(field_schema, f"{path}.{name}")
+        fields.append((name, validate_field, default))
+
+    def validate(value):
+        if not isinstance(value, dict):
+            raise SchemaError(f"{path} is {type(value).__name__}, expected an object")
+        # Extra keys (e.g. 'partial' from salvage) are kept, missing or null fields defaulted
+        result = dict(value)
+        for name, validate_field, default in fields:
+            field = value.get(name)
+            if field is None:
+                result[name] = default() if callable(default) else default
+            else:
+                result[name] = validate_field(field)
+        return result
+
+    return validate, None
+
+_COMPILERS = {'string': _compile_string, 'array': _compile_array, 'object': _compile_object}
+
+def compile_validator(schema, path='$'):
+    """Turn a schema into (validate, default) once, so checking a response does no schema lookups
+
+    validate(value) returns the value normalized to the schema or raises
+    SchemaError: numbers become strings, a list of strings where one string is
+    expected is joined by newlines, a lone string where a list is expected is
+    wrapped and array items of the wrong shape are dropped. default is the value
+    (or factory) used for a missing field.
+    """
+    compiler = _COMPILERS.get(schema.get('type'))
+    if compiler is None:
+        raise ValueError(f"Unsupported schema type at {path}: {schema.get('type')}")
+    return compiler(schema, path)
+
+_VALIDATORS = {array_key: compile_validator(schema)[0] for array_key, schema in SCHEMAS.items()}
+_ITEM_VALIDATORS = {
+    array_key: compile_validator(schema['properties'][array_key]['items'], f"$.{array_key}[]")[0]
+    for array_key, schema in SCHEMAS.items()
+}
+
+def validate_response(data, array_key):
+    """Validate a decoded 'features' or 'test_cases' response; raises SchemaError if the array is missing"""
+    if not isinstance(data, dict) or not isinstance(data.get(array_key), list):
+        raise SchemaError(f"Response has no '{array_key}' array")
+    return _VALIDATORS[array_key](data)
+
+def validate_item(item, array_key):
+    """Validate one element of a response array (e.g. a streamed test case); raises SchemaError"""
+    return _ITEM_VALIDATORS[array_key](item)
@@ -0,0 +1,127 @@
+"""
+Retry policies for Gemini calls: per-error-class backoff and a per-job retry budget
+"""
+import json
+import logging
+import random
+import threading
+
+from rate_limiter import is_rate_limit_error
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT = 'rate_limit'
+TIMEOUT = 'timeout'
+SERVER_ERROR = 'server_error'
+INVALID_RESPONSE = 'invalid_response'
+INCOMPLETE_RESPONSE = 'incomplete_response'
+FATAL = 'fatal'
+
+class IncompleteResponseError(Exception):
+    """A response that was salvaged or cut off and is missing part of its content"""
+
+class RetryPolicy:
+    """How often and how patiently one class of failure is retried
+
+    max_attempts counts the first call; delays use full jitter over an
+    exponentially growing window so concurrent features do not retry in step.
+    """
+
+    def __init__(self, max_attempts, base_delay=1.0, max_delay=30.0, multiplier=2.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+
+    def delay(self, retry_number):
+        """Seconds to wait before the given retry (1 = first retry)"""
+        window = min(self.max_delay, self.base_delay * self.multiplier ** (retry_number - 1))
+        return random.uniform(0, window)
+
+DEFAULT_POLICIES = {
+    # The shared rate limiter already slows down after a 429, so waits here stay moderate
+    RATE_LIMIT: RetryPolicy(max_attempts=5, base_delay=2.0, max_delay=60.0),
+    TIMEOUT: RetryPolicy(max_attempts=3, base_delay=1.0, max_delay=20.0),
+    SERVER_ERROR: RetryPolicy(max_attempts=3, base_delay=1.0, max_delay=20.0),
+    INVALID_RESPONSE: RetryPolicy(max_attempts=2, base_delay=0.5, max_delay=5.0),
+    # Only the missing remainder is asked for, so there is no reason to wait
+    INCOMPLETE_RESPONSE: RetryPolicy(max_attempts=3, base_delay=0.0, max_delay=0.0),
+    FATAL: RetryPolicy(max_attempts=1),
+}
+
+_TIMEOUT_ERRORS = ('DeadlineExceeded', 'TimeoutError', 'ReadTimeout', 'ConnectTimeout')
+_SERVER_ERRORS = ('InternalServerError', 'ServiceUnavailable', 'BadGateway', 'GatewayTimeout', 'Aborted', 'Unknown')
+
+def classify_error(error):
+    """Map an exception raised around a Gemini call to a retry policy class"""
+    if isinstance(error, IncompleteResponseError):
+        return INCOMPLETE_RESPONSE
+    if isinstance(error, (json.JSONDecodeError, KeyError, TypeError, AttributeError)):
+        return INVALID_RESPONSE
+    if is_rate_limit_error(error):
+        return RATE_LIMIT
+    name = type(error).__name__
+    if name in _TIMEOUT_ERRORS or isinstance(error, TimeoutError):
+        return TIMEOUT
+    code = getattr(error, 'code', None)
+    if name in _SERVER_ERRORS or (isinstance(code, int) and code >= 500):
+        return SERVER_ERROR
+    if isinstance(error, (ConnectionError, OSError)):
+        return SERVER_ERROR
+    # Empty or blocked responses raise ValueError from response.text
+    if isinstance(error, ValueError):
+        return INVALID_RESPONSE
+    return FATAL
+
+class RetryBudget:
+    """Upper bound on the retries one job may spend across all of its Gemini calls"""
+
+    def __init__(self, max_retries):
+        self.max_retries = max_retries
+        self.spent = 0
+        self.denied = 0
+        self._lock = threading.Lock()
+
+    def try_spend(self):
+        """Take one retry from the budget; False once it is used up"""
+        with self._lock:
+            if self.spent >= self.max_retries:
+                self.denied += 1
+                return False
+            self.spent += 1
+            return True
+
+    def get_stats(self):
+        with self._lock:
+            return {'max_retries': self.max_retries, 'spent': self.spent, 'denied': self.denied}
+
+class RetryState:
+    """Attempt bookkeeping for one logical request (e.g. one feature's test cases)"""
+
+    def __init__(self, budget, description, policies=None):
+        self.budget = budget
+        self.description = description
+        self.policies = policies or DEFAULT_POLICIES
+        self.attempts = {}
+
+    @property
+    def retries(self):
+        """Retries granted so far, over all error classes"""
+        return sum(attempts - 1 for attempts in self.attempts.values())
+
+    def next_delay(self, error):
+        """Seconds to wait before retrying after error, or None to give up"""
+        error_class = classify_error(error)
+        policy = self.policies.get(error_class, self.policies[FATAL])
+        attempts = self.attempts.get(error_class, 1)
+        if attempts >= policy.max_attempts:
+            logger.error(f"Giving up on {self.description} after {attempts} attempt(s) ({error_class}): {error}")
+            return None
+        if not self.budget.try_spend():
+            logger.error(f"Retry budget of the job exhausted, giving up on {self.description} ({error_class}): {error}")
+            return None
+
+        self.attempts[error_class] = attempts + 1
+        delay = policy.delay(attempts)
+        logger.warning(f"Retrying {self.description} in {delay:.1f}s ({error_class}, retry {attempts}): {error}")
+        return delay
@@ -0,0 +1,38 @@
+"""
+Single-flight coalescing: identical work that is already running is joined instead of repeated
+"""
+import hashlib
+import threading
+
+def upload_key(content, **options):
+    """Identity of an upload: its bytes and the generation options that change the result"""
+    digest = hashlib.sha256(content)
+    for name in sorted(options):
+        digest.update(f"\x00{name}={options[name]}".encode('utf-8'))
+    return digest.hexdigest()
+
+class SingleFlight:
+    """Maps the key of each in-flight job to the session running it"""
+
+    def __init__(self):
+        self._owners = {}
+        self._lock = threading.Lock()
+
+    def claim(self, key, session_id):
+        """Register session_id as running key; returns (owning session id, True if this call claimed it)"""
+        with self._lock:
+            owner = self._owners.get(key)
+            if owner is not None:
+                return owner, False
+            self._owners[key] = session_id
+            return session_id, True
+
+    def release(self, key, session_id):
+        """Forget key once its job has finished, so a later identical upload runs again"""
+        with self._lock:
+            if self._owners.get(key) == session_id:
+                del self._owners[key]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._owners)
@@ -0,0 +1,99 @@
+"""
+Incremental extraction of JSON array elements from a streamed model response
+"""
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+class IncrementalArrayParser:
+    """Yields each complete object of a JSON array as soon as its closing brace arrives
+
+    feed() accepts response text in arbitrary pieces (e.g. streamed chunks) and
+    returns the objects of the array under array_key completed by that piece.
+    Text before the array, markdown fences and anything after it are ignored.
+    Scanning is incremental, so total work is linear in the response length.
+    """
+
+    def __init__(self, array_key):
+        self.array_key = array_key
+        self.buffer = ''
+        self.position = 0
+        self.in_array = False
+        self.finished = False
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.object_start = None
+        self.objects_found = 0
+        self.objects_skipped = 0
+
+    def feed(self, text):
+        """Add response text and return the list of newly completed array elements"""
+        self.buffer += text
+        completed = []
+        if self.finished:
+            return completed
+
+        if not self.in_array and not self._find_array_start():
+            return completed
+
+        buffer = self.buffer
+        position = self.position
+        while position < len(buffer):
+            char = buffer[position]
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == '\\':
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char == '{':
+                if self.depth == 0:
+                    self.object_start = position
+                self.depth += 1
+            elif char == '}' and self.depth > 0:
+                self.depth -= 1
+                if self.depth == 0:
+                    element = self._decode(buffer[self.object_start:position + 1])
+                    if element is not None:
+                        completed.append(element)
+                    self.object_start = None
+            elif char == ']' and self.depth == 0:
+                self.finished = True
+                position += 1
+                break
+            position += 1
+
+        self.position = position
+        return completed
+
+    def _find_array_start(self):
+        """Locate the '[' opening the array under array_key"""
+        key_index = self.buffer.find(f'"{self.array_key}"')
+        if key_index == -1:
+            return False
+        bracket = self.buffer.find('[', key_index)
+        if bracket == -1:
+            return False
+        self.in_array = True
+        self.position = bracket + 1
+        return True
+
+    def _decode(self, text):
+        try:
+            element = json.loads(text)
+        except json.JSONDecodeError as e:
+            self.objects_skipped += 1
+            logger.warning(f"Skipping malformed {self.array_key} element in streamed response: {e}")
+            return None
+        self.objects_found += 1
+        return element
+
+    @property
+    def text(self):
+        """Full response text received so far"""
+        return self.buffer
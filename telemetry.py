@@ -0,0 +1,108 @@
+"""
+Per-call Gemini telemetry: one structured record per call, aggregated per job and exportable
+"""
+import csv
+import io
+import json
+import logging
+import math
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Fields of a call record, in export order
+RECORD_FIELDS = (
+    'timestamp', 'job_id', 'kind', 'feature_id', 'model', 'api_key',
+    'prompt_tokens', 'output_tokens', 'latency', 'ttft', 'retries', 'outcome'
+)
+
+# Outcomes of answered calls; failed calls carry their retry_policy error class instead
+OK = 'ok'
+TRUNCATED = 'truncated'
+
+def percentile(values, share):
+    """Nearest-rank percentile (share between 0 and 1) of values, None when there are none"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(share * len(ordered)) - 1)]
+
+def summarize(records):
+    """Call count, outcomes, token totals and latency / time-to-first-token percentiles of records"""
+    latencies = [record['latency'] for record in records if record['latency'] is not None]
+    ttfts = [record['ttft'] for record in records if record['ttft'] is not None]
+    outcomes = {}
+    for record in records:
+        outcomes[record['outcome']] = outcomes.get(record['outcome'], 0) + 1
+
+    def rounded(value):
+        return None if value is None else round(value, 3)
+
+    return {
+        'calls': len(records),
+        'outcomes': outcomes,
+        'prompt_tokens': sum(record['prompt_tokens'] or 0 for record in records),
+        'output_tokens': sum(record['output_tokens'] or 0 for record in records),
+        'retried_calls': sum(1 for record in records if record['retries']),
+        'latency_p50': rounded(percentile(latencies, 0.5)),
+        'latency_p95': rounded(percentile(latencies, 0.95)),
+        'latency_max': rounded(max(latencies, default=None)),
+        'ttft_p50': rounded(percentile(ttfts, 0.5)),
+        'ttft_p95': rounded(percentile(ttfts, 0.95))
+    }
+
+class CallTelemetry:
+    """Records of every Gemini call made for one job
+
+    A record has the RECORD_FIELDS: the task kind ('extraction' or 'test_cases',
+    which includes batched calls), the feature(s) it was for, model and API key
+    name, prompt and output tokens as reported by the API, latency and (for
+    streamed calls) time to the first chunk in seconds, the retries the logical
+    request had used before this call and the outcome. Each record is also logged
+    as JSON at DEBUG.
+    """
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.records = []
+        self._lock = threading.Lock()
+
+    def record(self, **fields):
+        record = {field: fields.get(field) for field in RECORD_FIELDS}
+        record['timestamp'] = round(time.time(), 3)
+        record['job_id'] = self.job_id
+        for field in ('latency', 'ttft'):
+            if record[field] is not None:
+                record[field] = round(record[field], 4)
+        with self._lock:
+            self.records.append(record)
+        logger.debug(json.dumps(record))
+        return record
+
+    def get_records(self):
+        with self._lock:
+            return list(self.records)
+
+    def get_stats(self):
+        """summarize() of all calls, plus the same per task kind and per model"""
+        records = self.get_records()
+        stats = summarize(records)
+        for group_field, group_name in (('kind', 'by_kind'), ('model', 'by_model')):
+            groups = {}
+            for record in records:
+                groups.setdefault(record[group_field] or 'unknown', []).append(record)
+            stats[group_name] = {name: summarize(group) for name, group in groups.items()}
+        return stats
+
+    def to_jsonl(self):
+        """All records as JSON Lines"""
+        return ''.join(json.dumps(record) + '\n' for record in self.get_records())
+
+    def to_csv(self):
+        """All records as CSV with a RECORD_FIELDS header"""
+        output = io.StringIO()
+        writer = csv.DictWriter(output, fieldnames=RECORD_FIELDS)
+        writer.writeheader()
+        writer.writerows(self.get_records())
+        return output.getvalue()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Test the API key pool: headroom-based scheduling, benching and per-key clients
+"""
+import sys
+import time
+sys.path.append('.')
+
+import pytest
+
+from api_key_pool import ApiKeyPool
+from config import Config
+from fake_gemini import FakeGeminiBackend, ResourceExhausted, DeadlineExceeded
+from gemini_client import GeminiClient
+from rate_limiter import AdaptiveRateLimiter
+
+def _pool(*backends, **settings):
+    pool = ApiKeyPool(**settings)
+    for index, backend in enumerate(backends, 1):
+        pool.add(f"key{index}", backend, AdaptiveRateLimiter(requests_per_minute=60, tokens_per_minute=100000))
+    return pool
+
+def test_select_prefers_most_headroom():
+    """The key whose quota was drawn down least gets the next call"""
+    pool = _pool(None, None)
+    first, second = pool.keys
+    first.rate_limiter.reserve(50000)
+    assert pool.select() is second
+
+    second.rate_limiter.reserve(80000)
+    assert pool.select() is first
+    print("✅ Calls scheduled to the key with the most headroom")
+
+def test_exhausted_and_failing_keys_are_benched():
+    """A 429 benches a key at once, timeouts only after failure_threshold in a row"""
+    pool = _pool(None, None, bench_seconds=0.05, failure_threshold=2)
+    first, second = pool.keys
+
+    pool.record_failure(first, ResourceExhausted('429 Resource has been exhausted'))
+    assert all(pool.select() is second for _ in range(3))
+    time.sleep(0.06)
+    assert pool.select() is first
+
+    pool.record_failure(second, DeadlineExceeded('504'))
+    pool.record_success(second)
+    pool.record_failure(second, DeadlineExceeded('504'))
+    assert not pool.get_stats()['key2']['benched']
+    pool.record_failure(second, DeadlineExceeded('504'))
+    assert pool.get_stats()['key2']['benched']
+    print("✅ Exhausted and failing keys benched")
+
+def test_lone_key_is_never_benched():
+    pool = _pool(None)
+    pool.record_failure(pool.keys[0], ResourceExhausted('429'))
+    assert not pool.get_stats()['key1']['benched']
+    print("✅ A single key stays in use")
+
+def test_client_spreads_calls_and_skips_exhausted_key(monkeypatch):
+    """GeminiClient calls each key's own backend and stops using a key that hit its quota"""
+    monkeypatch.setattr(Config, 'RESPONSE_CACHE_ENABLED', False)
+    exhausted = FakeGeminiBackend(time_scale=0, rate_limit_rate=1.0)
+    healthy = FakeGeminiBackend(time_scale=0)
+    other = FakeGeminiBackend(time_scale=0)
+    client = GeminiClient(backend=FakeGeminiBackend(time_scale=0), key_pool=_pool(exhausted, healthy, other))
+
+    with pytest.raises(ResourceExhausted):
+        client._generate_content('FRD Content:\nThe app shall start.', client.prompt_engine.extraction_instruction)
+    for _ in range(6):
+        client._generate_content('FRD Content:\nThe app shall start.', client.prompt_engine.extraction_instruction)
+
+    assert exhausted.calls == 1
+    assert healthy.calls == other.calls == 3
+    assert client.key_pool.get_stats()['key1']['benched']
+    print("✅ Calls spread over the healthy keys")
+
+if __name__ == '__main__':
+    sys.exit(pytest.main([__file__, '-q']))
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Test the shared asyncio runtime used by the async GeminiClient API
+"""
+import sys
+import asyncio
+import threading
+sys.path.append('.')
+
+from async_runtime import AsyncRuntime
+
+def test_in_flight_limit():
+    """No more than max_in_flight coroutines hold a slot at once"""
+    runtime = AsyncRuntime(max_in_flight=5)
+    state = {'running': 0, 'peak': 0}
+
+    async def fake_call():
+        async with runtime.in_flight():
+            state['running'] += 1
+            state['peak'] = max(state['peak'], state['running'])
+            await asyncio.sleep(0.01)
+            state['running'] -= 1
+
+    async def run_all():
+        await asyncio.gather(*(fake_call() for _ in range(40)))
+
+    runtime.run(run_all())
+
+    assert state['peak'] == 5
+    print(f"✅ Peak in-flight calls: {state['peak']}")
+
+def test_shared_loop_across_threads():
+    """Coroutines submitted from many job threads all run on the same loop"""
+    runtime = AsyncRuntime(max_in_flight=10)
+    loops = []
+    lock = threading.Lock()
+
+    async def record_loop():
+        with lock:
+            loops.append(asyncio.get_running_loop())
+
+    threads = [threading.Thread(target=runtime.run, args=(record_loop(),)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(loops) == 8
+    assert len(set(id(loop) for loop in loops)) == 1
+    print("✅ All jobs share one event loop")
+
+if __name__ == '__main__':
+    print("🧪 TESTING SHARED ASYNC RUNTIME")
+    print("=" * 50)
+    test_in_flight_limit()
+    test_shared_loop_across_threads()
+    print("=" * 50)
+    print("🎉 Async runtime tests passed!")
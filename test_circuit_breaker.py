@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Test the per-model circuit breaker, fallback to the alternate model and /health reporting
+"""
+import os
+import sys
+import time
+sys.path.append('.')
+
+import pytest
+
+import gemini_client
+from circuit_breaker import CircuitBreaker, CircuitOpenError, CLOSED, OPEN, HALF_OPEN
+from config import Config
+from fake_gemini import FakeGeminiBackend, DeadlineExceeded
+from gemini_client import GeminiClient
+
+class ServerError(Exception):
+    code = 503
+
+def test_opens_on_failures_and_recovers():
+    """Enough timeouts open the circuit; a successful trial after open_seconds closes it"""
+    breaker = CircuitBreaker('pro', failure_threshold=0.5, window=4, min_calls=4, open_seconds=0.05)
+    breaker.record_success(1.0)
+    breaker.record_failure(ValueError('unparseable answer'))
+    breaker.record_failure(DeadlineExceeded('504'))
+    breaker.record_failure(ServerError('503'))
+    assert breaker.state == CLOSED
+
+    breaker.record_failure(ServerError('503'))
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.allow() and breaker.state == HALF_OPEN
+    assert not breaker.allow()
+    breaker.record_success(1.0)
+    assert breaker.state == CLOSED
+    assert breaker.get_stats()['rejected'] == 2
+    print("✅ Circuit opened on failures and closed after a good trial")
+
+def test_slow_calls_count_as_failures():
+    """Calls slower than slow_call_seconds trip the circuit like errors"""
+    breaker = CircuitBreaker('pro', slow_call_seconds=5.0, window=3, min_calls=3)
+    for _ in range(3):
+        breaker.record_success(6.0)
+    assert breaker.state == OPEN
+    print("✅ Slow calls opened the circuit")
+
+class DownPrimaryBackend(FakeGeminiBackend):
+    """Fake whose primary model always times out"""
+
+    def answer(self, model, contents, generation_config):
+        if model.model_name == Config.GEMINI_MODEL:
+            raise DeadlineExceeded('504 Deadline Exceeded')
+        return super().answer(model, contents, generation_config)
+
+@pytest.fixture
+def breaking_client(monkeypatch):
+    monkeypatch.setattr(Config, 'RESPONSE_CACHE_ENABLED', False)
+    monkeypatch.setattr(Config, 'CIRCUIT_BREAKER_MIN_CALLS', 2)
+    monkeypatch.setattr(Config, 'FALLBACK_TASKS', ['test_cases'])
+    client = GeminiClient(backend=DownPrimaryBackend(time_scale=0))
+    for _ in range(2):
+        with pytest.raises(DeadlineExceeded):
+            client._generate_content('FRD Content:\nThe app shall start.', client.prompt_engine.extraction_instruction)
+    return client
+
+def test_open_circuit_fails_fast_or_falls_back(breaking_client):
+    """Extraction fails fast while the circuit is open; test case calls go to the fallback model"""
+    with pytest.raises(CircuitOpenError):
+        breaking_client._generate_content('FRD Content:\nThe app shall start.', breaking_client.prompt_engine.extraction_instruction)
+    assert breaking_client.extract_features_from_frd('The app shall start quickly.') is None
+
+    feature = {'feature_id': 'F001', 'feature_name': 'Start', 'description': 'App start'}
+    result = breaking_client.generate_test_cases_for_feature(feature)
+    assert result['test_cases']
+    assert breaking_client.model_router.get_stats()[Config.GEMINI_FALLBACK_MODEL]['calls'] == 1
+    print("✅ Open circuit failed fast and test cases fell back")
+
+def test_health_reports_circuits(breaking_client, monkeypatch):
+    """/health shows the open circuit and can fail the load balancer check"""
+    from app import app
+    monkeypatch.setattr(gemini_client, '_client', breaking_client)
+    monkeypatch.setattr(gemini_client, '_client_pid', os.getpid())
+
+    body = app.test_client().get('/health').get_json()
+    assert body['status'] == 'degraded'
+    assert body['gemini_circuits'][Config.GEMINI_MODEL]['state'] == OPEN
+
+    monkeypatch.setattr(Config, 'HEALTH_FAIL_ON_OPEN_CIRCUIT', True)
+    assert app.test_client().get('/health').status_code == 503
+    print("✅ /health reports the circuit state")
+
+if __name__ == '__main__':
+    sys.exit(pytest.main([__file__, '-q']))
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Test the continuation of Gemini responses cut off at the output limit
+"""
+import json
+import sys
+sys.path.append('.')
+
+import pytest
+
+from config import Config
+from fake_gemini import FakeGeminiBackend, FakeResponse, FinishReason, UsageMetadata
+from gemini_client import GeminiClient
+from job_context import JobContext
+
+@pytest.fixture
+def small_output(monkeypatch):
+    """An output limit far below what a full response needs, which the planner does not know about"""
+    monkeypatch.setattr(Config, 'RESPONSE_CACHE_ENABLED', False)
+    monkeypatch.setattr(Config, 'MAX_OUTPUT_TOKENS', 1500)
+    monkeypatch.setattr(Config, 'TOKENS_PER_TEST_CASE', 40)
+
+def test_max_tokens_marks_response_partial():
+    """A response that stopped at the output limit is partial even if its JSON happens to parse"""
+    text = json.dumps({'test_cases': [{'test_case_name': 'Login works'}]})
+    usage = UsageMetadata(10, 10)
+    client = GeminiClient(backend=FakeGeminiBackend(time_scale=0))
+
+    assert client._parse_response(FakeResponse(text, usage, FinishReason.MAX_TOKENS), 'test_cases')['partial']
+    assert 'partial' not in client._parse_response(FakeResponse(text, usage, FinishReason.STOP), 'test_cases')
+    print("✅ MAX_TOKENS finish reason detected")
+
+def test_cut_off_test_cases_are_continued(small_output):
+    """The remainder is requested and stitched without spending retries"""
+    backend = FakeGeminiBackend(time_scale=0)
+    client = GeminiClient(backend=backend)
+    job = JobContext()
+    feature = {'feature_id': 'F001', 'feature_name': 'Account lockout', 'description': 'Lock after failed logins'}
+
+    result = client.generate_test_cases_for_feature(feature, job=job)
+
+    assert 'partial' not in result
+    names = [test_case['test_case_name'] for test_case in result['test_cases']]
+    assert len(names) == len(set(names)) > 10
+    assert backend.calls > 1
+    assert job.retry_budget.get_stats()['spent'] == 0
+    print(f"✅ {len(names)} test cases stitched from {backend.calls} responses")
+
+def test_cut_off_streamed_test_cases_are_continued(small_output):
+    """Test cases streamed before the cut-off count as progress, so continuing spends no retries"""
+    backend = FakeGeminiBackend(time_scale=0)
+    client = GeminiClient(backend=backend)
+    job = JobContext()
+    feature = {'feature_id': 'F001', 'feature_name': 'Account lockout', 'description': 'Lock after failed logins'}
+    streamed = []
+
+    result = client.generate_test_cases_for_feature(feature, on_test_case=streamed.append, job=job)
+
+    assert 'partial' not in result
+    assert streamed == result['test_cases'] and len(streamed) > 10
+    assert backend.calls > 1
+    assert job.retry_budget.get_stats()['spent'] == 0
+    print(f"✅ {len(streamed)} streamed test cases stitched from {backend.calls} responses")
+
+def test_cut_off_extraction_is_continued(small_output):
+    """Features past the output limit are asked for in follow-up requests and numbered on"""
+    frd = "\n".join(f"The system shall support request type {number} for every customer account." for number in range(1, 31))
+    backend = FakeGeminiBackend(time_scale=0)
+    client = GeminiClient(backend=backend)
+
+    result = client.extract_features_from_frd(frd)
+
+    assert 'partial' not in result
+    assert [feature['feature_id'] for feature in result['features']] == [f'F{number:03d}' for number in range(1, 31)]
+    assert result['features'][-1]['description'].startswith('The system shall support request type 30')
+    assert backend.calls > 1
+    print(f"✅ 30 features extracted in {backend.calls} pieces")
+
+if __name__ == '__main__':
+    sys.exit(pytest.main([__file__, '-q']))
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Test page / paragraph-wise document extraction and feature extraction consuming it as a stream
+"""
+import sys
+import threading
+import time
+sys.path.append('.')
+
+import docx
+import pytest
+
+from config import Config
+from document_processor import DocumentProcessor, DocumentChunk
+from fake_gemini import FakeGeminiBackend
+from frd_chunker import iter_frd_chunks, split_frd_into_chunks
+from gemini_client import GeminiClient
+
+def test_text_paragraphs_carry_positions(tmp_path):
+    path = tmp_path / 'frd.txt'
+    text = "1. Login\nThe system shall log in users.\n\n2. Logout\nThe system shall log out users.\n"
+    path.write_text(text, encoding='utf-8')
+
+    chunks = list(DocumentProcessor.iter_document(str(path)))
+    assert [chunk.number for chunk in chunks] == [1, 2]
+    assert {chunk.kind for chunk in chunks} == {'paragraph'}
+    assert ''.join(chunk.text for chunk in chunks) == text
+    assert all(text[chunk.offset:].startswith(chunk.text) for chunk in chunks)
+    print("✅ Text file streamed in paragraphs with offsets")
+
+def test_docx_paragraphs_match_read_docx(tmp_path):
+    path = str(tmp_path / 'frd.docx')
+    document = docx.Document()
+    for line in ('Feature: Login', 'The system shall log in users.', 'The system shall lock accounts.'):
+        document.add_paragraph(line)
+    document.save(path)
+
+    chunks = list(DocumentProcessor.iter_docx_paragraphs(path))
+    assert chunks[1].text == 'The system shall log in users.\n'
+    assert chunks[2].offset == len(chunks[0].text) + len(chunks[1].text)
+    assert DocumentProcessor.read_docx(path) == ''.join(chunk.text for chunk in chunks)
+    print("✅ DOCX streamed in paragraphs")
+
+def test_chunks_from_pieces_match_whole_text():
+    """Chunking pages as they arrive gives the chunks of the joined text, wherever pages break lines"""
+    text = ''.join(f"{number}. Section {number}\n" + "The system shall record the event.\n" * 40 for number in range(1, 30))
+    pages = [text[start:start + 997] for start in range(0, len(text), 997)]
+    assert list(iter_frd_chunks(pages, 4000, 300)) == split_frd_into_chunks(text, 4000, 300)
+    print("✅ Streamed chunks equal whole-text chunks")
+
+SUBJECTS = ['Billing', 'Invoices', 'Refunds', 'Payments', 'Orders', 'Shipping',
+            'Returns', 'Accounts', 'Reports', 'Alerts', 'Exports', 'Audits']
+
+def test_extraction_starts_before_document_is_read(monkeypatch):
+    monkeypatch.setattr(Config, 'RESPONSE_CACHE_ENABLED', False)
+    monkeypatch.setattr(Config, 'MAX_FRD_CHARS', 3000)
+    monkeypatch.setattr(Config, 'FRD_CHUNK_SIZE', 2000)
+    monkeypatch.setattr(Config, 'FRD_CHUNK_OVERLAP', 100)
+    backend = FakeGeminiBackend(time_scale=0)
+    client = GeminiClient(backend=backend)
+    calls_before_last_page = []
+
+    def pages(count=12):
+        for number in range(1, count + 1):
+            if number == count:
+                deadline = time.monotonic() + 5
+                while backend.calls == 0 and time.monotonic() < deadline:
+                    time.sleep(0.01)
+                calls_before_last_page.append(backend.calls)
+            subject = SUBJECTS[number - 1]
+            yield f"{number}. {subject}\n" + f"{subject} service shall process every request of the account.\n" * 12
+
+    result = client.extract_features_from_stream(pages())
+
+    assert calls_before_last_page[0] > 0
+    assert 'partial' not in result
+    assert [feature['feature_name'].split()[0] for feature in result['features']] == SUBJECTS
+    print(f"✅ {backend.calls} chunk extractions, the first before the last page was read")
+
+def test_cached_stream_is_found_before_any_chunk_is_sent(monkeypatch, tmp_path):
+    """With the source's digest a repeated long document is answered from the cache after reading its head"""
+    monkeypatch.setattr(Config, 'CACHE_FOLDER', str(tmp_path))
+    monkeypatch.setattr(Config, 'MAX_FRD_CHARS', 3000)
+    monkeypatch.setattr(Config, 'FRD_CHUNK_SIZE', 2000)
+    monkeypatch.setattr(Config, 'FRD_CHUNK_OVERLAP', 100)
+    backend = FakeGeminiBackend(time_scale=0)
+    client = GeminiClient(backend=backend)
+    pages_read = []
+
+    def pages():
+        for number, subject in enumerate(SUBJECTS, 1):
+            pages_read.append(number)
+            yield f"{number}. {subject}\n" + f"{subject} service shall process every request of the account.\n" * 12
+
+    first = client.extract_features_from_stream(pages(), source_digest='upload-1')
+    calls = backend.calls
+    pages_read.clear()
+    second = client.extract_features_from_stream(pages(), source_digest='upload-1')
+
+    assert second == first and backend.calls == calls
+    assert len(pages_read) < len(SUBJECTS)
+    print(f"✅ Cached extraction found after reading {len(pages_read)} of {len(SUBJECTS)} pages")
+
+def test_short_stream_is_extracted_in_one_call(monkeypatch):
+    monkeypatch.setattr(Config, 'RESPONSE_CACHE_ENABLED', False)
+    backend = FakeGeminiBackend(time_scale=0)
+    client = GeminiClient(backend=backend)
+
+    result = client.extract_features_from_stream(["The system shall log in users.\n", "The system shall log out users.\n"])
+    assert backend.calls == 1 and len(result['features']) == 2
+    print("✅ Short document extracted in one call")
+
+def test_reading_waits_while_chunks_are_queued(monkeypatch):
+    """Only 2 x MAX_CONCURRENT_FEATURES chunks wait for extraction; reading resumes as they finish"""
+    monkeypatch.setattr(Config, 'RESPONSE_CACHE_ENABLED', False)
+    monkeypatch.setattr(Config, 'MAX_FRD_CHARS', 3000)
+    monkeypatch.setattr(Config, 'FRD_CHUNK_SIZE', 2000)
+    monkeypatch.setattr(Config, 'FRD_CHUNK_OVERLAP', 100)
+    monkeypatch.setattr(Config, 'MAX_CONCURRENT_FEATURES', 1)
+    client = GeminiClient(backend=FakeGeminiBackend(time_scale=0))
+    extract = client._extract_features_once
+    release = threading.Event()
+    pages_read = []
+
+    def blocked_extract(*args):
+        release.wait(5)
+        return extract(*args)
+
+    def pages(count=40):
+        for number in range(1, count + 1):
+            pages_read.append(number)
+            subject = SUBJECTS[(number - 1) % len(SUBJECTS)]
+            yield f"{number}. {subject} {number}\n" + f"{subject} service shall process every request of the account.\n" * 12
+
+    monkeypatch.setattr(client, '_extract_features_once', blocked_extract)
+    results = []
+    reader = threading.Thread(target=lambda: results.append(client.extract_features_from_stream(pages())))
+    reader.start()
+    time.sleep(0.3)
+    paused_at = len(pages_read)
+    release.set()
+    reader.join(10)
+
+    assert paused_at < 10 and len(pages_read) == 40
+    assert results[0]['features'] and 'partial' not in results[0]
+    print(f"✅ Reading paused after {paused_at} of 40 pages while chunks were queued")
+
+def test_parse_error_after_first_pages_fails_the_job(monkeypatch, tmp_path):
+    """Pages already handed on are not replaced by the sample FRD; the job fails with the parse error"""
+    import app as app_module
+
+    def iter_document(file_path):
+        yield DocumentChunk("1. Billing\nThe billing service shall invoice every account monthly.\n", 'page', 1, 0)
+        raise ValueError('EOF marker not found')
+
+    class ReadingGenerator:
+        def process_frd_document(self, content, progress_callback=None, **kwargs):
+            assert not isinstance(content, str)
+            return True, f"Read {len(''.join(content))} characters"
+
+    monkeypatch.setattr(app_module.DocumentProcessor, 'iter_document', staticmethod(iter_document))
+    monkeypatch.setattr(app_module, 'TestCaseGenerator', ReadingGenerator)
+    monkeypatch.setattr(app_module, 'processing_status', {'broken': {'status': 'uploaded'}})
+    path = tmp_path / 'broken.pdf'
+    path.write_bytes(b'%PDF-1.4 truncated')
+    app_module.process_document_async('broken', str(path))
+
+    status = app_module.processing_status['broken']
+    assert status['status'] == 'error'
+    assert status['message'] == 'Error reading document: EOF marker not found'
+    print("✅ Parse error after the first page fails the job")
+
+if __name__ == '__main__':
+    sys.exit(pytest.main([__file__, '-q']))
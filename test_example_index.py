@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Test BM25 ranking of few-shot examples and key-value rows per feature
+"""
+import sys
+sys.path.append('.')
+
+from example_index import BM25Index, ExampleRetriever, tokenize
+from prompt_engine import PromptEngine
+
+EXAMPLES = [
+    {'Input': 'Fillet edges with a constant radius', 'Output': 'Verify fillet radius on selected edges'},
+    {'Input': 'Rib creation from an open sketch profile', 'Output': 'Verify rib thickness and direction'},
+    {'Input': 'Export the drawing to PDF', 'Output': 'Verify PDF export keeps layers'},
+    {'Input': 'Rib conflict solver messages', 'Output': 'Verify rib conflict message lists options'},
+]
+KEY_VALUES = [
+    {'Feature Name': 'Fillet', 'Scenario_Name': 'Variable radius', 'Scenario_Description': 'Radius changes along edge'},
+    {'Feature Name': 'Rib', 'Scenario_Name': 'Multi-curve rib', 'Scenario_Description': '4 curves = 4 rib objects'},
+    {'Feature Name': 'Export', 'Scenario_Name': 'PDF layers', 'Scenario_Description': 'Layers kept in PDF'},
+]
+
+def test_tokenize_drops_stopwords():
+    """Tokens are lowercased words without stopwords"""
+    assert tokenize('The Rib SHALL be created from a Sketch') == ['rib', 'created', 'sketch']
+    print("✅ Tokenizer normalizes text")
+
+def test_bm25_ranks_matching_documents_first():
+    """Documents sharing rare query terms rank above the rest; no match returns nothing"""
+    index = BM25Index([f"{example['Input']} {example['Output']}" for example in EXAMPLES])
+    assert index.search('rib conflict', 2) == [3, 1]
+    assert index.search('pdf', 5) == [2]
+    assert index.search('unrelated words', 3) == []
+    print("✅ BM25 ranks relevant documents first")
+
+def test_retriever_picks_examples_per_feature():
+    """A feature gets the examples and key-value rows closest to its name, module and description"""
+    retriever = ExampleRetriever(EXAMPLES, KEY_VALUES)
+    query = retriever.feature_query({'feature_name': 'Rib', 'module': 'Part Design', 'description': 'Create ribs from curves'})
+
+    assert sorted(EXAMPLES.index(example) for example in retriever.examples_for(query, 2)) == [1, 3]
+    assert retriever.key_values_for(query, 1) == [KEY_VALUES[1]]
+    assert retriever.examples_for('nothing in common', 2) == EXAMPLES[:2]
+    print("✅ Retriever selects the most similar rows")
+
+def test_prompt_carries_only_ranked_examples():
+    """With a retriever the static instruction has no examples and each request has its own top-k"""
+    engine = PromptEngine(EXAMPLES, KEY_VALUES, retriever=ExampleRetriever(EXAMPLES, KEY_VALUES),
+                          examples_per_feature=1, key_values_per_feature=1)
+    fillet = {'feature_id': 'F001', 'feature_name': 'Fillet', 'description': 'Round edges with a radius'}
+    export = {'feature_id': 'F002', 'feature_name': 'Export', 'description': 'Save drawings as PDF'}
+
+    assert 'Few-shot Examples' not in engine.test_case_instruction
+    assert 'Few-shot Examples' in engine.extraction_instruction
+    request = engine.build_test_case_request(fillet)
+    assert 'constant radius' in request and 'Variable radius' in request
+    assert 'PDF' not in request
+
+    batch = engine.build_test_case_batch_request([fillet, export, fillet])
+    assert batch.count('constant radius') == 1 and 'Export the drawing to PDF' in batch
+    print("✅ Prompts carry only the examples ranked for their features")
+
+if __name__ == '__main__':
+    print("🧪 TESTING EXAMPLE INDEX")
+    print("=" * 50)
+    test_tokenize_drops_stopwords()
+    test_bm25_ranks_matching_documents_first()
+    test_retriever_picks_examples_per_feature()
+    test_prompt_carries_only_ranked_examples()
+    print("=" * 50)
+    print("🎉 Example index tests passed!")
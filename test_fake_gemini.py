@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Test the local fake Gemini backend and GeminiClient running against it
+"""
+import sys
+sys.path.append('.')
+
+import pytest
+
+from config import Config
+from gemini_client import GeminiClient
+from fake_gemini import FakeGeminiBackend, FinishReason, DeadlineExceeded
+from retry_policy import classify_error, RATE_LIMIT, TIMEOUT
+
+FRD = """Login
+The system shall lock the account after five failed login attempts.
+Users can reset their password from the login page.
+
+Reports
+The report module must export monthly totals to PDF."""
+
+@pytest.fixture
+def offline(monkeypatch):
+    monkeypatch.setattr(Config, 'RESPONSE_CACHE_ENABLED', False)
+    monkeypatch.setattr(Config, 'STREAM_TEST_CASES', False)
+
+def test_client_runs_offline(offline):
+    """Features and test cases come back schema-valid and derived from the prompt"""
+    client = GeminiClient(backend=FakeGeminiBackend(time_scale=0))
+
+    features = client.extract_features_from_frd(FRD)['features']
+    assert [feature['feature_id'] for feature in features] == ['F001', 'F002', 'F003']
+    assert features[0]['frd_line'].startswith('The system shall lock')
+
+    test_cases = client.generate_test_cases_for_feature(features[2])['test_cases']
+    assert 15 <= len(test_cases) <= 25
+    assert {test_case['feature_id'] for test_case in test_cases} == {'F003'}
+    assert client.extract_features_from_frd(FRD)['features'] == features
+    print(f"✅ {len(features)} features and {len(test_cases)} test cases generated offline")
+
+def test_faults_are_injected():
+    """429s and timeouts raise errors the retry policy classifies like the real ones"""
+    backend = FakeGeminiBackend(time_scale=0, rate_limit_rate=0.5, timeout_rate=0.5)
+    errors = []
+    for _ in range(20):
+        try:
+            backend.GenerativeModel('gemini-1.5-pro').generate_content('FRD Content:\nThe app shall start.')
+        except Exception as e:
+            errors.append(e)
+
+    assert len(errors) == 20
+    assert {classify_error(error) for error in errors} == {RATE_LIMIT, TIMEOUT}
+    assert backend.get_stats()['timeout'] == sum(isinstance(error, DeadlineExceeded) for error in errors)
+    print(f"✅ Injected faults: {backend.get_stats()}")
+
+def test_malformed_responses_are_repaired(offline, monkeypatch):
+    """Malformed JSON is salvaged by the client's tolerant parser"""
+    # Structured output rules the defects out, so ask for free text
+    monkeypatch.setattr(Config, 'GEMINI_STRUCTURED_OUTPUT', False)
+    client = GeminiClient(backend=FakeGeminiBackend(time_scale=0, malformed_rate=1.0, seed=3))
+    result = client.extract_features_from_frd(FRD)
+    assert result['features'] and result['features'][0]['feature_id'] == 'F001'
+    print("✅ Malformed fake responses parsed")
+
+def test_output_limit_truncates():
+    """Responses longer than max_output_tokens are cut and finish with MAX_TOKENS"""
+    model = FakeGeminiBackend(time_scale=0).GenerativeModel('gemini-1.5-pro')
+    request = "- Feature ID: F001\n- Feature Name: Login\n\nGenerate 25 test cases for this feature."
+
+    complete = model.generate_content(request)
+    truncated = model.generate_content(request, generation_config={'max_output_tokens': 300})
+    assert complete.candidates[0].finish_reason == FinishReason.STOP
+    assert truncated.candidates[0].finish_reason == FinishReason.MAX_TOKENS
+    assert complete.text.startswith(truncated.text) and len(truncated.text) < len(complete.text)
+    print("✅ Output limit truncates like the API")
+
+if __name__ == '__main__':
+    sys.exit(pytest.main([__file__, '-q']))
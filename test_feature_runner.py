@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Test the concurrent per-feature fan-out used by process_frd_document
+"""
+import sys
+import time
+import random
+sys.path.append('.')
+
+from fake_gemini import FakeGeminiBackend
+from feature_runner import run_features, run_feature_batches, pack_feature_batches
+from gemini_client import GeminiClient
+
+def make_features(count):
+    return [{'feature_id': f'F{i:03d}', 'feature_name': f'Feature {i}'} for i in range(1, count + 1)]
+
+def test_results_keep_feature_order():
+    """Results come back in feature order even when features finish out of order"""
+    features = make_features(12)
+
+    def worker(idx, feature):
+        time.sleep(random.uniform(0, 0.02))
+        return [f"{feature['feature_id']}-TC"]
+
+    results = run_features(features, worker, max_workers=6)
+
+    assert results == [[f"{f['feature_id']}-TC"] for f in features]
+    print("✅ Results keep the original feature order")
+
+def test_failure_is_isolated():
+    """One failing feature yields None without affecting the others"""
+    features = make_features(5)
+
+    def worker(idx, feature):
+        if idx == 3:
+            raise RuntimeError("Gemini exploded")
+        return idx
+
+    results = run_features(features, worker, max_workers=3)
+
+    assert results == [1, 2, None, 4, 5]
+    print("✅ Failure of one feature is isolated")
+
+def test_progress_reported_per_feature():
+    """Every feature reports progress exactly once"""
+    features = make_features(8)
+    messages = []
+
+    run_features(features, lambda idx, feature: idx, max_workers=4, progress_callback=messages.append)
+
+    assert len(messages) == len(features)
+    for feature in features:
+        assert any(msg.endswith(f": {feature['feature_name']}") for msg in messages)
+    print("✅ Progress reported for every feature")
+
+def test_parallelism_is_bounded():
+    """No more than max_workers features run at the same time"""
+    import threading
+    features = make_features(10)
+    lock = threading.Lock()
+    state = {'running': 0, 'peak': 0}
+
+    def worker(idx, feature):
+        with lock:
+            state['running'] += 1
+            state['peak'] = max(state['peak'], state['running'])
+        time.sleep(0.01)
+        with lock:
+            state['running'] -= 1
+        return idx
+
+    run_features(features, worker, max_workers=3)
+
+    assert state['peak'] <= 3
+    print(f"✅ Peak parallelism {state['peak']} within limit")
+
+def test_batches_respect_token_budgets():
+    """Features are packed in order until a token budget or the size limit is hit"""
+    costs = [(1000, 2000), (1000, 2000), (1000, 2000), (0, 0), (1000, 2000), (9000, 2000), (500, 2000)]
+
+    batches = pack_feature_batches(costs, max_input_tokens=5000, max_output_tokens=6000, max_batch_size=8)
+    assert batches == [[0, 1, 2, 3], [4], [5], [6]]
+
+    batches = pack_feature_batches(costs, max_input_tokens=50000, max_output_tokens=50000, max_batch_size=2)
+    assert batches == [[0, 1], [2, 3, 4], [5, 6]]
+    print("✅ Batches respect token budgets and the batch size limit")
+
+def test_packed_batches_ask_for_min_test_cases_per_feature():
+    """Batching never asks for fewer test cases per feature than a single-feature call"""
+    client = GeminiClient(backend=FakeGeminiBackend(time_scale=0))
+    planner = client.budget_planner
+    features = make_features(12)
+
+    batches = client.plan_test_case_batches(features, use_cache=False)
+
+    assert max(len(batch) for batch in batches) > 1
+    for batch in batches:
+        request = client.prompt_engine.build_test_case_batch_request([features[position] for position in batch])
+        plan = planner.plan_test_cases(client.prompt_engine.test_case_instruction, request, len(batch))
+        low, _ = client._test_case_range(plan) or (planner.min_test_cases, None)
+        assert low >= planner.min_test_cases
+    print(f"✅ Batches of up to {max(len(batch) for batch in batches)} features keep {planner.min_test_cases}+ test cases each")
+
+def test_batch_results_keep_feature_order():
+    """Batch results land at their features' positions and a failing batch yields None"""
+    features = make_features(7)
+    batches = [[0, 1, 2], [3, 4], [5, 6]]
+    messages = []
+
+    def worker(batch):
+        if batch[0][0] == 4:
+            raise RuntimeError("batch failed")
+        time.sleep(random.uniform(0, 0.02))
+        return [feature['feature_id'] for _, feature in batch]
+
+    results = run_feature_batches(features, batches, worker, max_workers=3, progress_callback=messages.append)
+
+    assert results == ['F001', 'F002', 'F003', None, None, 'F006', 'F007']
+    assert sorted(messages) == sorted([
+        "Generating test cases for features 1-3/7",
+        "Generating test cases for features 4-5/7",
+        "Generating test cases for features 6-7/7"
+    ])
+    print("✅ Batched results keep the original feature order")
+
+if __name__ == '__main__':
+    print("🧪 TESTING CONCURRENT FEATURE GENERATION")
+    print("=" * 50)
+    test_results_keep_feature_order()
+    test_failure_is_isolated()
+    test_progress_reported_per_feature()
+    test_parallelism_is_bounded()
+    test_batches_respect_token_budgets()
+    test_packed_batches_ask_for_min_test_cases_per_feature()
+    test_batch_results_keep_feature_order()
+    print("=" * 50)
+    print("🎉 All feature runner tests passed!")
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Test chunked feature extraction helpers for FRDs beyond the single-call limit
+"""
+import sys
+sys.path.append('.')
+
+from frd_chunker import split_into_sections, split_frd_into_chunks, merge_chunk_features
+
+def make_frd(sections=60, body_lines=12):
+    parts = []
+    for i in range(1, sections + 1):
+        parts.append(f"{i}. Feature Section {i}\n")
+        for j in range(body_lines):
+            parts.append(f"The system shall support behaviour {i}.{j} for partial result options.\n")
+        parts.append("\n")
+    return ''.join(parts)
+
+def test_sections_split_on_headings():
+    """Numbered headings start new sections"""
+    sections = split_into_sections(make_frd(sections=3, body_lines=2))
+    assert len(sections) == 3
+    assert sections[1].startswith("2. Feature Section 2")
+    print("✅ Sections split on headings")
+
+def test_chunks_cover_document_with_overlap():
+    """Every line lands in a chunk, chunks stay bounded and overlap their predecessor"""
+    frd = make_frd()
+    chunk_size, overlap = 5000, 500
+    chunks = split_frd_into_chunks(frd, chunk_size, overlap)
+
+    assert len(chunks) > 1
+    assert all(len(chunk) <= chunk_size + overlap for chunk in chunks)
+    for line in frd.splitlines():
+        assert any(line in chunk for chunk in chunks)
+    for previous, chunk in zip(chunks, chunks[1:]):
+        head = chunk[:100]
+        assert head in previous
+    print(f"✅ {len(frd)} chars split into {len(chunks)} overlapping chunks")
+
+def test_small_document_is_single_chunk():
+    """Documents under the chunk size are not split"""
+    assert split_frd_into_chunks("short FRD", 1000, 100) == ["short FRD"]
+    print("✅ Small FRD stays in one chunk")
+
+def test_oversized_section_is_split():
+    """A single huge section is broken at line boundaries"""
+    frd = "1. Giant Section\n" + "".join(f"line {i} of a very long section\n" for i in range(2000))
+    chunks = split_frd_into_chunks(frd, 4000, 200)
+    assert all(len(chunk) <= 4200 for chunk in chunks)
+    assert all(chunk.endswith('\n') for chunk in chunks[:-1])
+    print("✅ Oversized section split at line boundaries")
+
+def test_merge_deduplicates_overlapping_features():
+    """Features seen in two chunks are merged and IDs renumbered"""
+    chunk_results = [
+        {'features': [
+            {'feature_id': 'F001', 'feature_name': 'Login', 'description': 'Short',
+             'requirements': ['valid user'], 'acceptance_criteria': ['logs in']},
+            {'feature_id': 'F002', 'feature_name': 'Partial Result', 'description': 'Partial',
+             'requirements': ['r1']}
+        ]},
+        None,
+        {'features': [
+            {'feature_id': 'F001', 'feature_name': 'partial  result', 'description': 'Partial result options in detail',
+             'requirements': ['r1', 'r2'], 'module': 'Rib'},
+            {'feature_id': 'F002', 'feature_name': 'Export', 'description': 'Export data'}
+        ]}
+    ]
+
+    merged = merge_chunk_features(chunk_results)['features']
+
+    assert [f['feature_name'] for f in merged] == ['Login', 'Partial Result', 'Export']
+    assert [f['feature_id'] for f in merged] == ['F001', 'F002', 'F003']
+    partial = merged[1]
+    assert partial['requirements'] == ['r1', 'r2']
+    assert partial['description'] == 'Partial result options in detail'
+    assert partial['module'] == 'Rib'
+    print("✅ Overlapping features merged and renumbered")
+
+if __name__ == '__main__':
+    print("🧪 TESTING FRD CHUNKING")
+    print("=" * 50)
+    test_sections_split_on_headings()
+    test_chunks_cover_document_with_overlap()
+    test_small_document_is_single_chunk()
+    test_oversized_section_is_split()
+    test_merge_deduplicates_overlapping_features()
+    print("=" * 50)
+    print("🎉 FRD chunking tests passed!")
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Test the process-wide GeminiClient registry and its shared reference data
+"""
+import sys
+sys.path.append('.')
+
+import gemini_client
+from config import Config
+
+def _reset_registry(monkeypatch):
+    monkeypatch.setattr(Config, 'GEMINI_API_KEY', Config.GEMINI_API_KEY or 'test-key')
+    monkeypatch.setattr(Config, 'RESPONSE_CACHE_ENABLED', False)
+    monkeypatch.setattr(gemini_client, '_reference_data', None)
+    monkeypatch.setattr(gemini_client, '_client', None)
+    monkeypatch.setattr(gemini_client, '_client_pid', None)
+
+def test_client_shared_across_jobs(monkeypatch):
+    """Every job gets the same client and the CSVs are read only once"""
+    _reset_registry(monkeypatch)
+    reads = []
+    original_read = gemini_client._read_csv_rows
+    monkeypatch.setattr(gemini_client, '_read_csv_rows', lambda path: reads.append(path) or original_read(path))
+
+    first = gemini_client.get_gemini_client()
+    second = gemini_client.get_gemini_client()
+
+    assert first is second
+    assert len(reads) == 2
+    assert isinstance(first.few_shot_examples, tuple) and first.few_shot_examples
+    assert 'Input' in first.few_shot_examples[0]
+    print(f"✅ One client shared, CSVs read {len(reads)} times")
+
+def test_forked_worker_gets_own_client(monkeypatch):
+    """A client created before a fork is replaced in the child, the reference data is kept"""
+    _reset_registry(monkeypatch)
+    parent_client = gemini_client.get_gemini_client()
+    monkeypatch.setattr(gemini_client, '_client_pid', -1)
+
+    child_client = gemini_client.get_gemini_client()
+
+    assert child_client is not parent_client
+    assert child_client.few_shot_examples is parent_client.few_shot_examples
+    print("✅ Forked worker builds its own client on the preloaded data")
+
+if __name__ == '__main__':
+    import pytest
+    sys.exit(pytest.main([__file__, '-q']))
@@ -1,8 +1,12 @@
 import csv
 import os
 from datetime import datetime
+from functools import partial
 from config import Config
-from gemini_client import GeminiClient
+from gemini_client import get_gemini_client
+from job_context import JobContext
+from feature_runner import run_features, run_features_async, run_feature_batches, get_feature_display_name, FeatureResultSink
+from near_duplicates import remove_near_duplicates
 import json
 import logging
 
@@ -13,17 +17,33 @@ logger = logging.getLogger(__name__)
 
 class TestCaseGenerator:
     def __init__(self):
-        self.gemini_client = GeminiClient()
+        self.gemini_client = get_gemini_client()
         self.all_test_cases = []
+        self.near_duplicates_removed = 0
+        self.job = None
         
-    def process_frd_document(self, frd_content, progress_callback=None):
-        """Process FRD document and generate test cases"""
+    def process_frd_document(self, frd_content, progress_callback=None, max_workers=None, use_cache=True, result_callback=None, model_mode=None, job_id=None, source_digest=None):
+        """Process FRD document and generate test cases
+        
+        frd_content is the document text or an iterable of its text pieces (e.g. pages
+        from DocumentProcessor.iter_document), consumed while they are being parsed.
+        result_callback, if given, receives every test case as soon as it is available.
+        model_mode ('auto', 'fast' or 'quality') overrides GEMINI_MODEL_MODE for this job.
+        job_id tags the telemetry records of the job's Gemini calls.
+        source_digest identifies the document behind streamed frd_content (e.g. a hash
+        of the uploaded file), so a cached extraction is found before it is parsed.
+        """
         
         logger.info("Extracting features from FRD document...")
         if progress_callback:
             progress_callback("Extracting features from FRD document...")
             
-        features_data = self.gemini_client.extract_features_from_frd(frd_content)
+        # One retry budget for every Gemini call of this document
+        self.job = JobContext(model_mode=model_mode, job_id=job_id)
+        if isinstance(frd_content, str):
+            features_data = self.gemini_client.extract_features_from_frd(frd_content, use_cache=use_cache, job=self.job)
+        else:
+            features_data = self.gemini_client.extract_features_from_stream(frd_content, use_cache=use_cache, job=self.job, source_digest=source_digest)
         
         if not features_data or 'features' not in features_data:
             logger.error("Failed to extract features from FRD")
@@ -33,36 +53,97 @@ class TestCaseGenerator:
         logger.info(f"Found {len(features)} features")
         
         if progress_callback:
-            progress_callback(f"Found {len(features)} features. Generating test cases...")
-        
-        # Generate test cases for each feature
-        for idx, feature in enumerate(features, 1):
-            # Get feature name properly - this was working correctly
-            feature_name = feature.get('feature_name', feature.get('name', f'Feature_{idx}'))
-            
-            logger.info(f"Generating test cases for Feature {idx}/{len(features)}: {feature_name}")
-            
-            if progress_callback:
-                progress_callback(f"Generating test cases for feature {idx}/{len(features)}: {feature_name}")
-            
-            test_cases_data = self.gemini_client.generate_test_cases_for_feature(feature)
-            
-            if test_cases_data and 'test_cases' in test_cases_data:
-                # Add feature information to each test case
-                for test_case in test_cases_data['test_cases']:
-                    test_case['feature_name'] = feature_name
-                    test_case['feature_id'] = feature.get('feature_id', feature.get('id', f'F{idx:03d}'))
-                    test_case['module'] = feature.get('module', test_case.get('module', 'Unknown'))
-                
-                self.all_test_cases.extend(test_cases_data['test_cases'])
-                logger.info(f"Generated {len(test_cases_data['test_cases'])} test cases for {feature_name}")
+            if use_cache:
+                unchanged = sum(1 for feature in features if self.gemini_client.has_cached_test_cases(feature, self.job))
+                progress_callback(f"Found {len(features)} features ({unchanged} unchanged since a previous run). Generating test cases...")
             else:
-                logger.warning(f"Failed to generate test cases for {feature_name}")
-            
-            # Add delay to respect API rate limits
-            self.gemini_client.rate_limit_delay()
+                progress_callback(f"Found {len(features)} features. Generating test cases...")
+        
+        if max_workers is None:
+            max_workers = Config.MAX_CONCURRENT_FEATURES
+        
+        # Generate test cases for each feature, several at a time
+        if Config.BATCH_TEST_CASES:
+            batches = self.gemini_client.plan_test_case_batches(features, use_cache=use_cache, job=self.job)
+            logger.info(f"Packed {len(features)} features into {len(batches)} Gemini calls")
+            results = run_feature_batches(features, batches, partial(self._generate_batch_test_cases, use_cache=use_cache, result_callback=result_callback, job=self.job), max_workers, progress_callback)
+        elif Config.USE_ASYNC_GEMINI:
+            results = run_features_async(features, partial(self._generate_feature_test_cases_async, use_cache=use_cache, result_callback=result_callback, job=self.job), progress_callback)
+        else:
+            results = run_features(features, partial(self._generate_feature_test_cases, use_cache=use_cache, result_callback=result_callback, job=self.job), max_workers, progress_callback)
+        
+        # Collect in original feature order regardless of completion order
+        for test_cases in results:
+            if test_cases:
+                self.all_test_cases.extend(test_cases)
+        
+        # Drop test cases repeating another one in other words, also across features
+        if Config.DEDUP_TEST_CASES:
+            self.all_test_cases, self.near_duplicates_removed = remove_near_duplicates(self.all_test_cases, Config.DEDUP_SIMILARITY_THRESHOLD)
+        
+        message = f"Successfully generated {len(self.all_test_cases)} test cases"
+        if self.near_duplicates_removed:
+            message += f" ({self.near_duplicates_removed} near-duplicates removed)"
+        return True, message
+    
+    def _generate_feature_test_cases(self, idx, feature, use_cache=True, result_callback=None, job=None):
+        """Generate test cases for a single feature and tag them with the feature information"""
+        sink = self._make_result_sink(idx, feature, result_callback)
+        test_cases_data = self.gemini_client.generate_test_cases_for_feature(
+            feature, use_cache=use_cache, on_test_case=sink.on_test_case if sink else None, job=job
+        )
+        return self._finish_feature(idx, feature, test_cases_data, sink)
+    
+    async def _generate_feature_test_cases_async(self, idx, feature, use_cache=True, result_callback=None, job=None):
+        """Async variant of _generate_feature_test_cases for the shared event loop"""
+        sink = self._make_result_sink(idx, feature, result_callback)
+        test_cases_data = await self.gemini_client.generate_test_cases_for_feature_async(
+            feature, use_cache=use_cache, on_test_case=sink.on_test_case if sink else None, job=job
+        )
+        return self._finish_feature(idx, feature, test_cases_data, sink)
+    
+    def _generate_batch_test_cases(self, batch, use_cache=True, result_callback=None, job=None):
+        """Generate test cases for a batch of (idx, feature) pairs sharing one Gemini call"""
+        batch_data = self.gemini_client.generate_test_cases_for_batch(
+            [feature for _, feature in batch], use_cache=use_cache, job=job
+        )
+        return [
+            self._finish_feature(idx, feature, test_cases_data, self._make_result_sink(idx, feature, result_callback))
+            for (idx, feature), test_cases_data in zip(batch, batch_data)
+        ]
+    
+    def _make_result_sink(self, idx, feature, result_callback):
+        if not result_callback:
+            return None
+        return FeatureResultSink(result_callback, partial(self._tag_test_case, idx, feature))
+    
+    def _finish_feature(self, idx, feature, test_cases_data, sink):
+        test_cases = self._tag_feature_test_cases(idx, feature, test_cases_data)
+        if sink and test_cases:
+            sink.flush(test_cases)
+        return test_cases
+    
+    def _tag_test_case(self, idx, feature, test_case):
+        """Add the feature information to a generated test case"""
+        # Get feature name properly - this was working correctly
+        test_case['feature_name'] = get_feature_display_name(feature, idx)
+        test_case['feature_id'] = feature.get('feature_id', feature.get('id', f'F{idx:03d}'))
+        test_case['module'] = feature.get('module', test_case.get('module', 'Unknown'))
+        return test_case
+    
+    def _tag_feature_test_cases(self, idx, feature, test_cases_data):
+        """Add the feature information to each generated test case"""
+        feature_name = get_feature_display_name(feature, idx)
+        
+        if not test_cases_data or 'test_cases' not in test_cases_data:
+            logger.warning(f"Failed to generate test cases for {feature_name}")
+            return None
+        
+        for test_case in test_cases_data['test_cases']:
+            self._tag_test_case(idx, feature, test_case)
         
-        return True, f"Successfully generated {len(self.all_test_cases)} test cases"
+        logger.info(f"Generated {len(test_cases_data['test_cases'])} test cases for {feature_name}")
+        return test_cases_data['test_cases']
     
     def save_to_csv(self, filename=None):
         """Save all generated test cases to Excel file in few-shot format with proper formatting"""
@@ -235,6 +316,7 @@ class TestCaseGenerator:
         
         stats = {
             'total_test_cases': len(self.all_test_cases),
+            'near_duplicates_removed': self.near_duplicates_removed,
             'test_types': {},
             'priorities': {},
             'features': {},
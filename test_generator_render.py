@@ -2,8 +2,12 @@ import csv
 import json
 import os
 from datetime import datetime
+from functools import partial
 from config import Config
-from gemini_client import GeminiClient
+from gemini_client import get_gemini_client
+from job_context import JobContext
+from feature_runner import run_features, run_feature_batches, FeatureResultSink
+from near_duplicates import remove_near_duplicates
 import logging
 
 # Using pandas-free implementation for Render compatibility
@@ -13,17 +17,33 @@ logger = logging.getLogger(__name__)
 
 class TestCaseGenerator:
     def __init__(self):
-        self.gemini_client = GeminiClient()
+        self.gemini_client = get_gemini_client()
         self.all_test_cases = []
+        self.near_duplicates_removed = 0
+        self.job = None
         
-    def process_frd_document(self, frd_content, progress_callback=None):
-        """Process FRD document and generate test cases"""
+    def process_frd_document(self, frd_content, progress_callback=None, max_workers=None, use_cache=True, result_callback=None, model_mode=None, job_id=None, source_digest=None):
+        """Process FRD document and generate test cases
+        
+        frd_content is the document text or an iterable of its text pieces (e.g. pages
+        from DocumentProcessor.iter_document), consumed while they are being parsed.
+        result_callback, if given, receives every test case as soon as it is available.
+        model_mode ('auto', 'fast' or 'quality') overrides GEMINI_MODEL_MODE for this job.
+        job_id tags the telemetry records of the job's Gemini calls.
+        source_digest identifies the document behind streamed frd_content (e.g. a hash
+        of the uploaded file), so a cached extraction is found before it is parsed.
+        """
         
         logger.info("Extracting features from FRD document...")
         if progress_callback:
             progress_callback("Extracting features from FRD document...")
             
-        features_data = self.gemini_client.extract_features_from_frd(frd_content)
+        # One retry budget for every Gemini call of this document
+        self.job = JobContext(model_mode=model_mode, job_id=job_id)
+        if isinstance(frd_content, str):
+            features_data = self.gemini_client.extract_features_from_frd(frd_content, use_cache=use_cache, job=self.job)
+        else:
+            features_data = self.gemini_client.extract_features_from_stream(frd_content, use_cache=use_cache, job=self.job, source_digest=source_digest)
         
         if not features_data or 'features' not in features_data:
             logger.error("Failed to extract features from FRD")
@@ -33,26 +53,30 @@ class TestCaseGenerator:
         logger.info(f"Found {len(features)} features")
         
         if progress_callback:
-            progress_callback(f"Found {len(features)} features. Generating test cases...")
+            if use_cache:
+                unchanged = sum(1 for feature in features if self.gemini_client.has_cached_test_cases(feature, self.job))
+                progress_callback(f"Found {len(features)} features ({unchanged} unchanged since a previous run). Generating test cases...")
+            else:
+                progress_callback(f"Found {len(features)} features. Generating test cases...")
+        
+        if max_workers is None:
+            max_workers = Config.MAX_CONCURRENT_FEATURES
+        
+        # Generate test cases for each feature, several at a time
+        if Config.BATCH_TEST_CASES:
+            batches = self.gemini_client.plan_test_case_batches(features, use_cache=use_cache, job=self.job)
+            results = run_feature_batches(features, batches, partial(self._generate_batch_test_cases, use_cache=use_cache, result_callback=result_callback, job=self.job), max_workers, progress_callback)
+        else:
+            results = run_features(features, partial(self._generate_feature_test_cases, use_cache=use_cache, result_callback=result_callback, job=self.job), max_workers, progress_callback)
         
-        # Generate test cases for each feature
         all_test_cases = []
-        for i, feature in enumerate(features):
-            try:
-                if progress_callback:
-                    progress_callback(f"Generating test cases for feature {i+1}/{len(features)}: {feature.get('name', 'Unknown')}")
-                
-                test_cases = self.gemini_client.generate_test_cases(feature)
-                
-                if test_cases and 'test_cases' in test_cases:
-                    for test_case in test_cases['test_cases']:
-                        test_case['feature_name'] = feature.get('name', 'Unknown')
-                        test_case['feature_id'] = feature.get('id', f'feature_{i+1}')
-                        all_test_cases.append(test_case)
-                        
-            except Exception as e:
-                logger.error(f"Error generating test cases for feature {feature.get('name', 'Unknown')}: {e}")
-                continue
+        for test_cases in results:
+            if test_cases:
+                all_test_cases.extend(test_cases)
+        
+        # Drop test cases repeating another one in other words, also across features
+        if Config.DEDUP_TEST_CASES:
+            all_test_cases, self.near_duplicates_removed = remove_near_duplicates(all_test_cases, Config.DEDUP_SIMILARITY_THRESHOLD)
         
         self.all_test_cases = all_test_cases
         logger.info(f"Generated {len(all_test_cases)} total test cases")
@@ -60,7 +84,50 @@ class TestCaseGenerator:
         if progress_callback:
             progress_callback(f"Generated {len(all_test_cases)} test cases successfully!")
         
-        return True, f"Successfully generated {len(all_test_cases)} test cases"
+        message = f"Successfully generated {len(all_test_cases)} test cases"
+        if self.near_duplicates_removed:
+            message += f" ({self.near_duplicates_removed} near-duplicates removed)"
+        return True, message
+    
+    def _generate_feature_test_cases(self, idx, feature, use_cache=True, result_callback=None, job=None):
+        """Generate test cases for a single feature"""
+        sink = self._make_result_sink(idx, feature, result_callback)
+        test_cases = self.gemini_client.generate_test_cases_for_feature(
+            feature, use_cache=use_cache, on_test_case=sink.on_test_case if sink else None, job=job
+        )
+        return self._finish_feature(idx, feature, test_cases, sink)
+    
+    def _generate_batch_test_cases(self, batch, use_cache=True, result_callback=None, job=None):
+        """Generate test cases for a batch of (idx, feature) pairs sharing one Gemini call"""
+        batch_data = self.gemini_client.generate_test_cases_for_batch(
+            [feature for _, feature in batch], use_cache=use_cache, job=job
+        )
+        return [
+            self._finish_feature(idx, feature, test_cases, self._make_result_sink(idx, feature, result_callback))
+            for (idx, feature), test_cases in zip(batch, batch_data)
+        ]
+    
+    def _make_result_sink(self, idx, feature, result_callback):
+        if not result_callback:
+            return None
+        return FeatureResultSink(result_callback, partial(self._tag_test_case, idx, feature))
+    
+    def _finish_feature(self, idx, feature, test_cases, sink):
+        if not test_cases or 'test_cases' not in test_cases:
+            return None
+        
+        for test_case in test_cases['test_cases']:
+            self._tag_test_case(idx, feature, test_case)
+        
+        if sink:
+            sink.flush(test_cases['test_cases'])
+        
+        return test_cases['test_cases']
+    
+    def _tag_test_case(self, idx, feature, test_case):
+        test_case['feature_name'] = feature.get('name', 'Unknown')
+        test_case['feature_id'] = feature.get('id', f'feature_{idx}')
+        return test_case
     
     def get_statistics(self):
         """Get statistics about generated test cases"""
@@ -69,6 +136,7 @@ class TestCaseGenerator:
         
         stats = {
             'total_test_cases': len(self.all_test_cases),
+            'near_duplicates_removed': self.near_duplicates_removed,
             'positive_test_cases': 0,
             'negative_test_cases': 0,
             'boundary_test_cases': 0,
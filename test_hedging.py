@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Test hedged Gemini requests: hedge delay, rate cap and first-answer-wins
+"""
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+sys.path.append('.')
+
+import pytest
+
+from config import Config
+from fake_gemini import FakeGeminiBackend
+from gemini_client import GeminiClient
+from hedging import HedgePolicy
+from model_router import ModelRouter
+
+def test_hedge_delay_follows_model_latency():
+    """No hedging before enough samples; afterwards the percentile, floored at min_delay"""
+    router = ModelRouter('pro')
+    policy = HedgePolicy(router, enabled=True, percentile=0.9, min_samples=10, min_delay=0.5)
+    assert policy.hedge_delay('pro') is None
+
+    for latency in range(1, 11):
+        router.record('pro', float(latency))
+    assert policy.hedge_delay('pro') == 10.0
+    assert HedgePolicy(router, enabled=False).hedge_delay('pro') is None
+    print("✅ Hedge delay taken from the model's latency percentile")
+
+def test_hedge_rate_is_capped():
+    """At most max_hedge_rate of all calls are hedged"""
+    router = ModelRouter('pro')
+    router.record('pro', 1.0)
+    policy = HedgePolicy(router, enabled=True, min_samples=1, max_hedge_rate=0.1)
+    for _ in range(30):
+        policy.hedge_delay('pro')
+
+    granted = sum(policy.try_hedge() for _ in range(10))
+    assert granted == 3
+    assert policy.get_stats()['denied'] == 7
+    print("✅ Hedges capped at 10% of calls")
+
+class SlowFirstCallBackend(FakeGeminiBackend):
+    """Fake whose first call hangs for a while and all later calls answer at once"""
+
+    def answer(self, model, contents, generation_config):
+        answer, ttft, duration = super().answer(model, contents, generation_config)
+        return answer, ttft, (3.0 if self.calls == 1 else 0.0)
+
+def _hedging_client(monkeypatch):
+    monkeypatch.setattr(Config, 'RESPONSE_CACHE_ENABLED', False)
+    client = GeminiClient(backend=SlowFirstCallBackend(time_scale=0))
+    client.hedge_policy = HedgePolicy(client.model_router, enabled=True, min_samples=1, min_delay=0.1, max_hedge_rate=1.0)
+    client.model_router.record(Config.GEMINI_MODEL, 0.1)
+    return client
+
+def test_hedged_call_returns_first_answer(monkeypatch):
+    """A stuck call is duplicated and the duplicate's answer is returned without waiting for the first"""
+    client = _hedging_client(monkeypatch)
+
+    start = time.monotonic()
+    response = client._generate_content('FRD Content:\nThe app shall start quickly.', client.prompt_engine.extraction_instruction)
+
+    assert time.monotonic() - start < 2.0
+    assert '"features"' in response.text
+    assert client.hedge_policy.get_stats()['hedge_wins'] == 1
+    print("✅ Hedged call answered by the duplicate")
+
+def test_hedged_async_call_cancels_loser(monkeypatch):
+    """The async path cancels the slower call once the duplicate has answered"""
+    client = _hedging_client(monkeypatch)
+
+    start = time.monotonic()
+    response = client.run_async(client._generate_content_async(
+        'FRD Content:\nThe app shall start quickly.', client.prompt_engine.extraction_instruction
+    ))
+
+    assert time.monotonic() - start < 2.0
+    assert '"features"' in response.text
+    assert client.hedge_policy.get_stats()['hedges'] == 1
+    print("✅ Async hedge won and the slow call was cancelled")
+
+def test_time_queued_for_a_worker_does_not_trigger_a_hedge(monkeypatch):
+    """The hedge delay counts from when the call starts, not from when it was queued"""
+    client = _hedging_client(monkeypatch)
+    client.backend.calls = 1
+    client._hedge_executor = ThreadPoolExecutor(max_workers=1)
+    client._hedge_executor.submit(time.sleep, 0.5)
+
+    response = client._generate_content('FRD Content:\nThe app shall start quickly.', client.prompt_engine.extraction_instruction)
+
+    assert '"features"' in response.text
+    assert client.hedge_policy.get_stats()['hedges'] == 0
+    print("✅ Queue time not taken for a slow call")
+
+if __name__ == '__main__':
+    sys.exit(pytest.main([__file__, '-q']))
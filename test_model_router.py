@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Test model routing by task size, escalation to the larger model and per-model stats
+"""
+import json
+import sys
+sys.path.append('.')
+
+import pytest
+
+from config import Config
+from fake_gemini import FakeGeminiBackend
+from gemini_client import GeminiClient
+from job_context import JobContext
+from model_router import ModelRouter, feature_complexity
+
+SMALL_FEATURE = {'feature_id': 'F001', 'feature_name': 'Logout', 'requirements': ['Ends the session']}
+BIG_FEATURE = {'feature_id': 'F002', 'feature_name': 'Checkout', 'requirements': [f'Rule {i}' for i in range(8)]}
+
+def test_routes_by_task_size_and_mode():
+    """Small test case calls go to the fast model; extraction, big prompts and complex features do not"""
+    router = ModelRouter('pro', 'flash', 'auto', fast_max_input_tokens=1000, fast_max_complexity=4)
+
+    assert feature_complexity(BIG_FEATURE) == 8
+    assert router.route('test_cases', 500, SMALL_FEATURE) == 'flash'
+    assert router.route('test_cases', 5000, SMALL_FEATURE) == 'pro'
+    assert router.route('test_cases', 500, BIG_FEATURE) == 'pro'
+    assert router.route('extraction', 500) == 'pro'
+    assert router.route('test_cases', 500, SMALL_FEATURE, mode='quality') == 'pro'
+    assert router.route('extraction', 50000, mode='fast') == 'flash'
+    assert ModelRouter('pro', None, 'auto').route('test_cases', 10, SMALL_FEATURE) == 'pro'
+    print("✅ Calls routed by task type, size, complexity and mode")
+
+def test_escalates_only_invalid_fast_answers():
+    """Bad answers of the fast model move to the default model; transient errors stay put"""
+    router = ModelRouter('pro', 'flash', 'auto')
+    assert router.escalate('flash', json.JSONDecodeError('Expecting value', '', 0)) == 'pro'
+    assert router.escalate('flash', ConnectionResetError()) == 'flash'
+    assert router.escalate('pro', json.JSONDecodeError('Expecting value', '', 0)) == 'pro'
+    assert router.get_stats()['flash']['escalations'] == 1
+    print("✅ Escalation only after invalid fast-model answers")
+
+class BrokenFastModelBackend(FakeGeminiBackend):
+    """Fake whose fast model always answers with prose instead of JSON"""
+
+    def answer(self, model, contents, generation_config):
+        answer, ttft, duration = super().answer(model, contents, generation_config)
+        if model.model_name == Config.GEMINI_FAST_MODEL:
+            answer['text'] = 'Sorry, I cannot help with that.'
+        return answer, ttft, duration
+
+def test_client_escalates_and_records_per_model(monkeypatch):
+    """An auto-mode job retries the fast model's unusable answer on the default model"""
+    monkeypatch.setattr(Config, 'RESPONSE_CACHE_ENABLED', False)
+    client = GeminiClient(backend=BrokenFastModelBackend(time_scale=0))
+
+    result = client.generate_test_cases_for_feature(SMALL_FEATURE, job=JobContext(model_mode='auto'))
+
+    stats = client.model_router.get_stats()
+    assert result['test_cases'] and not result.get('partial')
+    assert stats[Config.GEMINI_FAST_MODEL]['escalations'] == 1
+    assert stats[Config.GEMINI_MODEL]['calls'] == 1 and stats[Config.GEMINI_MODEL]['output_tokens'] > 0
+    assert stats[Config.GEMINI_MODEL]['p95_latency'] is not None
+    print(f"✅ Escalated to {Config.GEMINI_MODEL}: {stats}")
+
+def test_cache_serves_answers_only_of_the_routed_or_default_model(monkeypatch, tmp_path):
+    """A fast-model answer is not reused by a quality job, a default-model answer is reused by any job"""
+    monkeypatch.setattr(Config, 'CACHE_FOLDER', str(tmp_path))
+    backend = FakeGeminiBackend(time_scale=0)
+    client = GeminiClient(backend=backend)
+
+    client.generate_test_cases_for_feature(SMALL_FEATURE, job=JobContext(model_mode='fast'))
+    assert client.has_cached_test_cases(SMALL_FEATURE, JobContext(model_mode='fast'))
+    assert not client.has_cached_test_cases(SMALL_FEATURE, JobContext(model_mode='quality'))
+
+    client.generate_test_cases_for_feature(SMALL_FEATURE, job=JobContext(model_mode='quality'))
+    assert backend.calls == 2
+    client.generate_test_cases_for_feature(BIG_FEATURE, job=JobContext(model_mode='quality'))
+    client.generate_test_cases_for_feature(BIG_FEATURE, job=JobContext(model_mode='fast'))
+    assert backend.calls == 3
+    print("✅ Cached test cases keyed by the model that answered them")
+
+if __name__ == '__main__':
+    sys.exit(pytest.main([__file__, '-q']))
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Test near-duplicate test case removal
+"""
+import copy
+import random
+import sys
+import time
+sys.path.append('.')
+
+import pytest
+
+from fake_gemini import fake_test_cases
+from near_duplicates import remove_near_duplicates, comparison_text, _exact_duplicates
+
+def _test_case(name, steps, expected):
+    return {
+        'test_case_name': name,
+        'test_steps_formatted': f"The following test scenario verifies the feature:\n{steps}",
+        'expected_result': expected
+    }
+
+def _fake_cases(features, per_feature=20):
+    test_cases = []
+    for index in range(features):
+        contents = f"- Feature ID: F{index:03d}\n- Feature Name: Feature {index} handles order {index * 7919}\nGenerate {per_feature} test cases"
+        test_cases.extend(fake_test_cases(contents, random.Random(index)))
+    return test_cases
+
+def _realistic_cases(count, seed=1):
+    """Test cases of about 80 words: a name, five steps and an expected result over a 5,000-word vocabulary"""
+    rng = random.Random(seed)
+    words = [''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(rng.randint(3, 10))) for _ in range(5000)]
+
+    def phrase(length):
+        return ' '.join(rng.choice(words) for _ in range(length))
+
+    return [
+        _test_case(f"Verify {phrase(6)}", '\n'.join(f"{step}. {phrase(10)}" for step in range(1, 6)), phrase(20))
+        for _ in range(count)
+    ]
+
+LOGIN = _test_case(
+    'Verify login with valid credentials',
+    '1. Open the login page\n2. Enter a registered username and the matching password\n3. Click the Sign in button\n4. Wait for the dashboard to load',
+    'The user is signed in and the dashboard shows the account name and the latest notifications'
+)
+
+def test_preamble_is_not_part_of_the_text():
+    assert 'following test scenario' not in comparison_text(LOGIN)
+    assert 'Open the login page' in comparison_text(LOGIN)
+    print("✅ Shared steps preamble ignored")
+
+def test_reworded_copy_is_removed_and_order_kept():
+    """A copy differing in one word and punctuation goes, a different test stays"""
+    reworded = copy.deepcopy(LOGIN)
+    reworded['expected_result'] = 'The user is signed in, and the dashboard shows the account name and the latest notifications!'
+    lockout = _test_case(
+        'Verify account lockout after failed logins',
+        '1. Open the login page\n2. Enter a wrong password five times\n3. Try the correct password',
+        'The account is locked for 15 minutes and an unlock email is sent'
+    )
+
+    kept, removed = remove_near_duplicates([LOGIN, lockout, reworded], threshold=0.8)
+    assert removed == 1
+    assert kept == [LOGIN, lockout]
+    print("✅ Reworded copy removed, distinct test kept")
+
+def test_copies_across_features_are_removed():
+    """Every injected copy of a fake test case is found among thousands of others"""
+    test_cases = _fake_cases(100)
+    copies = []
+    for test_case in test_cases[::40]:
+        duplicate = copy.deepcopy(test_case)
+        duplicate['expected_result'] += ' without errors'
+        copies.append(duplicate)
+
+    kept, removed = remove_near_duplicates(test_cases + copies, threshold=0.8)
+    assert removed >= len(copies)
+    assert not any(duplicate in kept for duplicate in copies)
+    assert kept[0] is test_cases[0]
+    print(f"✅ {removed} near-duplicates removed from {len(test_cases) + len(copies)} test cases")
+
+def test_threshold_one_removes_identical_only():
+    reworded = copy.deepcopy(LOGIN)
+    reworded['test_case_name'] = 'Verify login with correct credentials'
+    kept, removed = remove_near_duplicates([LOGIN, reworded, dict(LOGIN)], threshold=1.0)
+    assert removed == 1 and kept == [LOGIN, reworded]
+    print("✅ Threshold 1.0 removes identical test cases only")
+
+def test_no_words_to_compare():
+    assert remove_near_duplicates([]) == ([], 0)
+    assert remove_near_duplicates([{'test_case_name': ''}, {}]) == ([{'test_case_name': ''}, {}], 0)
+    print("✅ Empty input and test cases without text handled")
+
+def test_exact_fallback_ignores_case_and_punctuation():
+    assert _exact_duplicates(['Login works.', 'login works', 'Logout works']) == [1]
+    print("✅ Fallback removes normalized identical texts")
+
+def test_twenty_thousand_cases_are_fast():
+    test_cases = _fake_cases(1000)
+    start = time.perf_counter()
+    remove_near_duplicates(test_cases)
+    elapsed = time.perf_counter() - start
+    assert elapsed < 1.0
+    print(f"✅ Deduplicated {len(test_cases)} test cases in {elapsed:.2f}s")
+
+def test_twenty_thousand_realistic_cases_are_fast():
+    """Realistic test cases are several times longer than the fake ones"""
+    test_cases = _realistic_cases(20000)
+    copies = [copy.deepcopy(test_case) for test_case in test_cases[::500]]
+    start = time.perf_counter()
+    kept, removed = remove_near_duplicates(test_cases + copies)
+    elapsed = time.perf_counter() - start
+    # About 0.8s; numbering 1.6 million words in Python is most of it, so allow for a busy machine
+    assert elapsed < 1.5
+    assert removed == len(copies) and kept == test_cases
+    print(f"✅ Deduplicated {len(test_cases) + len(copies)} realistic test cases in {elapsed:.2f}s")
+
+if __name__ == '__main__':
+    sys.exit(pytest.main([__file__, '-q']))
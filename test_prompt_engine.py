@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Test the precompiled prompt engine against a local stand-in for the Gemini cache API
+"""
+import sys
+sys.path.append('.')
+
+from prompt_engine import PromptEngine, StaticContextModels
+
+EXAMPLES = [{'Input': f'FRD line {i}', 'Output': f'Test case {i}'} for i in range(1, 8)]
+KEY_VALUES = [{'Feature Name': 'Rib', 'Scenario_Name': f'Scenario {i}',
+               'Scenario_Description': 'Desc', 'Testing_Steps': 'Steps'} for i in range(1, 15)]
+FEATURE = {'feature_id': 'F007', 'feature_name': 'Partial Result', 'description': 'Show partial results',
+           'requirements': ['r1'], 'acceptance_criteria': ['a1'], 'module': 'Rib', 'frd_line': 'Line 7'}
+
+class FakeCachedContent:
+    created = []
+
+    def __init__(self, model, system_instruction, ttl):
+        self.name = f'cachedContents/{len(FakeCachedContent.created)}'
+        self.model = model
+        self.system_instruction = system_instruction
+        self.ttl = ttl
+
+    @classmethod
+    def create(cls, model, system_instruction=None, ttl=None):
+        cached = cls(model, system_instruction, ttl)
+        cls.created.append(cached)
+        return cached
+
+class FakeModel:
+    def __init__(self, model_name, system_instruction=None, cached_content=None):
+        self.model_name = model_name
+        self.system_instruction = system_instruction
+        self.cached_content = cached_content
+        self.sent = []
+
+    @classmethod
+    def from_cached_content(cls, cached_content):
+        return cls(cached_content.model, cached_content=cached_content)
+
+    def generate_content(self, contents):
+        self.sent.append(contents)
+
+class FakeCaching:
+    CachedContent = FakeCachedContent
+
+class FakeGenai:
+    """Local stand-in for google.generativeai with the context caching API"""
+    caching = FakeCaching
+    GenerativeModel = FakeModel
+
+class FailingCachedContent(FakeCachedContent):
+    @classmethod
+    def create(cls, model, system_instruction=None, ttl=None):
+        raise ValueError("Cached content is too small")
+
+class FakeGenaiCacheTooSmall(FakeGenai):
+    class caching:
+        CachedContent = FailingCachedContent
+
+class LegacyModel:
+    def __init__(self, model_name):
+        self.model_name = model_name
+
+class LegacyGenai:
+    GenerativeModel = LegacyModel
+
+def test_static_sections_compiled_once():
+    """Examples and key-value pairs live only in the static instruction"""
+    engine = PromptEngine(EXAMPLES, KEY_VALUES)
+
+    assert 'Example 5:' in engine.test_case_instruction
+    assert 'Example 6:' not in engine.test_case_instruction
+    assert 'Scenario 10' in engine.test_case_instruction
+    assert 'Scenario 11' not in engine.test_case_instruction
+    assert 'Example 3:' in engine.extraction_instruction
+    assert 'Example 4:' not in engine.extraction_instruction
+
+    request = engine.build_test_case_request(FEATURE)
+    assert 'F007' in request and 'Partial Result' in request
+    assert 'FRD line' not in request and 'Scenario' not in request
+    assert len(request) < len(engine.test_case_instruction) / 5
+    print(f"✅ Per-feature section is {len(request)} chars vs {len(engine.test_case_instruction)} static chars")
+
+def test_extraction_request_truncates_document():
+    """Only the configured number of FRD characters is sent"""
+    engine = PromptEngine(EXAMPLES, KEY_VALUES, max_frd_chars=100)
+    request = engine.build_extraction_request('x' * 500)
+    assert request.count('x') == 100
+    print("✅ Extraction request bounded by max_frd_chars")
+
+def test_cached_content_used_when_enabled():
+    """The preamble is uploaded once as cached content and reused for every feature"""
+    FakeCachedContent.created = []
+    engine = PromptEngine(EXAMPLES, KEY_VALUES)
+    models = StaticContextModels(FakeGenai, use_context_cache=True, ttl_seconds=600)
+
+    for _ in range(5):
+        model, prefix, mode = models.get('models/gemini-1.5-pro-002', engine.test_case_instruction)
+        model.generate_content(prefix + engine.build_test_case_request(FEATURE))
+
+    assert mode == 'cached_content'
+    assert prefix == ''
+    assert len(FakeCachedContent.created) == 1
+    assert FakeCachedContent.created[0].system_instruction == engine.test_case_instruction
+    assert all('Few-shot' not in sent for sent in model.sent)
+    print("✅ Static preamble cached once and not resent per feature")
+
+def test_cached_content_refreshed_after_ttl():
+    """An expired cache handle is recreated"""
+    FakeCachedContent.created = []
+    models = StaticContextModels(FakeGenai, use_context_cache=True, ttl_seconds=0)
+
+    models.get('models/gemini-1.5-pro-002', 'instruction')
+    models.get('models/gemini-1.5-pro-002', 'instruction')
+
+    assert len(FakeCachedContent.created) == 2
+    print("✅ Expired cached content is refreshed")
+
+def test_fallback_to_system_instruction():
+    """When the cache API rejects the preamble, a system instruction is used"""
+    models = StaticContextModels(FakeGenaiCacheTooSmall, use_context_cache=True)
+    model, prefix, mode = models.get('gemini-1.5-pro', 'instruction')
+
+    assert mode == 'system_instruction'
+    assert model.system_instruction == 'instruction'
+    assert prefix == ''
+    print("✅ Falls back to system instruction")
+
+def test_inline_prefix_for_old_sdk():
+    """SDKs without system instructions get the compiled preamble as an inline prefix"""
+    models = StaticContextModels(LegacyGenai, use_context_cache=True)
+    model, prefix, mode = models.get('gemini-1.5-pro', 'instruction')
+
+    assert mode == 'inline'
+    assert prefix.startswith('instruction')
+    print("✅ Inline prefix for SDKs without system instructions")
+
+if __name__ == '__main__':
+    print("🧪 TESTING PROMPT ENGINE")
+    print("=" * 50)
+    test_static_sections_compiled_once()
+    test_extraction_request_truncates_document()
+    test_cached_content_used_when_enabled()
+    test_cached_content_refreshed_after_ttl()
+    test_fallback_to_system_instruction()
+    test_inline_prefix_for_old_sdk()
+    print("=" * 50)
+    print("🎉 Prompt engine tests passed!")
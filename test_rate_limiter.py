@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Test the process-wide adaptive Gemini rate limiter
+"""
+import sys
+import time
+sys.path.append('.')
+
+from google.api_core import exceptions as google_exceptions
+
+from rate_limiter import TokenBucket, AdaptiveRateLimiter, is_rate_limit_error
+
+def test_bucket_allows_burst_then_waits():
+    """A full bucket serves its capacity immediately, then asks callers to wait"""
+    bucket = TokenBucket(rate_per_minute=60)
+    now = 100.0
+    bucket.updated_at = now
+
+    waits = [bucket.reserve(1, now) for _ in range(60)]
+    assert all(wait == 0 for wait in waits)
+
+    # The 61st request needs one more token at one token per second
+    assert abs(bucket.reserve(1, now) - 1.0) < 1e-9
+    print("✅ Bucket serves burst then paces at configured rate")
+
+def test_under_quota_calls_do_not_wait():
+    """Calls well under quota are never delayed"""
+    limiter = AdaptiveRateLimiter(requests_per_minute=600, tokens_per_minute=1000000)
+    for _ in range(20):
+        assert limiter.acquire(1000) == 0
+    print("✅ No delay while under quota")
+
+def test_tokens_per_minute_limit():
+    """Large prompts are paced by the token bucket"""
+    limiter = AdaptiveRateLimiter(requests_per_minute=600, tokens_per_minute=6000)
+    assert limiter.reserve(6000) == 0
+    wait = limiter.reserve(3000)
+    assert 29 < wait <= 30
+    print(f"✅ Token budget enforced (wait {wait:.1f}s)")
+
+def test_throttle_shrinks_then_recovers():
+    """A 429 halves the rate and successes after the cooldown restore it"""
+    limiter = AdaptiveRateLimiter(requests_per_minute=100, tokens_per_minute=100000,
+                                  recovery_step=0.25, cooldown_seconds=0)
+    limiter.record_throttle()
+    assert limiter.scale == 0.5
+    assert limiter.get_stats()['requests_per_minute'] == 50
+
+    limiter.record_success()
+    limiter.record_success()
+    assert limiter.scale == 1.0
+    assert limiter.get_stats()['requests_per_minute'] == 100
+    print("✅ Rate shrinks on 429 and recovers afterwards")
+
+def test_throttle_shrinks_burst_too():
+    """After a 429 the bucket refills to the reduced rate's minute, not the configured quota's"""
+    limiter = AdaptiveRateLimiter(requests_per_minute=100, tokens_per_minute=100000, cooldown_seconds=60)
+    limiter.record_throttle()
+    limiter._requests.refill(time.monotonic() + 3600)
+    assert limiter._requests.capacity == 50 and limiter._requests.tokens == 50
+
+    bucket = TokenBucket(rate_per_minute=60)
+    bucket.set_rate(15, bucket.updated_at)
+    assert bucket.capacity == 15 and bucket.tokens == 15
+    print("✅ Burst capacity shrinks with the rate")
+
+def test_throttles_within_cooldown_count_once():
+    """A burst of 429s from concurrent calls only shrinks the rate once"""
+    limiter = AdaptiveRateLimiter(requests_per_minute=100, tokens_per_minute=100000, cooldown_seconds=60)
+    for _ in range(5):
+        limiter.record_throttle()
+    assert limiter.scale == 0.5
+    assert limiter.throttle_count == 5
+    print("✅ Concurrent 429s shrink the rate once per cooldown")
+
+def test_rate_limit_error_detection():
+    """429 / ResourceExhausted errors are recognised"""
+    class ResourceExhausted(Exception):
+        pass
+
+    assert is_rate_limit_error(ResourceExhausted("quota"))
+    assert is_rate_limit_error(Exception("429 Too Many Requests"))
+    assert is_rate_limit_error(google_exceptions.TooManyRequests("Too many requests"))
+    assert is_rate_limit_error(google_exceptions.ResourceExhausted("Resource has been exhausted"))
+    assert not is_rate_limit_error(ValueError("bad JSON"))
+    # The status code decides over the message
+    assert not is_rate_limit_error(google_exceptions.InternalServerError("quota service unavailable"))
+    assert not is_rate_limit_error(google_exceptions.InvalidArgument("Request 4290 is invalid"))
+    assert not is_rate_limit_error(ValueError("Unknown quota project"))
+    print("✅ Rate limit errors detected")
+
+if __name__ == '__main__':
+    print("🧪 TESTING ADAPTIVE RATE LIMITER")
+    print("=" * 50)
+    test_bucket_allows_burst_then_waits()
+    test_under_quota_calls_do_not_wait()
+    test_tokens_per_minute_limit()
+    test_throttle_shrinks_then_recovers()
+    test_throttle_shrinks_burst_too()
+    test_throttles_within_cooldown_count_once()
+    test_rate_limit_error_detection()
+    print("=" * 50)
+    print("🎉 Rate limiter tests passed!")
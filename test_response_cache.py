@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Test the content-addressed response cache used for feature extraction
+"""
+import os
+import sys
+import time
+import tempfile
+sys.path.append('.')
+
+from response_cache import ResponseCache, make_cache_key, normalize_text
+
+def test_key_ignores_cosmetic_whitespace():
+    """Re-uploads that only differ in whitespace map to the same key"""
+    first = make_cache_key('features', '1', 'gemini-1.5-pro', normalize_text("Login  page\r\n shall   validate"))
+    second = make_cache_key('features', '1', 'gemini-1.5-pro', normalize_text(" Login page\nshall validate "))
+    changed_model = make_cache_key('features', '1', 'gemini-1.5-flash', normalize_text("Login page shall validate"))
+
+    assert first == second
+    assert first != changed_model
+    print("✅ Cache key is stable across whitespace and varies with the model")
+
+def test_round_trip():
+    """Stored values come back and misses return None"""
+    with tempfile.TemporaryDirectory() as folder:
+        cache = ResponseCache(folder, max_bytes=1024 * 1024)
+        value = {'features': [{'feature_id': 'F001', 'feature_name': 'Login'}]}
+
+        assert cache.get('missing') is None
+        assert not cache.contains('abc')
+        cache.set('abc', value)
+        assert cache.contains('abc')
+        assert cache.get('abc') == value
+        assert cache.get_stats() == {'hits': 1, 'misses': 1}
+    print("✅ Cache round trip works")
+
+def test_lru_eviction():
+    """Least recently used entries are evicted once the size limit is exceeded"""
+    with tempfile.TemporaryDirectory() as folder:
+        payload = {'features': ['x' * 400]}
+        cache = ResponseCache(folder, max_bytes=1500)
+
+        cache.set('first', payload)
+        cache.set('second', payload)
+        # Age both entries, then touch 'first' so 'second' becomes the oldest
+        for name in ('first', 'second'):
+            path = os.path.join(folder, f'{name}.json')
+            os.utime(path, (time.time() - 100, time.time() - 100))
+        assert cache.get('first') is not None
+
+        cache.set('third', payload)
+        cache.set('fourth', payload)
+
+        assert cache.get('second') is None
+        assert cache.get('first') is not None
+        assert cache.get('fourth') is not None
+    print("✅ LRU eviction keeps recently used entries")
+
+if __name__ == '__main__':
+    print("🧪 TESTING RESPONSE CACHE")
+    print("=" * 50)
+    test_key_ignores_cosmetic_whitespace()
+    test_round_trip()
+    test_lru_eviction()
+    print("=" * 50)
+    print("🎉 Response cache tests passed!")
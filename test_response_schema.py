@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Test the Gemini response schemas and their compiled validators
+"""
+import copy
+import sys
+sys.path.append('.')
+
+import pytest
+
+from config import Config
+from fake_gemini import FakeGeminiBackend
+from gemini_client import GeminiClient
+from response_schema import FEATURE_SCHEMA, TEST_CASE_SCHEMA, SchemaError, validate_response, validate_item
+from retry_policy import classify_error, INVALID_RESPONSE
+
+def test_records_are_normalized():
+    """Missing fields are defaulted, near-miss types coerced and enum spellings fixed"""
+    data = validate_response({'test_cases': [{
+        'test_case_id': 7,
+        'test_case_name': 'Lockout after five attempts',
+        'priority': 'high',
+        'test_steps_formatted': ['1. Enter a wrong password five times', '2. Try again'],
+        'extra': 'kept'
+    }], 'partial': True}, 'test_cases')
+
+    test_case = data['test_cases'][0]
+    assert test_case['test_case_id'] == '7'
+    assert test_case['priority'] == 'High'
+    assert test_case['test_steps_formatted'] == '1. Enter a wrong password five times\n2. Try again'
+    assert test_case['expected_result'] == '' and test_case['extra'] == 'kept'
+    assert data['partial'] is True
+
+    feature = validate_item({'feature_id': 'F001', 'requirements': 'Lock the account'}, 'features')
+    assert feature['requirements'] == ['Lock the account'] and feature['acceptance_criteria'] == []
+    print("✅ Records normalized to the schema")
+
+def test_malformed_shapes_rejected():
+    """Items of the wrong shape are dropped; a missing array fails the response as invalid"""
+    data = validate_response({'features': [{'feature_id': 'F001'}, 'not a feature', {'feature_id': {'id': 2}}]}, 'features')
+    assert [feature['feature_id'] for feature in data['features']] == ['F001']
+
+    with pytest.raises(SchemaError) as error:
+        validate_response({'result': []}, 'features')
+    assert classify_error(error.value) == INVALID_RESPONSE
+    print("✅ Malformed shapes rejected")
+
+def test_schemas_accepted_by_sdk():
+    """The SDK turns the schemas into its Schema proto without changing them"""
+    from google.generativeai.types.generation_types import to_generation_config_dict
+    for schema in (FEATURE_SCHEMA, TEST_CASE_SCHEMA):
+        before = copy.deepcopy(schema)
+        converted = to_generation_config_dict({'response_mime_type': 'application/json', 'response_schema': schema})
+        assert 'properties' in type(converted['response_schema']).to_dict(converted['response_schema'])
+        assert schema == before
+    print("✅ Schemas accepted by the SDK")
+
+def test_structured_output_avoids_reparsing(monkeypatch):
+    """Calls request JSON of their schema, so defects that cost a retry in free-text mode do not occur"""
+    monkeypatch.setattr(Config, 'RESPONSE_CACHE_ENABLED', False)
+    backend = FakeGeminiBackend(time_scale=0, malformed_rate=1.0)
+    client = GeminiClient(backend=backend)
+
+    plan = client.plan_extraction_call('The app shall start.')
+    assert client._generation_config(plan)['response_schema'] is FEATURE_SCHEMA
+    features = client.extract_features_from_frd('The app shall start quickly.')['features']
+    test_cases = client.generate_test_cases_for_feature(features[0])['test_cases']
+
+    assert test_cases and all(test_case['category'] for test_case in test_cases)
+    assert backend.get_stats() == {'calls': 2, 'rate_limit': 0, 'timeout': 0, 'malformed': 0}
+    print("✅ Structured output parsed on the first try")
+
+if __name__ == '__main__':
+    sys.exit(pytest.main([__file__, '-q']))
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Test the Gemini retry policies, the per-job retry budget and remainder re-asks
+"""
+import json
+import sys
+sys.path.append('.')
+
+from retry_policy import (
+    RetryBudget, RetryPolicy, RetryState, IncompleteResponseError, classify_error,
+    RATE_LIMIT, TIMEOUT, SERVER_ERROR, INVALID_RESPONSE, INCOMPLETE_RESPONSE, FATAL
+)
+from prompt_engine import PromptEngine
+
+class FakeApiError(Exception):
+    def __init__(self, message, code):
+        super().__init__(message)
+        self.code = code
+
+class DeadlineExceeded(Exception):
+    pass
+
+def test_errors_are_classified():
+    """Each failure maps to the policy that fits it"""
+    assert classify_error(FakeApiError('429 Resource has been exhausted', 429)) == RATE_LIMIT
+    assert classify_error(DeadlineExceeded('deadline')) == TIMEOUT
+    assert classify_error(FakeApiError('503 Service Unavailable', 503)) == SERVER_ERROR
+    assert classify_error(ConnectionResetError()) == SERVER_ERROR
+    assert classify_error(json.JSONDecodeError('Expecting value', '', 0)) == INVALID_RESPONSE
+    assert classify_error(IncompleteResponseError('cut off')) == INCOMPLETE_RESPONSE
+    assert classify_error(FakeApiError('400 API key not valid', 400)) == FATAL
+    print("✅ Errors are classified per retry policy")
+
+def test_backoff_is_jittered_and_capped():
+    """Delays stay within an exponentially growing window capped at max_delay"""
+    policy = RetryPolicy(max_attempts=10, base_delay=1.0, max_delay=8.0)
+    for retry_number, window in ((1, 1.0), (2, 2.0), (3, 4.0), (6, 8.0)):
+        delays = [policy.delay(retry_number) for _ in range(200)]
+        assert all(0 <= delay <= window for delay in delays)
+        assert max(delays) > window / 2
+    print("✅ Backoff is jittered and capped")
+
+def test_attempts_and_budget_limit_retries():
+    """Retries stop at the policy's attempt limit or when the job budget is spent"""
+    budget = RetryBudget(max_retries=3)
+    policies = {SERVER_ERROR: RetryPolicy(max_attempts=3, base_delay=0.0), FATAL: RetryPolicy(max_attempts=1)}
+    state = RetryState(budget, 'feature A', policies)
+    error = FakeApiError('500 Internal', 500)
+
+    assert state.next_delay(error) is not None
+    assert state.next_delay(error) is not None
+    assert state.next_delay(error) is None
+    assert RetryState(budget, 'feature B', policies).next_delay(FakeApiError('400 bad', 400)) is None
+
+    other = RetryState(budget, 'feature C', policies)
+    assert other.next_delay(error) is not None
+    assert other.next_delay(error) is None
+    assert budget.get_stats() == {'max_retries': 3, 'spent': 3, 'denied': 1}
+    print("✅ Attempt limits and the job retry budget bound retries")
+
+def test_remainder_request_lists_received_test_cases():
+    """A re-ask after an incomplete response only asks for the missing test cases"""
+    engine = PromptEngine([], [])
+    feature = {'feature_id': 'F001', 'feature_name': 'Login'}
+    received = [{'test_case_id': 'TC001', 'test_case_name': 'Valid login'},
+                {'test_case_id': 'TC002', 'test_case_name': 'Wrong password'}]
+    request = engine.build_test_case_remainder_request(feature, received)
+
+    assert request.startswith(engine.build_test_case_request(feature))
+    assert '- TC002: Wrong password' in request
+    assert 'TC003' in request
+    print("✅ Remainder request lists the test cases already received")
+
+if __name__ == '__main__':
+    print("🧪 TESTING RETRY POLICY")
+    print("=" * 50)
+    test_errors_are_classified()
+    test_backoff_is_jittered_and_capped()
+    test_attempts_and_budget_limit_retries()
+    test_remainder_request_lists_received_test_cases()
+    print("=" * 50)
+    print("🎉 Retry policy tests passed!")
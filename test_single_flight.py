@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Test single-flight coalescing of identical uploads
+"""
+import io
+import os
+import sys
+import threading
+sys.path.append('.')
+
+from single_flight import SingleFlight, upload_key
+
+def test_key_covers_content_and_options():
+    """The same bytes with different generation options are different jobs"""
+    assert upload_key(b'FRD', use_cache=True, model_mode=None) == upload_key(b'FRD', model_mode=None, use_cache=True)
+    assert upload_key(b'FRD', use_cache=True) != upload_key(b'FRD', use_cache=False)
+    assert upload_key(b'FRD', use_cache=True) != upload_key(b'FRD v2', use_cache=True)
+    print("✅ Upload keys cover content and options")
+
+def test_claim_and_release():
+    """The first claim wins until its owner releases the key"""
+    flights = SingleFlight()
+    assert flights.claim('k', 'session-1') == ('session-1', True)
+    assert flights.claim('k', 'session-2') == ('session-1', False)
+    flights.release('k', 'session-2')
+    assert len(flights) == 1
+    flights.release('k', 'session-1')
+    assert flights.claim('k', 'session-3') == ('session-3', True)
+    print("✅ Claims released by their owner only")
+
+def test_identical_uploads_join_running_job(monkeypatch):
+    """A second identical upload gets the first session instead of starting another pipeline"""
+    import app as app_module
+
+    started = []
+    finished = threading.Event()
+
+    def fake_process(session_id, file_path, use_cache=True, model_mode=None, flight_key=None):
+        started.append(session_id)
+        finished.wait(5)
+        os.remove(file_path)
+        app_module.inflight_uploads.release(flight_key, session_id)
+
+    monkeypatch.setattr(app_module, 'process_document_async', fake_process)
+    client = app_module.app.test_client()
+
+    def upload(content, use_cache='true'):
+        data = {'file': (io.BytesIO(content), 'frd.txt'), 'use_cache': use_cache}
+        return client.post('/upload', data=data, content_type='multipart/form-data').get_json()
+
+    first = upload(b'The system shall log in users.')
+    second = upload(b'The system shall log in users.')
+    other_options = upload(b'The system shall log in users.', use_cache='false')
+    finished.set()
+
+    assert second['session_id'] == first['session_id'] and second['coalesced']
+    assert other_options['session_id'] != first['session_id']
+    assert len(started) == 2
+    print("✅ Identical upload joined the running job")
+
+if __name__ == '__main__':
+    import pytest
+    sys.exit(pytest.main([__file__, '-q']))
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Test incremental parsing of streamed test case responses
+"""
+import json
+import sys
+sys.path.append('.')
+
+from stream_parser import IncrementalArrayParser
+from feature_runner import FeatureResultSink
+
+RESPONSE = '```json\n' + json.dumps({
+    'test_cases': [
+        {'test_case_id': 'TC001', 'test_steps_formatted': 'Click "Save" {twice}\\n then [close]'},
+        {'test_case_id': 'TC002', 'expected_result': 'Path C:\\\\temp stays }'},
+        {'test_case_id': 'TC003', 'nested': {'data': [1, 2, {'x': '}'}]}}
+    ]
+}, indent=2) + '\n```'
+
+def feed_in_pieces(parser, text, size):
+    completed = []
+    for start in range(0, len(text), size):
+        completed.extend(parser.feed(text[start:start + size]))
+    return completed
+
+def test_objects_complete_as_they_arrive():
+    """Elements are returned as soon as their closing brace arrives, whatever the chunking"""
+    for size in (1, 7, 64, len(RESPONSE)):
+        parser = IncrementalArrayParser('test_cases')
+        completed = feed_in_pieces(parser, RESPONSE, size)
+        assert [tc['test_case_id'] for tc in completed] == ['TC001', 'TC002', 'TC003']
+        assert completed[0]['test_steps_formatted'] == 'Click "Save" {twice}\\n then [close]'
+        assert completed[2]['nested']['data'][2] == {'x': '}'}
+        assert parser.text == RESPONSE
+
+    parser = IncrementalArrayParser('test_cases')
+    first_end = RESPONSE.index('TC002')
+    assert [tc['test_case_id'] for tc in parser.feed(RESPONSE[:first_end])] == ['TC001']
+    print("✅ Streamed elements are parsed independently of chunk boundaries")
+
+def test_truncated_and_malformed_elements():
+    """A cut-off tail keeps completed elements and malformed elements are skipped"""
+    text = '{"test_cases": [{"test_case_id": "TC001"}, {"test_case_id": TC002}, {"test_case_id": "TC003", "name": "cut'
+    parser = IncrementalArrayParser('test_cases')
+    completed = parser.feed(text)
+
+    assert [tc['test_case_id'] for tc in completed] == ['TC001']
+    assert parser.objects_found == 1
+    assert parser.objects_skipped == 1
+    print("✅ Truncated and malformed elements do not lose completed test cases")
+
+def test_result_sink_delivers_each_test_case_once():
+    """Streamed test cases are not delivered again when the feature finishes"""
+    delivered = []
+    sink = FeatureResultSink(delivered.append, lambda tc: dict(tc, feature_id='F001'))
+
+    sink.on_test_case({'test_case_id': 'TC001'})
+    sink.flush([{'test_case_id': 'TC001', 'feature_id': 'F001'}, {'test_case_id': 'TC002', 'feature_id': 'F001'}])
+
+    assert delivered == [
+        {'test_case_id': 'TC001', 'feature_id': 'F001'},
+        {'test_case_id': 'TC002', 'feature_id': 'F001'}
+    ]
+    print("✅ Result sink delivers each test case exactly once")
+
+if __name__ == '__main__':
+    print("🧪 TESTING STREAM PARSER")
+    print("=" * 50)
+    test_objects_complete_as_they_arrive()
+    test_truncated_and_malformed_elements()
+    test_result_sink_delivers_each_test_case_once()
+    print("=" * 50)
+    print("🎉 Stream parser tests passed!")
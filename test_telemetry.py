@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Test per-call Gemini telemetry: records, per-job aggregation and export
+"""
+import csv
+import io
+import json
+import sys
+sys.path.append('.')
+
+import pytest
+
+from config import Config
+from fake_gemini import FakeGeminiBackend, DeadlineExceeded
+from gemini_client import GeminiClient
+from job_context import JobContext
+from retry_policy import RetryState, RetryBudget
+from telemetry import CallTelemetry, RECORD_FIELDS, percentile
+
+FEATURE = {'feature_id': 'F001', 'feature_name': 'Account lockout', 'description': 'Lock the account after failed logins'}
+
+def test_stats_aggregate_tokens_and_percentiles():
+    telemetry = CallTelemetry('job-1')
+    for latency in range(1, 21):
+        telemetry.record(kind='test_cases', model='gemini-fast', prompt_tokens=100, output_tokens=50,
+                         latency=latency / 10, retries=1 if latency == 20 else 0, outcome='ok')
+    telemetry.record(kind='extraction', model='gemini-quality', latency=3.0, outcome='timeout')
+
+    stats = telemetry.get_stats()
+    assert stats['calls'] == 21
+    assert stats['outcomes'] == {'ok': 20, 'timeout': 1}
+    assert stats['prompt_tokens'] == 2000 and stats['output_tokens'] == 1000
+    assert stats['retried_calls'] == 1
+    assert stats['by_kind']['test_cases']['latency_p95'] == 1.9
+    assert stats['by_model']['gemini-quality']['calls'] == 1
+    assert percentile([], 0.5) is None
+    print("✅ Job telemetry aggregated per kind and model")
+
+def test_streamed_feature_call_is_recorded_on_its_job(monkeypatch):
+    monkeypatch.setattr(Config, 'RESPONSE_CACHE_ENABLED', False)
+    client = GeminiClient(backend=FakeGeminiBackend(time_scale=0))
+    job = JobContext(job_id='session-1')
+
+    client.generate_test_cases_for_feature(FEATURE, on_test_case=lambda test_case: None, job=job)
+
+    [record] = job.telemetry.get_records()
+    assert record['job_id'] == 'session-1'
+    assert record['kind'] == 'test_cases' and record['feature_id'] == 'F001'
+    assert record['prompt_tokens'] > 0 and record['output_tokens'] > 0
+    assert record['ttft'] is not None and record['ttft'] <= record['latency']
+    assert record['retries'] == 0 and record['outcome'] == 'ok'
+    assert job.get_stats()['calls']['calls'] == 1
+    print("✅ Streamed call recorded with tokens and time to first token")
+
+def test_failed_call_records_error_class_and_retries(monkeypatch):
+    monkeypatch.setattr(Config, 'RESPONSE_CACHE_ENABLED', False)
+    client = GeminiClient(backend=FakeGeminiBackend(time_scale=0, timeout_rate=1.0))
+    job = JobContext()
+    retry = RetryState(RetryBudget(10), 'test cases')
+    retry.next_delay(DeadlineExceeded('504'))
+    plan = client._tag_plan(client.plan_test_case_call(FEATURE, job=job), job, retry, 'F001')
+
+    with pytest.raises(DeadlineExceeded):
+        client._generate_content('Generate test cases', client.prompt_engine.test_case_instruction, plan)
+
+    [record] = job.telemetry.get_records()
+    assert record['outcome'] == 'timeout' and record['retries'] == 1
+    assert record['latency'] is not None and record['output_tokens'] is None
+    print("✅ Failed call recorded with its error class and retry count")
+
+def test_export_formats():
+    telemetry = CallTelemetry('job-2')
+    telemetry.record(kind='extraction', model='gemini-fast', prompt_tokens=10, output_tokens=5, latency=0.5, outcome='ok')
+    telemetry.record(kind='test_cases', feature_id='F002', model='gemini-fast', latency=0.7, outcome='truncated')
+
+    lines = [json.loads(line) for line in telemetry.to_jsonl().splitlines()]
+    assert [line['kind'] for line in lines] == ['extraction', 'test_cases']
+    rows = list(csv.DictReader(io.StringIO(telemetry.to_csv())))
+    assert tuple(rows[0]) == RECORD_FIELDS and rows[1]['feature_id'] == 'F002'
+    print("✅ Records exported as JSON Lines and CSV")
+
+def test_telemetry_route():
+    import app as app_module
+
+    telemetry = CallTelemetry('session-2')
+    telemetry.record(kind='extraction', model='gemini-fast', latency=0.5, outcome='ok')
+    app_module.job_telemetry['session-2'] = telemetry
+    client = app_module.app.test_client()
+
+    assert client.get('/telemetry/session-2').get_json()['stats']['calls'] == 1
+    export = client.get('/telemetry/session-2?format=jsonl')
+    assert json.loads(export.get_data(as_text=True))['job_id'] == 'session-2'
+    assert 'telemetry_session-2.jsonl' in export.headers['Content-Disposition']
+    assert client.get('/telemetry/unknown').status_code == 404
+    print("✅ Telemetry served and exported per session")
+
+class FailingGenerator:
+    """Generator whose job makes a call and then fails"""
+    def process_frd_document(self, content, progress_callback=None, job_id=None, **kwargs):
+        self.job = JobContext(job_id=job_id)
+        self.job.telemetry.record(kind='extraction', model='gemini-fast', latency=0.5, outcome='error')
+        raise RuntimeError('extraction failed')
+
+def test_failed_job_telemetry_is_kept(monkeypatch):
+    import app as app_module
+
+    monkeypatch.setattr(app_module, 'TestCaseGenerator', FailingGenerator)
+    monkeypatch.setattr(app_module, 'open_document_stream', lambda file_path: 'FRD text')
+    monkeypatch.setattr(app_module, 'job_telemetry', app_module.OrderedDict())
+    monkeypatch.setattr(app_module, 'processing_status', {})
+    monkeypatch.setattr(Config, 'TELEMETRY_JOBS_KEPT', 2, raising=False)
+    for session_id in ('failed-1', 'failed-2', 'failed-3'):
+        app_module.processing_status[session_id] = {'status': 'uploaded'}
+        app_module.process_document_async(session_id, 'missing.txt')
+
+    status = app_module.processing_status['failed-3']
+    assert status['status'] == 'error' and status['job']['calls']['calls'] == 1
+    assert list(app_module.job_telemetry) == ['failed-2', 'failed-3']
+    print("✅ Telemetry of failed jobs kept, only for the most recent jobs")
+
+if __name__ == '__main__':
+    sys.exit(pytest.main([__file__, '-q']))
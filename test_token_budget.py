@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Test the local token estimator and the per-call prompt budget planner
+"""
+import sys
+sys.path.append('.')
+
+from token_budget import PromptBudgetPlanner, estimate_tokens, input_token_limit
+from prompt_engine import PromptEngine
+
+class Usage:
+    def __init__(self, prompt_token_count, candidates_token_count):
+        self.prompt_token_count = prompt_token_count
+        self.candidates_token_count = candidates_token_count
+
+def test_estimate_tracks_text_size():
+    """Prose lands near four characters per token; digits and symbols cost more"""
+    prose = "The system shall validate the user's credentials before granting access to the dashboard. " * 20
+    assert 0.8 < estimate_tokens(prose) / (len(prose) / 4) < 1.3
+    assert estimate_tokens('{"id": 12345}') > estimate_tokens('identifier')
+    assert estimate_tokens('') == 0
+    print(f"✅ Estimated {estimate_tokens(prose)} tokens for {len(prose)} characters of prose")
+
+def test_model_window_lookup():
+    """Versioned model names resolve to their family's input limit"""
+    assert input_token_limit('models/gemini-1.5-pro-002') == 2097152
+    assert input_token_limit('gemini-1.5-flash-8b-001') == 1048576
+    assert input_token_limit('some-new-model') == 30720
+    print("✅ Model input windows resolved")
+
+def test_extraction_truncated_to_window():
+    """FRD text beyond the window (minus instruction and output reserve) is cut"""
+    planner = PromptBudgetPlanner(max_input_tokens=3000, max_output_tokens=1000)
+    frd = "Login page shall lock the account after five failed attempts. " * 200
+
+    plan = planner.plan_extraction("Extract features.", "FRD Content:\n", frd)
+    assert 0 < plan.frd_chars < len(frd)
+    assert estimate_tokens(frd[:plan.frd_chars]) <= 2000
+    assert planner.plan_extraction("Extract features.", "FRD Content:\n", frd[:500]).frd_chars == 500
+    print(f"✅ FRD cut to {plan.frd_chars} of {len(frd)} characters")
+
+def test_test_case_count_fits_output_budget():
+    """The number of requested test cases shrinks with the output budget and per-feature share"""
+    planner = PromptBudgetPlanner(max_input_tokens=100000, max_output_tokens=8192, tokens_per_test_case=200)
+    assert planner.plan_test_cases("instruction", "feature").test_case_count == 25
+    assert planner.plan_test_cases("instruction", "features", feature_count=4).test_case_count == 9
+    per_feature = planner.min_output_tokens_per_feature()
+    assert planner.plan_test_cases("instruction", "features", feature_count=8192 // per_feature).test_case_count >= 15
+    assert planner.test_case_range(10) == (10, 10)
+    assert planner.test_case_range(20) == (15, 20)
+    print("✅ Test case count planned from MAX_OUTPUT_TOKENS")
+
+def test_actual_usage_corrects_estimates():
+    """Reported usage moves the input ratio and tokens per test case towards reality"""
+    planner = PromptBudgetPlanner(max_input_tokens=100000, max_output_tokens=8192, tokens_per_test_case=200)
+    plan = planner.plan_test_cases("instruction " * 100, "feature " * 20)
+
+    planner.record_actual(plan, Usage(plan.input_tokens * 2, 6000))
+    planner.record_test_cases(plan, 20)
+
+    stats = planner.get_stats()
+    assert plan.as_dict()['actual_input_tokens'] == plan.input_tokens * 2
+    assert stats['input_estimate_ratio'] > 1.0
+    assert stats['tokens_per_test_case'] > 200
+    assert stats['planned_input_tokens'] == plan.input_tokens
+    print(f"✅ Estimates corrected from reported usage: {stats}")
+
+def test_usage_compared_with_ratio_of_its_plan():
+    """Usage of a call planned before another call moved the ratio corrects from the plan's own ratio"""
+    planner = PromptBudgetPlanner(max_input_tokens=100000, max_output_tokens=8192)
+    plan = planner.plan_test_cases("instruction " * 100, "feature " * 20)
+    planner.input_ratio = 2.0
+
+    # The estimate of this plan was exact, so the ratio moves back towards 1.0
+    planner.record_actual(plan, Usage(plan.input_tokens, 6000))
+    assert plan.input_ratio == 1.0
+    assert abs(planner.input_ratio - 1.8) < 1e-9
+    print("✅ Reported usage compared with the ratio its plan used")
+
+def test_static_sections_fit_budget():
+    """Examples and key-value rows that would overflow the static budget are left out"""
+    examples = [{'Input': 'FRD line ' * 200, 'Output': 'Test case ' * 200} for _ in range(5)]
+    key_values = [{'Feature Name': 'Rib', 'Scenario_Name': f'Scenario {i}'} for i in range(10)]
+    planner = PromptBudgetPlanner(max_input_tokens=100000, max_output_tokens=8192)
+
+    engine = PromptEngine(examples, key_values, planner=planner, static_token_budget=2000)
+
+    assert 'Example 2:' in engine.extraction_instruction
+    assert 'Example 3:' not in engine.extraction_instruction
+    assert 'Example 2:' not in engine.test_case_instruction
+    assert 'Scenario 9' in engine.test_case_instruction
+    print("✅ Static preamble trimmed to its token budget")
+
+if __name__ == '__main__':
+    print("🧪 TESTING TOKEN BUDGET PLANNER")
+    print("=" * 50)
+    test_estimate_tracks_text_size()
+    test_model_window_lookup()
+    test_extraction_truncated_to_window()
+    test_test_case_count_fits_output_budget()
+    test_actual_usage_corrects_estimates()
+    test_usage_compared_with_ratio_of_its_plan()
+    test_static_sections_fit_budget()
+    print("=" * 50)
+    print("🎉 Token budget tests passed!")
@@ -0,0 +1,190 @@
+"""
+Local token estimation and per-call prompt/output budget planning for Gemini
+"""
+import logging
+import math
+import re
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Input token limits of the models this app is used with; unknown models get a conservative default
+MODEL_INPUT_TOKEN_LIMITS = {
+    'gemini-1.5-pro': 2097152,
+    'gemini-1.5-flash': 1048576,
+    'gemini-1.5-flash-8b': 1048576,
+    'gemini-1.0-pro': 30720,
+    'gemini-pro': 30720,
+}
+DEFAULT_INPUT_TOKEN_LIMIT = 30720
+
+_LETTERS = re.compile(r'[^\W\d_]+')
+_DIGITS = re.compile(r'\d')
+_SYMBOLS = re.compile(r'[^\w\s]')
+
+def estimate_tokens(text):
+    """Fast local estimate of the number of Gemini tokens in text
+
+    Words count as one token plus one per further 8 letters, every digit and
+    symbol as one token; whitespace is free. This tracks the SentencePiece
+    tokenizer closely for English prose and JSON without a network round trip.
+    """
+    if not text:
+        return 0
+    words = sum(1 + len(word) // 8 for word in _LETTERS.findall(text))
+    return words + len(_DIGITS.findall(text)) + len(_SYMBOLS.findall(text))
+
+def input_token_limit(model_name):
+    """Input window of a model, matching versioned names such as gemini-1.5-pro-002"""
+    name = model_name.split('/')[-1]
+    for known in sorted(MODEL_INPUT_TOKEN_LIMITS, key=len, reverse=True):
+        if name.startswith(known):
+            return MODEL_INPUT_TOKEN_LIMITS[known]
+    return DEFAULT_INPUT_TOKEN_LIMIT
+
+class CallPlan:
+    """Budget decided for one Gemini call, later completed with the actual usage"""
+
+    def __init__(self, kind, input_tokens, max_output_tokens, test_case_count=None, frd_chars=None, model=None, input_ratio=1.0):
+        self.kind = kind
+        self.model = model
+        self.input_tokens = input_tokens
+        # The planner's actual/estimated ratio input_tokens was estimated with
+        self.input_ratio = input_ratio
+        self.max_output_tokens = max_output_tokens
+        self.test_case_count = test_case_count
+        self.frd_chars = frd_chars
+        self.actual_input_tokens = None
+        self.actual_output_tokens = None
+        # Telemetry tags: the JobContext, feature id(s) and RetryState of the logical request
+        self.job = None
+        self.feature_id = None
+        self.retry = None
+
+    def as_dict(self):
+        return {
+            'kind': self.kind,
+            'model': self.model,
+            'planned_input_tokens': self.input_tokens,
+            'actual_input_tokens': self.actual_input_tokens,
+            'max_output_tokens': self.max_output_tokens,
+            'actual_output_tokens': self.actual_output_tokens,
+            'test_case_count': self.test_case_count,
+            'frd_chars': self.frd_chars
+        }
+
+class PromptBudgetPlanner:
+    """Decides what fits each call: static sections, FRD characters and the number of test cases
+
+    Estimates are corrected by the usage Gemini reports: the ratio of actual to
+    estimated input tokens and the output tokens spent per test case are kept
+    as moving averages, so later plans get closer to reality.
+    """
+
+    def __init__(self, max_input_tokens, max_output_tokens, tokens_per_test_case=180,
+                 min_test_cases=15, max_test_cases=25, smoothing=0.2):
+        self.max_input_tokens = max_input_tokens
+        self.max_output_tokens = max_output_tokens
+        self.tokens_per_test_case = float(tokens_per_test_case)
+        self.min_test_cases = min_test_cases
+        self.max_test_cases = max_test_cases
+        self.smoothing = smoothing
+        self.input_ratio = 1.0
+        self.calls = 0
+        self.planned_input_tokens = 0
+        self.actual_input_tokens = 0
+        self.actual_output_tokens = 0
+        self._lock = threading.Lock()
+
+    def estimate(self, text, ratio=None):
+        """Token estimate corrected by the observed actual/estimated ratio (the current one unless given)"""
+        return int(estimate_tokens(text) * (self.input_ratio if ratio is None else ratio))
+
+    def fit_sections(self, sections, budget_tokens):
+        """How many leading sections fit into budget_tokens together"""
+        used = 0
+        for count, section in enumerate(sections):
+            used += self.estimate(section)
+            if used > budget_tokens:
+                return count
+        return len(sections)
+
+    def plan_extraction(self, instruction, request_overhead, frd_content):
+        """Plan a feature extraction call: how much of the FRD fits next to the instruction"""
+        # One ratio for the whole plan; record_actual may change the shared one meanwhile
+        ratio = self.input_ratio
+        fixed_tokens = self.estimate(instruction, ratio) + self.estimate(request_overhead, ratio)
+        frd_tokens = self.estimate(frd_content, ratio)
+        # Leave room for the model's answer inside the window
+        available = self.max_input_tokens - fixed_tokens - self.max_output_tokens
+        frd_chars = len(frd_content)
+        if frd_tokens > available > 0:
+            frd_chars = int(len(frd_content) * available / frd_tokens)
+            logger.warning(f"FRD needs ~{frd_tokens} tokens but only {available} fit the model window, truncating to {frd_chars} characters")
+        elif available <= 0:
+            frd_chars = 0
+        return CallPlan('extraction', fixed_tokens + min(frd_tokens, max(available, 0)), self.max_output_tokens, frd_chars=frd_chars, input_ratio=ratio)
+
+    def test_case_count(self, output_tokens):
+        """Number of test cases whose JSON fits output_tokens (never more than max_test_cases)"""
+        # Braces and the test_cases key cost a few dozen tokens per response
+        fits = int((output_tokens - 50) // self.tokens_per_test_case)
+        return max(1, min(self.max_test_cases, fits))
+
+    def min_output_tokens_per_feature(self):
+        """Output tokens each feature of a batched call needs so that min_test_cases fit"""
+        return math.ceil(self.min_test_cases * self.tokens_per_test_case) + 50
+
+    def plan_test_cases(self, instruction, request, feature_count=1):
+        """Plan a test case call: how many test cases per feature fit MAX_OUTPUT_TOKENS"""
+        ratio = self.input_ratio
+        input_tokens = self.estimate(instruction, ratio) + self.estimate(request, ratio)
+        count = self.test_case_count(self.max_output_tokens / max(1, feature_count))
+        return CallPlan('test_cases', input_tokens, self.max_output_tokens, test_case_count=count, input_ratio=ratio)
+
+    def test_case_range(self, count):
+        """The (low, high) number of test cases to ask for when count fit the output budget"""
+        return min(self.min_test_cases, count), count
+
+    def record_actual(self, plan, usage_metadata):
+        """Fill in the usage Gemini reported for a planned call and correct the input estimate"""
+        if plan is None or usage_metadata is None:
+            return
+        actual_input = getattr(usage_metadata, 'prompt_token_count', None)
+        actual_output = getattr(usage_metadata, 'candidates_token_count', None)
+        plan.actual_input_tokens = actual_input
+        plan.actual_output_tokens = actual_output
+
+        with self._lock:
+            self.calls += 1
+            if actual_input and plan.input_tokens:
+                self.planned_input_tokens += plan.input_tokens
+                self.actual_input_tokens += actual_input
+                # Compare with the raw estimate the plan was made from, not with today's ratio
+                observed = actual_input / (plan.input_tokens / plan.input_ratio)
+                self.input_ratio += self.smoothing * (observed - self.input_ratio)
+            if actual_output:
+                self.actual_output_tokens += actual_output
+
+        logger.debug(f"Gemini {plan.kind} call: planned {plan.input_tokens} input tokens, actual {actual_input}; "
+                     f"output {actual_output} of {plan.max_output_tokens}")
+
+    def record_test_cases(self, plan, test_cases_received):
+        """Correct the output tokens per test case once a planned response has been parsed"""
+        if plan is None or not plan.actual_output_tokens or not test_cases_received:
+            return
+        observed = plan.actual_output_tokens / test_cases_received
+        with self._lock:
+            self.tokens_per_test_case += self.smoothing * (observed - self.tokens_per_test_case)
+
+    def get_stats(self):
+        """Planned vs. actual token usage for status and health reporting"""
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'planned_input_tokens': self.planned_input_tokens,
+                'actual_input_tokens': self.actual_input_tokens,
+                'actual_output_tokens': self.actual_output_tokens,
+                'input_estimate_ratio': round(self.input_ratio, 3),
+                'tokens_per_test_case': round(self.tokens_per_test_case, 1)
+            }